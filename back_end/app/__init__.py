@@ -28,6 +28,33 @@ def create_app() -> Flask:
     # Ne pas créer les tables et ne pas charger les données du CSV
     print("✅ L'application utilise directement les tables existantes dans la base de données")
 
+    from app.cache import init_caches
+    init_caches(app)
+
+    from app.http_cache import init_http_cache
+    init_http_cache(app)
+
+    from app.counts import init_counts
+    init_counts(app)
+
+    from app.aggregates import init_aggregates
+    init_aggregates(app)
+
+    from app.popularity import init_popularity
+    init_popularity(app)
+
+    from app.rating_stats import init_rating_stats
+    init_rating_stats(app)
+
+    from app.rating_writes import init_rating_writes
+    init_rating_writes(app)
+
+    from app.search import init_search_index
+    init_search_index(app)
+
+    from app.recommender import init_recommender
+    init_recommender(app)
+
     @app.route('/api/health')
     def health_check():
         return {'status': 'ok', 'message': 'API is running'}
@@ -0,0 +1,90 @@
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, current_app
+
+from app import db
+from app.http_cache import body_etag
+from app.models import Book, BookAggregate
+
+
+class CatalogueAggregates:
+    """Listes des genres et des auteurs, servies depuis la mémoire du processus.
+
+    Elles sont lues dans la table `book_aggregates` (maintenue par déclencheur),
+    sérialisées une seule fois avec leur ETag, puis relues après une écriture
+    du processus ou au bout de `reload_seconds` pour les écritures des autres.
+    """
+
+    def __init__(self, author_limit: int = 100, reload_seconds: float = 60.0):
+        self.author_limit = author_limit
+        self.reload_seconds = reload_seconds
+        # kind -> (corps JSON, ETag)
+        self.payloads: Dict[str, Tuple[bytes, str]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _query_materialized(self) -> Tuple[List[str], List[str]]:
+        genres = [value for (value,) in db.session.query(BookAggregate.value)
+                  .filter(BookAggregate.kind == 'genre').order_by(BookAggregate.value)]
+        authors = [value for (value,) in db.session.query(BookAggregate.value)
+                   .filter(BookAggregate.kind == 'author')
+                   .order_by(BookAggregate.book_count.desc(), BookAggregate.value)
+                   .limit(self.author_limit)]
+        return genres, authors
+
+    def _query_books(self) -> Tuple[List[str], List[str]]:
+        """Agrégation directe sur books (table matérialisée absente)."""
+        genres = sorted(genre for (genre,) in db.session.query(Book.genre).distinct() if genre)
+        authors = [author for (author, _) in db.session.query(Book.author, db.func.count(Book.author))
+                   .filter(Book.author.isnot(None)).group_by(Book.author)
+                   .order_by(db.func.count(Book.author).desc(), Book.author)
+                   .limit(self.author_limit) if author]
+        return genres, authors
+
+    def load(self) -> None:
+        try:
+            genres, authors = self._query_materialized()
+            if not genres and not authors:
+                genres, authors = self._query_books()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Table book_aggregates indisponible, agrégation directe: {str(e)}")
+            genres, authors = self._query_books()
+
+        payloads = {}
+        for kind, values in (('genres', genres), ('authors', authors)):
+            body = json.dumps(values, ensure_ascii=False).encode('utf-8')
+            payloads[kind] = (body, body_etag(body))
+        with self._lock:
+            self.payloads = payloads
+            self._loaded_at = time.monotonic()
+
+    def get(self, kind: str) -> Tuple[bytes, str]:
+        """Corps JSON et ETag de la liste demandée ('genres' ou 'authors')."""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.reload_seconds:
+            self.load()
+        with self._lock:
+            return self.payloads[kind]
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+
+def init_aggregates(app: Flask) -> None:
+    app.extensions['catalogue_aggregates'] = CatalogueAggregates(
+        author_limit=app.config.get('AUTHORS_LIST_LIMIT', 100),
+        reload_seconds=app.config.get('AGGREGATES_RELOAD_SECONDS', 60)
+    )
+
+
+def get_catalogue_aggregates() -> CatalogueAggregates:
+    aggregates: CatalogueAggregates = current_app.extensions['catalogue_aggregates']
+    return aggregates
+
+
+def invalidate_catalogue_aggregates() -> None:
+    """Une écriture sur books peut changer les genres ou les auteurs : relire au prochain accès."""
+    get_catalogue_aggregates().invalidate()
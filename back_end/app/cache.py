@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Hashable, List, Optional, Tuple
+
+from flask import Flask, current_app
+
+if TYPE_CHECKING:
+    from app.models import AuthUser
+
+# Valeur sentinelle pour distinguer une absence d'une valeur None en cache
+MISSING = object()
+
+
+class TTLCache:
+    """Cache en mémoire du processus, borné en taille (LRU) et en durée de vie (TTL)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Retourne la valeur associée à la clé si elle n'a pas expiré."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Enregistre une valeur, en évinçant la moins récemment utilisée si besoin."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """Invalide une entrée."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+def init_caches(app: Flask) -> None:
+    """Crée les caches partagés de l'application."""
+    app.extensions['recommendation_cache'] = TTLCache(
+        maxsize=app.config.get('RECOMMENDATION_CACHE_SIZE', 10000),
+        ttl=app.config.get('RECOMMENDATION_CACHE_TTL', 600)
+    )
+    app.extensions['suggest_cache'] = TTLCache(
+        maxsize=app.config.get('SUGGEST_CACHE_SIZE', 20000),
+        ttl=app.config.get('SUGGEST_CACHE_TTL', 600)
+    )
+    app.extensions['facet_cache'] = TTLCache(
+        maxsize=app.config.get('FACET_CACHE_SIZE', 5000),
+        ttl=app.config.get('FACET_CACHE_TTL', 300)
+    )
+
+
+def get_cache(name: str) -> TTLCache:
+    cache: TTLCache = current_app.extensions[name]
+    return cache
+
+
+def recommendation_cache_version(user: 'AuthUser', rating_count: int) -> Tuple[Any, ...]:
+    """Version des recommandations d'un utilisateur : change dès que ses entrées changent.
+
+    Le cache étant propre à chaque processus, la version protège aussi contre
+    une invalidation faite par un autre worker.
+    """
+    return (tuple(user.favorite_genres or []), tuple(user.favorite_authors or []), rating_count)
+
+
+def get_cached_recommendations(user_id: int, version: Tuple[Any, ...]) -> Any:
+    """Retourne les recommandations en cache si leur version est à jour, sinon MISSING."""
+    entry = get_cache('recommendation_cache').get(user_id)
+    if entry is MISSING or entry[0] != version:
+        return MISSING
+    return entry[1]
+
+
+def cache_recommendations(user_id: int, version: Tuple[Any, ...], recommendations: List[Any]) -> None:
+    get_cache('recommendation_cache').set(user_id, (version, recommendations))
+
+
+def invalidate_user_recommendations(user_id: int) -> None:
+    """Invalide les recommandations en cache d'un utilisateur (profil ou notes modifiés)."""
+    get_cache('recommendation_cache').pop(user_id)
@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import Flask, current_app
+from sqlalchemy import text
+
+from app import db
+from app.models import Book
+
+# Estimation du planificateur, mise à jour par VACUUM / ANALYZE (-1 si jamais analysée)
+ESTIMATE_SQL = 'SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)'
+
+
+class CountService:
+    """Totaux des listes non filtrées, sans COUNT(*) à chaque requête.
+
+    Les comptages exacts sont gardés en mémoire pendant `ttl` secondes et
+    ajustés par les écritures du processus ; les écritures des autres workers
+    sont rattrapées au rafraîchissement suivant. Avec `use_estimates`, le total
+    vient de `pg_class.reltuples`, dont le coût ne dépend pas de la taille de
+    la table.
+    """
+
+    def __init__(self, ttl: float = 300.0, use_estimates: bool = False):
+        self.ttl = ttl
+        self.use_estimates = use_estimates
+        self._counts: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def exact(self, name: str, count: Callable[[], int]) -> int:
+        with self._lock:
+            entry = self._counts.get(name)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        value = count()
+        with self._lock:
+            self._counts[name] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def estimate(self, table: str) -> Optional[int]:
+        try:
+            value = db.session.execute(text(ESTIMATE_SQL), {'table': table}).scalar()
+        except Exception as e:
+            # Base sans catalogue PostgreSQL : comptages exacts en cache uniquement
+            db.session.rollback()
+            self.use_estimates = False
+            print(f"Estimation du nombre de lignes indisponible: {str(e)}")
+            return None
+        return int(value) if value is not None and value >= 0 else None
+
+    def total(self, name: str, count: Callable[[], int]) -> Tuple[int, bool]:
+        """Retourne (total, total_is_estimate) pour la table `name`."""
+        if self.use_estimates:
+            # Une estimation nulle peut venir d'une table jamais analysée : vérifier
+            estimate = self.estimate(name)
+            if estimate:
+                return estimate, True
+        return self.exact(name, count), False
+
+    def adjust(self, name: str, delta: int) -> None:
+        """Répercute une insertion ou une suppression validée sur le comptage en mémoire."""
+        with self._lock:
+            entry = self._counts.get(name)
+            if entry is not None:
+                self._counts[name] = (entry[0], max(entry[1] + delta, 0))
+
+
+def init_counts(app: Flask) -> None:
+    app.extensions['count_service'] = CountService(
+        ttl=app.config.get('COUNT_CACHE_TTL', 300),
+        use_estimates=app.config.get('COUNT_USE_ESTIMATES', False)
+    )
+
+
+def get_count_service() -> CountService:
+    service: CountService = current_app.extensions['count_service']
+    return service
+
+
+def book_total() -> Tuple[int, bool]:
+    """Nombre de livres du catalogue et s'il s'agit d'une estimation."""
+    return get_count_service().total('books', Book.query.count)
+
+
+def adjust_book_count(delta: int) -> None:
+    get_count_service().adjust('books', delta)
@@ -0,0 +1,38 @@
+from typing import Any, Dict, Optional, Tuple
+
+from flask import request
+from sqlalchemy.orm import load_only
+
+from app.models import Book
+
+Fields = Optional[Tuple[str, ...]]
+
+
+def requested_fields() -> Fields:
+    """Champs demandés par `?fields=title,author,...` ; None pour le livre complet.
+
+    L'ISBN est toujours inclus : il sert de clé aux clients et aux curseurs.
+    Lève ValueError pour un champ inconnu.
+    """
+    raw = request.args.get('fields', '')
+    if not raw.strip():
+        return None
+    fields = ['isbn'] + [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in Book.SERIALIZED_FIELDS]
+    if unknown:
+        raise ValueError(f"Champs inconnus: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(fields))
+
+
+def with_fields(book_query: Any, fields: Fields) -> Any:
+    """Ne sélectionne en SQL que les colonnes demandées."""
+    if not fields:
+        return book_query
+    return book_query.options(load_only(*(getattr(Book, field) for field in fields)))
+
+
+def trim(book: Dict[str, Any], fields: Fields) -> Dict[str, Any]:
+    """Réduit un livre déjà sérialisé (index en mémoire) aux champs demandés."""
+    if not fields:
+        return book
+    return {field: book.get(field) for field in fields}
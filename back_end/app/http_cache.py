@@ -0,0 +1,196 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Set, Tuple, TypeVar, cast
+
+from flask import Flask, Response, current_app, make_response, request
+from sqlalchemy import text
+
+from app import db
+
+# Un validateur : (étiquette de version, date de dernière modification)
+Validator = Tuple[str, Optional[datetime]]
+
+View = TypeVar('View', bound=Callable[..., Any])
+
+TABLE_VERSION_SQL = 'SELECT version, updated_at FROM table_versions WHERE table_name = :table'
+
+# Version d'une table dérivée de ses lignes (index sur updated_at) : dernière
+# modification, plus une empreinte des lignes modifiées dans les `window`
+# secondes précédentes. Une transaction validée après une plus récente écrit un
+# updated_at antérieur au maximum : l'empreinte la fait tout de même changer.
+MODIFIED_SQL = '''
+WITH latest AS (SELECT MAX(updated_at) AS updated_at FROM {table})
+SELECT l.updated_at, COUNT(t.*) AS recent, COALESCE(SUM(hashtext(t::text)), 0) AS fingerprint
+FROM latest l
+LEFT JOIN {table} t ON t.updated_at > l.updated_at - make_interval(secs => :window)
+GROUP BY l.updated_at
+'''
+
+
+def body_etag(body: bytes) -> str:
+    """ETag fort dérivé du contenu exact de la réponse."""
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def cached_json_response(body: bytes, etag: str, cache_control: str) -> Response:
+    """Réponse JSON pré-sérialisée, ou 304 si le client possède déjà cette version."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def _timestamp(value: object) -> Optional[datetime]:
+    # Un pilote sans type TIMESTAMP natif renvoie une chaîne : pas de Last-Modified
+    return value if isinstance(value, datetime) else None
+
+
+class VersionStore:
+    """Versions des lignes et des tables, lues sans charger d'objet ORM.
+
+    La version d'une table n'est relue qu'au plus toutes les `check_seconds`
+    secondes ; une écriture du processus l'invalide immédiatement. Si les
+    colonnes ou la table de versions n'existent pas (base non migrée), les
+    réponses sont servies sans validation conditionnelle.
+    """
+
+    def __init__(self, check_seconds: float = 1.0, late_commit_seconds: float = 60.0):
+        self.check_seconds = check_seconds
+        self.late_commit_seconds = late_commit_seconds
+        self._tables: Dict[str, Tuple[float, Optional[Validator]]] = {}
+        self._lock = threading.Lock()
+        self.tables_available = True
+        self.rows_available = True
+        self.modified_unavailable: Set[str] = set()
+
+    def table(self, table: str) -> Optional[Validator]:
+        if not self.tables_available:
+            return None
+        with self._lock:
+            entry = self._tables.get(table)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        try:
+            row = db.session.execute(text(TABLE_VERSION_SQL), {'table': table}).first()
+        except Exception as e:
+            db.session.rollback()
+            self.tables_available = False
+            print(f"Versions de tables indisponibles, réponses non conditionnelles: {str(e)}")
+            return None
+        validator = (f'{table}:{row.version}', _timestamp(row.updated_at)) if row is not None else None
+        with self._lock:
+            self._tables[table] = (time.monotonic() + self.check_seconds, validator)
+        return validator
+
+    def modified(self, table: str) -> Optional[Validator]:
+        """Version d'une table sans ligne dans table_versions, tirée de sa colonne updated_at.
+
+        Aucune écriture n'est ajoutée côté base : utile pour les tables écrites
+        par chaque note, où un compteur partagé sérialiserait les transactions.
+        """
+        if table in self.modified_unavailable:
+            return None
+        key = f'modified:{table}'
+        with self._lock:
+            entry = self._tables.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        try:
+            row = db.session.execute(
+                text(MODIFIED_SQL.format(table=table)), {'window': self.late_commit_seconds}
+            ).one()
+        except Exception as e:
+            db.session.rollback()
+            self.modified_unavailable.add(table)
+            print(f"Version de {table} indisponible, réponses non conditionnelles: {str(e)}")
+            return None
+        validator = (f'{table}:{row.updated_at}:{row.recent}:{row.fingerprint}', _timestamp(row.updated_at))
+        with self._lock:
+            self._tables[key] = (time.monotonic() + self.check_seconds, validator)
+        return validator
+
+    def row(self, table: str, key_column: str, key: object) -> Optional[Validator]:
+        """Version d'une ligne (colonnes row_version / updated_at), None si absente."""
+        if not self.rows_available:
+            return None
+        try:
+            row = db.session.execute(
+                text(f'SELECT row_version, updated_at FROM {table} WHERE {key_column} = :key'), {'key': key}
+            ).first()
+        except Exception as e:
+            db.session.rollback()
+            self.rows_available = False
+            print(f"Versions de lignes indisponibles, réponses non conditionnelles: {str(e)}")
+            return None
+        return (f'{table}:{key}:{row.row_version}', _timestamp(row.updated_at)) if row is not None else None
+
+    def invalidate(self, table: str) -> None:
+        with self._lock:
+            self._tables.pop(table, None)
+            self._tables.pop(f'modified:{table}', None)
+
+
+def init_http_cache(app: Flask) -> None:
+    app.extensions['version_store'] = VersionStore(
+        check_seconds=app.config.get('VERSION_CHECK_SECONDS', 1.0),
+        late_commit_seconds=app.config.get('VERSION_LATE_COMMIT_SECONDS', 60.0)
+    )
+
+
+def get_version_store() -> VersionStore:
+    store: VersionStore = current_app.extensions['version_store']
+    return store
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _not_modified(etag: str, last_modified: Optional[datetime]) -> bool:
+    if request.if_none_match:
+        # If-None-Match prime sur If-Modified-Since (RFC 7232)
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(request.if_modified_since)
+    return False
+
+
+def conditional(validator: Callable[..., Optional[Validator]], cache_control: str,
+                vary_on_query: bool = False) -> Callable[[View], View]:
+    """Décorateur de vue GET : ETag / Last-Modified tirés d'une version, 304 avant la vue.
+
+    `validator` reçoit les arguments de la vue et retourne la version de la
+    ressource, ou None pour servir la vue sans validation. Avec
+    `vary_on_query`, la chaîne de requête entre dans l'ETag (listes paginées).
+    """
+    def decorator(view: View) -> View:
+        @wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            version = validator(*args, **kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+
+            tag, last_modified = version
+            if vary_on_query:
+                tag = f'{tag}?{request.query_string.decode("utf-8", "replace")}'
+            etag = hashlib.sha256(tag.encode('utf-8')).hexdigest()[:32]
+
+            if _not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = _as_utc(last_modified)
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return cast(View, wrapper)
+    return decorator
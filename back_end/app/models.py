@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 import uuid
 from werkzeug.security import generate_password_hash, check_password_hash
 import json
+from typing import Any, Dict, Iterable, Optional
 
 class Book(db.Model):
     isbn = db.Column('isbn', db.String(20), primary_key=True)
@@ -23,32 +24,32 @@ class Book(db.Model):
     def __repr__(self):
         return f'<Book {self.title}>'
     
-    def to_dict(self, include_ratings=False):
-        book_data = {
-            'isbn': self.isbn,
-            'title': self.title,
-            'author': self.author,
-            'year': self.year,
-            'publisher': self.publisher,
-            'image_url_s': self.image_url_s,
-            'image_url_m': self.image_url_m,
-            'image_url_l': self.image_url_l,
-            'genre': self.genre,
-            'description': self.description
-        }
+    # Champs sérialisables, utilisables dans ?fields= (noms des attributs du modèle)
+    SERIALIZED_FIELDS = ('isbn', 'title', 'author', 'year', 'publisher',
+                         'image_url_s', 'image_url_m', 'image_url_l', 'genre', 'description')
+    
+    def to_dict(self, include_ratings: bool = False, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        if fields:
+            # Sérialisation partielle : ne lit que les colonnes chargées (load_only)
+            book_data = {field: getattr(self, field) for field in fields}
+        else:
+            book_data = {
+                'isbn': self.isbn,
+                'title': self.title,
+                'author': self.author,
+                'year': self.year,
+                'publisher': self.publisher,
+                'image_url_s': self.image_url_s,
+                'image_url_m': self.image_url_m,
+                'image_url_l': self.image_url_l,
+                'genre': self.genre,
+                'description': self.description
+            }
         
         if include_ratings:
-            # Calculer les statistiques de notation
-            from sqlalchemy import func
-            ratings_stats = db.session.query(
-                func.count(UserBookRating.id).label('total_ratings'),
-                func.avg(UserBookRating.rating).label('average_rating')
-            ).filter(UserBookRating.isbn == self.isbn).first()
-            
-            book_data['rating_stats'] = {
-                'total_ratings': ratings_stats.total_ratings or 0,
-                'average_rating': float(ratings_stats.average_rating or 0)
-            }
+            # Statistiques de notation dénormalisées, lues par clé primaire
+            from app.rating_stats import book_rating_stats
+            book_data['rating_stats'] = book_rating_stats(self.isbn)
         
         return book_data
 
@@ -217,8 +218,9 @@ class UserBookRating(db.Model):
     def __repr__(self):
         return f'<UserBookRating {self.user_id}-{self.isbn}: {self.rating}>'
     
-    def to_dict(self):
-        return {
+    def to_dict(self, include_book: bool = False, include_user: bool = False) -> Dict[str, Any]:
+        # Les relations incluses doivent être chargées par la requête (joinedload) pour éviter N+1
+        rating_data = {
             'id': self.id,
             'user_id': self.user_id,
             'isbn': self.isbn,
@@ -226,4 +228,129 @@ class UserBookRating(db.Model):
             'review': self.review,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        } 
\ No newline at end of file
+        }
+        if include_book:
+            rating_data['book'] = self.book.to_dict() if self.book else None
+        if include_user:
+            rating_data['user'] = {
+                'username': self.user.username if self.user else 'Utilisateur supprimé',
+                'full_name': self.user.full_name if self.user else ''
+            }
+        return rating_data
+
+class UserRecommendation(db.Model):
+    """Recommandations précalculées par le job batch, lues telles quelles par le tableau de bord."""
+    __tablename__ = 'user_recommendations'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('auth_users.user_id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True)
+    isbn = db.Column(db.String(20), db.ForeignKey('books.isbn', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    generated_at = db.Column(db.TIMESTAMP, default=datetime.utcnow)
+    
+    def __repr__(self) -> str:
+        return f'<UserRecommendation {self.user_id}#{self.rank}: {self.isbn}>'
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'user_id': self.user_id,
+            'rank': self.rank,
+            'isbn': self.isbn,
+            'score': self.score,
+            'generated_at': self.generated_at.isoformat() if self.generated_at else None
+        }
+
+
+class BookPopularity(db.Model):
+    """Popularité matérialisée d'un livre (tables `ratings` et `user_book_ratings`)."""
+    __tablename__ = 'book_popularity'
+    
+    isbn = db.Column(db.String(20), db.ForeignKey('books.isbn', ondelete='CASCADE'), primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Float, nullable=False, default=0)
+    score = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self) -> str:
+        return f'<BookPopularity {self.isbn}: {self.score:.2f}>'
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'isbn': self.isbn,
+            'rating_count': self.rating_count,
+            'average_rating': self.rating_sum / self.rating_count if self.rating_count else 0.0,
+            'score': self.score
+        }
+
+
+class BookAggregate(db.Model):
+    """Nombre de livres par genre ou par auteur, maintenu par déclencheur sur `books`."""
+    __tablename__ = 'book_aggregates'
+    
+    kind = db.Column(db.String(10), primary_key=True)
+    value = db.Column(db.String(255), primary_key=True)
+    book_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self) -> str:
+        return f'<BookAggregate {self.kind} {self.value}: {self.book_count}>'
+
+
+class BookRatingStats(db.Model):
+    """Statistiques des notes d'un livre, maintenues par déclencheur sur `user_book_ratings`."""
+    __tablename__ = 'book_rating_stats'
+    
+    isbn = db.Column(db.String(20), db.ForeignKey('books.isbn', ondelete='CASCADE'), primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    one_star = db.Column(db.Integer, nullable=False, default=0)
+    two_stars = db.Column(db.Integer, nullable=False, default=0)
+    three_stars = db.Column(db.Integer, nullable=False, default=0)
+    four_stars = db.Column(db.Integer, nullable=False, default=0)
+    five_stars = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self) -> str:
+        return f'<BookRatingStats {self.isbn}: {self.rating_count}>'
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_ratings': self.rating_count,
+            'average_rating': self.rating_sum / self.rating_count if self.rating_count else 0.0,
+            'five_stars': self.five_stars,
+            'four_stars': self.four_stars,
+            'three_stars': self.three_stars,
+            'two_stars': self.two_stars,
+            'one_star': self.one_star
+        }
+
+
+class RatingEvent(db.Model):
+    """Événement du journal des notes, ajouté par déclencheur sur `user_book_ratings`.
+
+    `seq` est le numéro publié, attribué une fois la transaction d'origine
+    terminée (voir app/rating_events.py) ; NULL jusque-là.
+    """
+    __tablename__ = 'rating_events'
+    
+    id = db.Column(db.BigInteger, primary_key=True)
+    seq = db.Column(db.BigInteger, unique=True)
+    event_type = db.Column(db.String(10), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    isbn = db.Column(db.String(20), nullable=False)
+    rating = db.Column(db.Integer)
+    previous_rating = db.Column(db.Integer)
+    created_at = db.Column(db.TIMESTAMP, default=datetime.utcnow)
+    
+    def __repr__(self) -> str:
+        return f'<RatingEvent {self.id}/{self.seq} {self.event_type} {self.user_id}-{self.isbn}>'
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'seq': self.seq,
+            'type': self.event_type,
+            'user_id': self.user_id,
+            'isbn': self.isbn,
+            'rating': self.rating,
+            'previous_rating': self.previous_rating,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
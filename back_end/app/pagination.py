@@ -0,0 +1,37 @@
+import base64
+import json
+from typing import Any, List, Optional
+
+from flask import request
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Curseur opaque (JSON en base64 URL) désignant le dernier élément servi."""
+    payload = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Décode un curseur ; lève ValueError s'il est invalide."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(payload.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Curseur invalide: {cursor}") from e
+    if not isinstance(values, list):
+        raise ValueError(f"Curseur invalide: {cursor}")
+    return values
+
+
+def cursor_requested() -> bool:
+    """Mode curseur : présence du paramètre `after` (vide pour la première page)."""
+    return 'after' in request.args
+
+
+def get_after() -> Optional[str]:
+    return request.args.get('after') or None
+
+
+def total_requested() -> bool:
+    """En mode curseur, le total n'est calculé que sur demande (`?count=1`)."""
+    return request.args.get('count', '').lower() in ('1', 'true', 'yes')
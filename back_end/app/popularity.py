@@ -0,0 +1,306 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import Flask, current_app
+from sqlalchemy import text
+
+from app import db
+from app.models import Book, BookPopularity
+
+# Changement validé à répercuter en mémoire : (isbn, delta_count, delta_sum, count, total)
+PopularityChange = Tuple[str, int, float, int, float]
+
+# Recalcul complet de la table matérialisée. Les notes Book-Crossing explicites
+# (1-10) sont ramenées sur 5 ; les notes implicites (0) sont ignorées.
+REFRESH_SQL = '''
+INSERT INTO book_popularity (isbn, rating_count, rating_sum, score, updated_at)
+SELECT r.isbn, SUM(r.n), SUM(r.s), 0, CURRENT_TIMESTAMP
+FROM (
+    SELECT isbn, COUNT(*) AS n, SUM("Book-Rating" / 2.0) AS s
+    FROM ratings WHERE "Book-Rating" > 0 GROUP BY isbn
+    UNION ALL
+    SELECT isbn, COUNT(*) AS n, SUM(rating) AS s
+    FROM user_book_ratings GROUP BY isbn
+) r
+JOIN books b ON b.isbn = r.isbn
+GROUP BY r.isbn
+'''
+
+# Le score est recalculé avec la moyenne globale connue du processus (:c) ;
+# `flask refresh-popularity` réaligne tous les scores sur la moyenne courante.
+UPSERT_SQL = '''
+INSERT INTO book_popularity (isbn, rating_count, rating_sum, score, updated_at)
+VALUES (:isbn, :delta_count, :delta_sum, (:m * :c + :delta_sum) / (:m + :delta_count), CURRENT_TIMESTAMP)
+ON CONFLICT (isbn) DO UPDATE SET
+    rating_count = book_popularity.rating_count + EXCLUDED.rating_count,
+    rating_sum = book_popularity.rating_sum + EXCLUDED.rating_sum,
+    score = (:m * :c + book_popularity.rating_sum + EXCLUDED.rating_sum)
+            / (:m + book_popularity.rating_count + EXCLUDED.rating_count),
+    updated_at = CURRENT_TIMESTAMP
+RETURNING rating_count, rating_sum
+'''
+
+# Recomptage de quelques livres (import, note remplacée inconnue) : les lignes
+# sont d'abord verrouillées, pour que le recomptage (instruction suivante, donc
+# nouvel instantané) voie toute mise à jour incrémentale validée entre-temps.
+LOCK_BOOKS_SQL = '''
+SELECT isbn, rating_count, rating_sum FROM book_popularity
+WHERE isbn = ANY(:isbns) ORDER BY isbn FOR UPDATE
+'''
+
+RECOUNT_SQL = '''
+INSERT INTO book_popularity (isbn, rating_count, rating_sum, score, updated_at)
+SELECT b.isbn, c.n, c.s, (:m * :c + c.s) / (:m + c.n), CURRENT_TIMESTAMP
+FROM books b
+CROSS JOIN LATERAL (
+    SELECT COALESCE(SUM(r.n), 0) AS n, COALESCE(SUM(r.s), 0) AS s
+    FROM (
+        SELECT COUNT(*) AS n, SUM("Book-Rating" / 2.0) AS s
+        FROM ratings WHERE isbn = b.isbn AND "Book-Rating" > 0
+        UNION ALL
+        SELECT COUNT(*) AS n, SUM(rating) AS s
+        FROM user_book_ratings WHERE isbn = b.isbn
+    ) r
+) c
+WHERE b.isbn = ANY(:isbns)
+ON CONFLICT (isbn) DO UPDATE SET
+    rating_count = EXCLUDED.rating_count,
+    rating_sum = EXCLUDED.rating_sum,
+    score = EXCLUDED.score,
+    updated_at = CURRENT_TIMESTAMP
+RETURNING isbn, rating_count, rating_sum
+'''
+
+RECOUNT_BATCH = 1000
+
+
+class PopularityRanking:
+    """Classement par moyenne bayésienne, servi depuis la mémoire du processus.
+
+    score = (m * C + somme des notes) / (m + nombre de notes), où C est la note
+    moyenne globale et m le nombre de notes « a priori ». Seule une fenêtre des
+    meilleurs livres est gardée en mémoire ; elle est mise à jour à chaque note
+    et relue depuis la table quand elle s'épuise ou vieillit.
+    """
+
+    def __init__(self, prior_count: float = 10.0, window: int = 200, reload_seconds: float = 300.0):
+        self.prior_count = prior_count
+        self.window = window
+        self.reload_seconds = reload_seconds
+
+        self.global_mean = 0.0
+        self.total_count = 0
+        self.total_books = 0
+        self.total_sum = 0.0
+        self.entries: Dict[str, Tuple[int, float]] = {}
+        self.books: Dict[str, Dict[str, Any]] = {}
+        self._ranking: Optional[List[str]] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        # Faux si la table book_popularity n'existe pas (base non migrée)
+        self.table_available = True
+
+    def score(self, count: int, total: float) -> float:
+        return (self.prior_count * self.global_mean + total) / (self.prior_count + count)
+
+    def refresh_table(self) -> None:
+        """Recalcule entièrement la table matérialisée et ses scores."""
+        db.session.execute(text('DELETE FROM book_popularity'))
+        db.session.execute(text(REFRESH_SQL))
+        totals = db.session.query(
+            db.func.coalesce(db.func.sum(BookPopularity.rating_count), 0),
+            db.func.coalesce(db.func.sum(BookPopularity.rating_sum), 0.0)
+        ).one()
+        global_mean = float(totals[1]) / totals[0] if totals[0] else 0.0
+        db.session.execute(
+            text('UPDATE book_popularity SET score = (:m * :c + rating_sum) / (:m + rating_count)'),
+            {'m': self.prior_count, 'c': global_mean}
+        )
+        db.session.commit()
+        self._loaded_at = None
+
+    def load(self) -> None:
+        """Charge la moyenne globale et la fenêtre des meilleurs livres."""
+        totals = db.session.query(
+            db.func.coalesce(db.func.sum(BookPopularity.rating_count), 0),
+            db.func.coalesce(db.func.sum(BookPopularity.rating_sum), 0.0),
+            db.func.count(BookPopularity.isbn).filter(BookPopularity.rating_count > 0)
+        ).one()
+        rows = db.session.query(
+            BookPopularity.isbn, BookPopularity.rating_count, BookPopularity.rating_sum
+        ).order_by(BookPopularity.score.desc()).limit(self.window).all()
+        books = Book.query.filter(Book.isbn.in_([row.isbn for row in rows])).all() if rows else []
+
+        with self._lock:
+            self.total_count = int(totals[0])
+            self.total_books = int(totals[2])
+            self.total_sum = float(totals[1])
+            self.global_mean = self.total_sum / self.total_count if self.total_count else 0.0
+            self.entries = {row.isbn: (row.rating_count, row.rating_sum) for row in rows}
+            self.books = {book.isbn: book.to_dict() for book in books}
+            self._ranking = None
+            self._loaded_at = time.monotonic()
+
+    def _needs_reload(self, n: int) -> bool:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.reload_seconds:
+            return True
+        # Fenêtre épuisée par des livres sortis du classement
+        return len(self.entries) < min(n, self.window) and len(self.entries) < self.total_books
+
+    def ensure_loaded(self, n: int = 0) -> None:
+        """Recharge la fenêtre si elle a expiré (nécessite un contexte d'application)."""
+        if self._needs_reload(n):
+            self.load()
+
+    def top(self, n: int = 20) -> List[Dict[str, Any]]:
+        """Retourne les `n` livres les plus populaires, sans requête en régime établi."""
+        self.ensure_loaded(n)
+
+        with self._lock:
+            if self._ranking is None:
+                self._ranking = sorted(self.entries, key=lambda isbn: self.score(*self.entries[isbn]), reverse=True)
+            ranking = self._ranking[:n]
+            result = []
+            for isbn in ranking:
+                book = self.books.get(isbn)
+                if book is None:
+                    continue
+                count, total = self.entries[isbn]
+                book = dict(book)
+                book['popularity'] = {
+                    'rating_count': count,
+                    'average_rating': round(total / count, 3) if count else 0.0,
+                    'score': round(self.score(count, total), 4)
+                }
+                result.append(book)
+            return result
+
+    def scores_for(self, isbns: List[str]) -> np.ndarray:
+        """Score de popularité de livres quelconques, sans requête (voir `ensure_loaded`).
+
+        Un livre hors de la fenêtre est classé derrière tous ceux de la fenêtre :
+        il reçoit le plus petit score connu, borné par la moyenne globale.
+        """
+        with self._lock:
+            scores = {isbn: self.score(*entry) for isbn, entry in self.entries.items()}
+        default = min(min(scores.values()), self.global_mean) if scores else self.global_mean
+        return np.array([scores.get(isbn, default) for isbn in isbns], dtype=np.float64)
+
+    def score_params(self) -> Dict[str, float]:
+        """Paramètres :m et :c des scores calculés en SQL (moyenne globale chargée au besoin)."""
+        if self._loaded_at is None:
+            self.load()
+        return {'m': float(self.prior_count), 'c': self.global_mean}
+
+    def record_rating_change(self, isbn: str, delta_count: int, delta_sum: float) -> Tuple[int, float]:
+        """Met à jour la ligne matérialisée (comptes et score) dans la transaction en cours."""
+        row = db.session.execute(
+            text(UPSERT_SQL), dict(self.score_params(), isbn=isbn, delta_count=delta_count, delta_sum=float(delta_sum))
+        ).one()
+        return int(row[0]), float(row[1])
+
+    def recount_books(self, isbns: List[str]) -> List[PopularityChange]:
+        """Recompte les lignes de quelques livres dans la transaction en cours.
+
+        Retourne, par livre, de quoi appeler `apply` après commit.
+        """
+        params = self.score_params()
+        changes: List[PopularityChange] = []
+        isbns = sorted(set(isbns))
+        for start in range(0, len(isbns), RECOUNT_BATCH):
+            batch = isbns[start:start + RECOUNT_BATCH]
+            previous = {row.isbn: (row.rating_count, row.rating_sum)
+                        for row in db.session.execute(text(LOCK_BOOKS_SQL), {'isbns': batch})}
+            for row in db.session.execute(text(RECOUNT_SQL), dict(params, isbns=batch)):
+                count, total = int(row.rating_count), float(row.rating_sum)
+                old_count, old_total = previous.get(row.isbn, (0, 0.0))
+                changes.append((row.isbn, count - old_count, total - old_total, count, total))
+        return changes
+
+    def apply(self, isbn: str, delta_count: int, delta_sum: float, count: int, total: float) -> None:
+        """Répercute en mémoire une note validée (après commit)."""
+        with self._lock:
+            self.total_count += delta_count
+            self.total_sum += delta_sum
+            self.global_mean = self.total_sum / self.total_count if self.total_count else 0.0
+            if count > 0 and count == delta_count:
+                self.total_books += 1
+            elif count <= 0 < count - delta_count:
+                self.total_books -= 1
+
+            if isbn in self.entries:
+                self.entries[isbn] = (count, total)
+            elif count > 0:
+                # Entrer dans la fenêtre uniquement en dépassant le dernier du classement
+                if len(self.entries) < self.window or \
+                        self.score(count, total) > min(self.score(*entry) for entry in self.entries.values()):
+                    self.entries[isbn] = (count, total)
+            self._ranking = None
+
+            missing = isbn in self.entries and isbn not in self.books
+
+        if missing:
+            book = Book.query.filter_by(isbn=isbn).first()
+            if book:
+                with self._lock:
+                    self.books[isbn] = book.to_dict()
+
+
+def init_popularity(app: Flask) -> None:
+    """Crée le classement de popularité partagé (chargé au premier usage)."""
+    app.extensions['popularity_ranking'] = PopularityRanking(
+        prior_count=app.config.get('POPULARITY_PRIOR_COUNT', 10),
+        window=app.config.get('POPULARITY_WINDOW', 200),
+        reload_seconds=app.config.get('POPULARITY_RELOAD_SECONDS', 300)
+    )
+
+    @app.cli.command('refresh-popularity')
+    def refresh_popularity_command() -> None:
+        """Recalcule la table matérialisée book_popularity."""
+        start = time.perf_counter()
+        app.extensions['popularity_ranking'].refresh_table()
+        print(f"✅ Popularité recalculée en {time.perf_counter() - start:.2f}s")
+
+
+def get_popularity_ranking() -> PopularityRanking:
+    ranking: PopularityRanking = current_app.extensions['popularity_ranking']
+    return ranking
+
+
+def record_rating_change(isbn: str, delta_count: int, delta_sum: float) -> Optional[PopularityChange]:
+    """Met à jour la popularité d'un livre avant commit ; retourne de quoi l'appliquer ensuite.
+
+    La mise à jour est isolée dans un point de sauvegarde : si la table
+    matérialisée est absente, la note elle-même est tout de même enregistrée.
+    """
+    try:
+        with db.session.begin_nested():
+            count, total = get_popularity_ranking().record_rating_change(isbn, delta_count, delta_sum)
+    except Exception as e:
+        print(f"Erreur lors de la mise à jour de la popularité: {str(e)}")
+        return None
+    return isbn, delta_count, delta_sum, count, total
+
+
+def recount_books(isbns: List[str]) -> List[PopularityChange]:
+    """Recompte la popularité de livres avant commit ; retourne les changements à appliquer ensuite.
+
+    Isolé dans un point de sauvegarde, comme `record_rating_change`.
+    """
+    ranking = get_popularity_ranking()
+    if not isbns or not ranking.table_available:
+        return []
+    try:
+        with db.session.begin_nested():
+            return ranking.recount_books(isbns)
+    except Exception as e:
+        print(f"Erreur lors du recomptage de la popularité: {str(e)}")
+        return []
+
+
+def apply_rating_change(change: Optional[PopularityChange]) -> None:
+    """Répercute en mémoire une mise à jour de popularité une fois la note validée."""
+    if change is not None:
+        get_popularity_ranking().apply(*change)
@@ -0,0 +1,87 @@
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, List, cast
+
+from sqlalchemy import CursorResult, text
+
+from app import db
+from app.models import RatingEvent
+
+# Réveil des flux SSE du processus après une écriture de note ; les écritures
+# des autres workers sont vues au prochain intervalle de scrutation.
+_new_events = threading.Condition()
+
+# Publication par les lecteurs, un seul à la fois (verrou tenté, jamais attendu ;
+# les écritures de notes ne le prennent pas). Seuls les événements des
+# transactions terminées (xid sous l'horizon pg_snapshot_xmin) sont numérotés,
+# dans l'ordre (xid, id) : toute transaction encore susceptible de valider un
+# événement a un xid au moins égal à l'horizon, donc un numéro futur plus grand.
+PUBLISH_LOCK_SQL = "SELECT pg_try_advisory_xact_lock(hashtext('rating_events_publish'))"
+PUBLISH_SQL = '''
+WITH ready AS (
+    SELECT id, row_number() OVER (ORDER BY xid, id) AS n
+    FROM rating_events
+    WHERE seq IS NULL AND xid < pg_snapshot_xmin(pg_current_snapshot())
+    ORDER BY xid, id
+    LIMIT :limit
+)
+UPDATE rating_events e
+SET seq = (SELECT COALESCE(MAX(seq), 0) FROM rating_events) + r.n
+FROM ready r
+WHERE e.id = r.id
+'''
+
+
+def publish_events(limit: int = 10000) -> int:
+    """Numérote les événements prêts ; retourne leur nombre (0 si un autre lecteur publie)."""
+    try:
+        if not db.session.execute(text(PUBLISH_LOCK_SQL)).scalar():
+            db.session.rollback()
+            return 0
+        result = cast('CursorResult[Any]', db.session.execute(text(PUBLISH_SQL), {'limit': limit}))
+        published = result.rowcount
+        db.session.commit()
+        return published
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def events_since(since: int, limit: int) -> List[Dict[str, Any]]:
+    """Événements publiés de numéro strictement supérieur à `since`, dans l'ordre."""
+    publish_events()
+    events = RatingEvent.query.filter(RatingEvent.seq > since).order_by(RatingEvent.seq).limit(limit).all()
+    return [event.to_dict() for event in events]
+
+
+def notify_rating_events() -> None:
+    with _new_events:
+        _new_events.notify_all()
+
+
+def sse_message(event: Dict[str, Any]) -> str:
+    return f"id: {event['seq']}\nevent: rating\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+def stream_events(since: int, batch_size: int = 500, poll_seconds: float = 1.0,
+                  heartbeat_seconds: float = 15.0) -> Iterator[str]:
+    """Flux SSE des événements après `since` ; l'`id` de chaque message sert de reprise (Last-Event-ID)."""
+    last_sent = time.monotonic()
+    yield 'retry: 3000\n\n'
+    while True:
+        events = events_since(since, batch_size)
+        # Rendre la connexion au pool entre deux lectures
+        db.session.remove()
+        for event in events:
+            yield sse_message(event)
+            since = event['seq']
+        if events:
+            last_sent = time.monotonic()
+            if len(events) == batch_size:
+                continue
+        elif time.monotonic() - last_sent >= heartbeat_seconds:
+            yield ': keepalive\n\n'
+            last_sent = time.monotonic()
+        with _new_events:
+            _new_events.wait(poll_seconds)
@@ -0,0 +1,74 @@
+from typing import Any, Dict, Iterable, List
+
+from flask import Flask, current_app
+from sqlalchemy import func
+
+from app import db
+from app.models import BookRatingStats, UserBookRating
+
+
+def empty_stats() -> Dict[str, float]:
+    return BookRatingStats(rating_count=0, rating_sum=0, one_star=0, two_stars=0,
+                           three_stars=0, four_stars=0, five_stars=0).to_dict()
+
+
+class RatingStatsStore:
+    """Statistiques des notes par livre, lues par clé primaire dans `book_rating_stats`.
+
+    La table est maintenue par déclencheur (data/sql/book_rating_stats.sql).
+    Tant qu'elle n'existe pas, les statistiques sont recalculées à partir de
+    `user_book_ratings` en une requête groupée.
+    """
+
+    def __init__(self) -> None:
+        self.available = True
+
+    def live(self, isbns: List[str]) -> Dict[str, Dict[str, float]]:
+        rows = db.session.query(
+            UserBookRating.isbn,
+            func.count(UserBookRating.id).label('rating_count'),
+            func.sum(UserBookRating.rating).label('rating_sum'),
+            *(func.count(UserBookRating.id).filter(UserBookRating.rating == star).label(column)
+              for star, column in enumerate(('one_star', 'two_stars', 'three_stars', 'four_stars', 'five_stars'), 1))
+        ).filter(UserBookRating.isbn.in_(isbns)).group_by(UserBookRating.isbn).all()
+        return {
+            row.isbn: BookRatingStats(**{key: int(value or 0) for key, value in row._asdict().items() if key != 'isbn'}).to_dict()
+            for row in rows
+        }
+
+    def get_many(self, isbns: Iterable[str]) -> Dict[str, Dict[str, float]]:
+        """Statistiques de plusieurs livres en une requête (livres sans note compris)."""
+        isbns = list(dict.fromkeys(isbns))
+        if not isbns:
+            return {}
+        stats = None
+        if self.available:
+            try:
+                stats = {row.isbn: row.to_dict()
+                         for row in BookRatingStats.query.filter(BookRatingStats.isbn.in_(isbns))}
+            except Exception as e:
+                db.session.rollback()
+                self.available = False
+                print(f"Table book_rating_stats indisponible, calcul à la volée: {str(e)}")
+        if stats is None:
+            stats = self.live(isbns)
+        return {isbn: stats.get(isbn) or empty_stats() for isbn in isbns}
+
+
+def init_rating_stats(app: Flask) -> None:
+    app.extensions['rating_stats'] = RatingStatsStore()
+
+
+def get_rating_stats_store() -> RatingStatsStore:
+    store: RatingStatsStore = current_app.extensions['rating_stats']
+    return store
+
+
+def book_rating_stats(isbn: str) -> Dict[str, float]:
+    return get_rating_stats_store().get_many([isbn])[isbn]
+
+
+def with_rating_stats(books: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copie des livres sérialisés avec leurs statistiques de notes (une requête pour la page)."""
+    stats = get_rating_stats_store().get_many(book['isbn'] for book in books)
+    return [dict(book, rating_stats=stats[book['isbn']]) for book in books]
@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from typing import IO, Any, Dict, Iterator, Sequence
+
+from sqlalchemy import select
+
+from app import db
+from app.cache import invalidate_user_recommendations
+from app.http_cache import get_version_store
+from app.models import UserBookRating
+from app.popularity import get_popularity_ranking
+from app.rating_events import notify_rating_events
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_COLUMNS = ('user_id', 'isbn', 'rating', 'review', 'created_at', 'updated_at')
+
+# Table de transit de l'import, supprimée à la fin de la transaction ; `line`
+# conserve l'ordre du fichier pour que la dernière ligne d'un doublon l'emporte.
+STAGING_SQL = '''
+CREATE TEMP TABLE rating_import (
+    line BIGSERIAL,
+    user_id INTEGER,
+    isbn VARCHAR(20),
+    rating INTEGER,
+    review TEXT
+) ON COMMIT DROP
+'''
+
+COPY_SQL = 'COPY rating_import (user_id, isbn, rating, review) FROM STDIN WITH (FORMAT csv, HEADER true)'
+
+# Fusion en une instruction : lignes sans utilisateur, sans livre ou hors de 1-5 ignorées
+MERGE_SQL = '''
+INSERT INTO user_book_ratings (user_id, isbn, rating, review, created_at, updated_at)
+SELECT DISTINCT ON (i.user_id, i.isbn) i.user_id, i.isbn, i.rating, COALESCE(i.review, ''), %(now)s, %(now)s
+FROM rating_import i
+JOIN auth_users u ON u.user_id = i.user_id
+JOIN books b ON b.isbn = i.isbn
+WHERE i.rating BETWEEN 1 AND 5
+ORDER BY i.user_id, i.isbn, i.line DESC
+ON CONFLICT (user_id, isbn) DO UPDATE SET
+    rating = EXCLUDED.rating,
+    review = EXCLUDED.review,
+    updated_at = EXCLUDED.updated_at
+'''
+
+# Utilisateurs et livres dont les notes ont pu changer (lus avant la suppression de la table de transit)
+IMPORTED_USERS_SQL = '''
+SELECT DISTINCT i.user_id FROM rating_import i JOIN auth_users u ON u.user_id = i.user_id
+'''
+
+IMPORTED_BOOKS_SQL = '''
+SELECT DISTINCT i.isbn FROM rating_import i JOIN books b ON b.isbn = i.isbn
+'''
+
+
+def _export_row(row: Sequence[Any]) -> Dict[str, object]:
+    return {
+        column: value.isoformat() if isinstance(value, datetime) else value
+        for column, value in zip(EXPORT_COLUMNS, row)
+    }
+
+
+def export_ratings(fmt: str = 'ndjson', batch_size: int = 5000) -> Iterator[str]:
+    """Toutes les notes, en NDJSON ou CSV, lues par curseur côté serveur.
+
+    Seul un lot de `batch_size` lignes est en mémoire à la fois, quelle que
+    soit la taille de la table. Une connexion dédiée est gardée pendant tout
+    l'export.
+    """
+    statement = select(*(getattr(UserBookRating, column) for column in EXPORT_COLUMNS)).order_by(UserBookRating.id)
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue()
+
+    with db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(statement)
+        for partition in result.partitions():
+            if fmt == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for row in partition:
+                    writer.writerow(_export_row(row).values())
+                yield buffer.getvalue()
+            else:
+                yield ''.join(json.dumps(_export_row(row), ensure_ascii=False) + '\n' for row in partition)
+
+
+def import_ratings(stream: IO[bytes]) -> Dict[str, object]:
+    """Importe un CSV (en-tête user_id,isbn,rating,review) par COPY puis fusion.
+
+    Tout se fait dans une transaction : les déclencheurs de user_book_ratings
+    tiennent à jour statistiques et journal des notes.
+
+    Après le commit, la popularité des seuls livres importés est recomptée
+    (table et classement du processus) et les recommandations en cache des
+    utilisateurs importés sont invalidées. Lève ValueError si le fichier ne
+    peut pas être chargé, RuntimeError si la popularité n'a pas pu être
+    recomptée (les notes sont alors importées : lancer `flask refresh-popularity`).
+    """
+    start = time.perf_counter()
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(STAGING_SQL)
+        try:
+            cursor.copy_expert(COPY_SQL, stream)
+        except Exception as e:
+            raise ValueError(f"Fichier de notes invalide: {str(e)}") from e
+        received = cursor.rowcount
+        copied_at = time.perf_counter()
+
+        cursor.execute(MERGE_SQL, {'now': datetime.utcnow()})
+        merged = cursor.rowcount
+        cursor.execute(IMPORTED_USERS_SQL)
+        user_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute(IMPORTED_BOOKS_SQL)
+        isbns = [row[0] for row in cursor.fetchall()]
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    merged_at = time.perf_counter()
+    if merged:
+        for user_id in user_ids:
+            invalidate_user_recommendations(user_id)
+        get_version_store().invalidate('book_rating_stats')
+        notify_rating_events()
+        ranking = get_popularity_ranking()
+        if ranking.table_available:
+            try:
+                changes = ranking.recount_books(isbns)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                raise RuntimeError(f"Notes importées mais popularité non recomptée "
+                                   f"(lancer flask refresh-popularity): {str(e)}") from e
+            for change in changes:
+                ranking.apply(*change)
+
+    elapsed = merged_at - start
+    return {
+        'rows_received': received,
+        'rows_merged': merged,
+        'rows_skipped': received - merged,
+        'copy_seconds': round(copied_at - start, 3),
+        'merge_seconds': round(elapsed - (copied_at - start), 3),
+        'rows_per_second': round(received / elapsed) if elapsed > 0 else None,
+        'users_updated': len(user_ids),
+        'books_updated': len(isbns),
+        'refresh_seconds': round(time.perf_counter() - merged_at, 3)
+    }
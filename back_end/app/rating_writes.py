@@ -0,0 +1,268 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from flask import Flask, current_app
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, ProgrammingError
+
+from app import db
+from app.cache import invalidate_user_recommendations
+from app.models import UserBookRating
+from app.popularity import apply_rating_change, get_popularity_ranking, recount_books
+from app.rating_events import notify_rating_events
+from app.http_cache import get_version_store
+
+# Code SQLSTATE d'une violation de clé étrangère (livre inexistant)
+FOREIGN_KEY_VIOLATION = '23503'
+
+# Code SQLSTATE d'une table inexistante (book_popularity non migrée)
+UNDEFINED_TABLE = '42P01'
+
+# Validation de la session, écriture, ancienne note et popularité en une instruction.
+# `created` vient de la ligne écrite (xmax = 0 : insérée, non mise à jour). `previous`
+# verrouille les notes existantes et lit leur dernière version validée ; une note
+# insérée entre-temps par une transaction concurrente n'y figure pas (created faux,
+# previous_rating NULL) et son livre est recompté après l'instruction.
+UPSERT_RATINGS_SQL = '''
+WITH incoming (n, session_id, isbn, rating, review) AS (
+    VALUES {values}
+),
+valid AS (
+    SELECT i.n, s.user_id, i.isbn, i.rating, i.review
+    FROM incoming i
+    JOIN user_sessions s ON s.session_id = i.session_id AND s.expires_at > :now
+),
+previous AS (
+    SELECT r.user_id, r.isbn, r.rating
+    FROM user_book_ratings r
+    JOIN valid v ON v.user_id = r.user_id AND v.isbn = r.isbn
+    FOR UPDATE OF r
+),
+written AS (
+    INSERT INTO user_book_ratings (user_id, isbn, rating, review, created_at, updated_at)
+    SELECT user_id, isbn, rating, review, :now, :now FROM valid
+    ON CONFLICT (user_id, isbn) DO UPDATE SET
+        rating = EXCLUDED.rating,
+        review = EXCLUDED.review,
+        updated_at = EXCLUDED.updated_at
+    RETURNING id, user_id, isbn, rating, review, created_at, updated_at, (xmax = 0) AS created
+),
+changes AS (
+    SELECT v.n, w.id, w.user_id, w.isbn, w.rating, w.review, w.created_at, w.updated_at, w.created,
+           p.rating AS previous_rating
+    FROM written w
+    JOIN valid v ON v.user_id = w.user_id AND v.isbn = w.isbn
+    LEFT JOIN previous p ON p.user_id = w.user_id AND p.isbn = w.isbn
+){popularity}
+'''
+
+# Sans table book_popularity : les notes seules
+CHANGES_ONLY_SQL = '''
+SELECT c.*, NULL AS delta_count, NULL AS delta_sum, NULL AS popularity_count, NULL AS popularity_sum
+FROM changes c
+'''
+
+# Popularité : un delta agrégé par livre, appliqué dans la même instruction
+POPULARITY_SQL = ''',
+deltas AS (
+    SELECT isbn, COUNT(*) FILTER (WHERE created) AS delta_count,
+           SUM(rating - COALESCE(previous_rating, 0)) AS delta_sum
+    FROM changes
+    WHERE created OR previous_rating IS NOT NULL
+    GROUP BY isbn
+),
+popularity AS (
+    INSERT INTO book_popularity (isbn, rating_count, rating_sum, score, updated_at)
+    SELECT isbn, delta_count, delta_sum, (:m * :c + delta_sum) / (:m + delta_count), CURRENT_TIMESTAMP
+    FROM deltas
+    WHERE delta_count <> 0 OR delta_sum <> 0
+    ON CONFLICT (isbn) DO UPDATE SET
+        rating_count = book_popularity.rating_count + EXCLUDED.rating_count,
+        rating_sum = book_popularity.rating_sum + EXCLUDED.rating_sum,
+        score = (:m * :c + book_popularity.rating_sum + EXCLUDED.rating_sum)
+                / (:m + book_popularity.rating_count + EXCLUDED.rating_count),
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING isbn, rating_count, rating_sum
+)
+SELECT c.*, d.delta_count, d.delta_sum, p.rating_count AS popularity_count, p.rating_sum AS popularity_sum
+FROM changes c
+LEFT JOIN deltas d ON d.isbn = c.isbn
+LEFT JOIN popularity p ON p.isbn = c.isbn
+'''
+
+
+class RatingWrite(NamedTuple):
+    session_id: str
+    isbn: str
+    rating: int
+    review: str
+
+
+def _upsert_ratings(writes: List[RatingWrite], now: datetime, with_popularity: bool) -> List[Dict[str, Any]]:
+    params: Dict[str, object] = {'now': now}
+    values = []
+    for n, write in enumerate(writes):
+        values.append(f'(:n{n}, :session_id{n}, :isbn{n}, :rating{n}, :review{n})')
+        params.update({f'n{n}': n, f'session_id{n}': write.session_id, f'isbn{n}': write.isbn,
+                       f'rating{n}': write.rating, f'review{n}': write.review})
+    if with_popularity:
+        params.update(get_popularity_ranking().score_params())
+    sql = UPSERT_RATINGS_SQL.format(values=', '.join(values),
+                                    popularity=POPULARITY_SQL if with_popularity else CHANGES_ONLY_SQL)
+    return [dict(row) for row in db.session.execute(text(sql), params).mappings()]
+
+
+def write_ratings(writes: List[RatingWrite]) -> List[Optional[Dict[str, Any]]]:
+    """Écrit des notes et leur popularité en une instruction, puis valide la transaction.
+
+    Retourne, pour chaque note, {'created', 'rating'} ou None si la session
+    est invalide ou expirée. L'existence du livre est garantie par la clé
+    étrangère : un livre inconnu lève LookupError (note seule) ou
+    IntegrityError (lot, à réécrire note par note).
+    """
+    now = datetime.utcnow()
+    ranking = get_popularity_ranking()
+    with_popularity = ranking.table_available
+    try:
+        try:
+            rows = _upsert_ratings(writes, now, with_popularity)
+        except ProgrammingError as e:
+            if not with_popularity or getattr(e.orig, 'pgcode', None) != UNDEFINED_TABLE:
+                raise
+            # Base sans table book_popularity : la note est tout de même enregistrée
+            db.session.rollback()
+            ranking.table_available = with_popularity = False
+            print(f"Table book_popularity indisponible, popularité non mise à jour: {str(e)}")
+            rows = _upsert_ratings(writes, now, with_popularity)
+
+        # Note remplacée inconnue (insertion concurrente) : livre recompté, rare
+        raced = [row['isbn'] for row in rows if not row['created'] and row['previous_rating'] is None]
+        recounts = recount_books(raced) if with_popularity and raced else []
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if len(writes) == 1 and getattr(e.orig, 'pgcode', None) == FOREIGN_KEY_VIOLATION:
+            raise LookupError('Livre non trouvé') from e
+        raise
+
+    changes = {row['isbn']: (row['isbn'], int(row['delta_count']), float(row['delta_sum']),
+                             int(row['popularity_count']), float(row['popularity_sum']))
+               for row in rows if row['popularity_count'] is not None}
+    for change in list(changes.values()) + recounts:
+        apply_rating_change(change)
+    for user_id in {row['user_id'] for row in rows}:
+        invalidate_user_recommendations(user_id)
+    if rows:
+        get_version_store().invalidate('book_rating_stats')
+        notify_rating_events()
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(writes)
+    for row in rows:
+        rating = UserBookRating(**{key: row[key] for key in
+                                   ('id', 'user_id', 'isbn', 'rating', 'review', 'created_at', 'updated_at')})
+        results[row['n']] = {'created': row['created'], 'rating': rating.to_dict()}
+    return results
+
+
+# Note en attente d'écriture et résultat promis à la requête
+PendingWrite = Tuple[RatingWrite, 'Future[Optional[Dict[str, Any]]]']
+
+
+class RatingBatcher:
+    """Regroupe les notes reçues pendant `window_ms` en une seule instruction multi-lignes.
+
+    Les requêtes attendent le résultat de leur lot ; la réponse n'est donc
+    envoyée qu'une fois la note validée. Si le lot échoue (livre inconnu,
+    même livre noté par deux sessions d'un utilisateur), ses notes sont
+    réécrites une par une pour isoler l'erreur.
+    """
+
+    def __init__(self, app: Flask, window_ms: float = 5.0, max_batch: int = 200):
+        self.app = app
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: 'queue.Queue[PendingWrite]' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, write: RatingWrite, timeout: float) -> Optional[Dict[str, Any]]:
+        future: 'Future[Optional[Dict[str, Any]]]' = Future()
+        self._ensure_started()
+        self._queue.put((write, future))
+        return future.result(timeout=timeout)
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='rating-batcher', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            with self.app.app_context():
+                self._flush(batch)
+
+    def _flush(self, batch: List[PendingWrite]) -> None:
+        # Une instruction ne peut modifier deux fois la même ligne : dernière note par (session, livre)
+        latest: Dict[Tuple[str, str], RatingWrite] = {}
+        for write, _ in batch:
+            latest[(write.session_id, write.isbn)] = write
+        writes = list(latest.values())
+
+        outcomes: Dict[Tuple[str, str], Union[Optional[Dict[str, Any]], Exception]] = {}
+        try:
+            for write, result in zip(writes, write_ratings(writes)):
+                outcomes[(write.session_id, write.isbn)] = result
+        except Exception as e:
+            db.session.rollback()
+            if len(writes) == 1:
+                outcomes[(writes[0].session_id, writes[0].isbn)] = e
+            else:
+                print(f"Lot de {len(writes)} notes en échec, écriture note par note: {str(e)}")
+                for write in writes:
+                    try:
+                        outcomes[(write.session_id, write.isbn)] = write_ratings([write])[0]
+                    except Exception as error:
+                        db.session.rollback()
+                        outcomes[(write.session_id, write.isbn)] = error
+
+        for write, future in batch:
+            outcome = outcomes[(write.session_id, write.isbn)]
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+
+def init_rating_writes(app: Flask) -> None:
+    batcher = None
+    if app.config.get('RATING_BATCH_ENABLED', False):
+        batcher = RatingBatcher(
+            app,
+            window_ms=app.config.get('RATING_BATCH_WINDOW_MS', 5),
+            max_batch=app.config.get('RATING_BATCH_MAX', 200)
+        )
+        print("✅ Regroupement des écritures de notes activé")
+    app.extensions['rating_batcher'] = batcher
+
+
+def submit_rating(write: RatingWrite) -> Optional[Dict[str, Any]]:
+    """Écrit une note, directement ou via le regroupement en lots s'il est activé."""
+    batcher: Optional[RatingBatcher] = current_app.extensions.get('rating_batcher')
+    if batcher is None:
+        return write_ratings([write])[0]
+    return batcher.submit(write, timeout=current_app.config.get('RATING_BATCH_TIMEOUT', 5))
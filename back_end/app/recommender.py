@@ -0,0 +1,448 @@
+import os
+import click
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from datetime import datetime
+from typing import Any, Collection, Dict, List, Optional
+from flask import Flask, current_app
+from sqlalchemy import text
+from app import db
+from app.models import Book, UserRecommendation
+from app.popularity import PopularityRanking
+from recommendation_engine import RecommendationEngine
+from similarity_index import SimilarityIndex
+from collaborative_engine import CollaborativeEngine, auth_user_key, interactions_from_db
+from hybrid_ranker import HybridRanker
+
+# Threads dédiés au calcul des recommandations, pour pouvoir borner leur durée
+_scoring_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='recommender')
+_ranker = HybridRanker()
+
+# Version de la table books (data/sql/book_versions.sql) et heure du serveur SQL
+CATALOGUE_STATE_SQL = "SELECT version, now() AT TIME ZONE 'utc' AS now FROM table_versions WHERE table_name = 'books'"
+MODIFIED_BOOKS_SQL = 'SELECT isbn FROM books WHERE updated_at > :since'
+
+
+def catalogue_state() -> Optional[Dict[str, Any]]:
+    """Version du catalogue à enregistrer avec les artefacts, ou None si non migré.
+
+    table_versions et books.updated_at viennent de data/sql/book_versions.sql.
+    """
+    try:
+        row = db.session.execute(text(CATALOGUE_STATE_SQL)).first()
+    except Exception:
+        db.session.rollback()
+        return None
+    if row is None:
+        return None
+    synced_at = row.now.replace(tzinfo=None).isoformat() if isinstance(row.now, datetime) else None
+    return {'version': row.version, 'synced_at': synced_at}
+
+
+def save_recommender(app: Flask, engine: RecommendationEngine) -> None:
+    artifact_dir = app.config.get('RECOMMENDER_ARTIFACT_DIR')
+    if artifact_dir:
+        try:
+            engine.save(artifact_dir)
+            print(f"✅ Artefacts du moteur sauvegardés dans {artifact_dir}")
+        except OSError as e:
+            print(f"Impossible de sauvegarder les artefacts du moteur: {str(e)}")
+
+
+def build_recommender(app: Flask) -> RecommendationEngine:
+    """Entraîne un moteur sur tout le catalogue et sauvegarde ses artefacts."""
+    engine = RecommendationEngine(incremental=app.config.get('RECOMMENDER_INCREMENTAL', True))
+    with app.app_context():
+        # Relevée avant la lecture : une écriture concurrente sera rattrapée au démarrage suivant
+        catalogue = catalogue_state()
+        books = Book.query.all()
+    if not books:
+        print("Aucun livre trouvé pour initialiser le moteur de recommandation")
+        return engine
+
+    engine.fit(books)
+    engine.catalogue = catalogue
+    print(f"✅ Moteur de recommandation entraîné sur {len(books)} livres")
+    save_recommender(app, engine)
+    return engine
+
+
+def sync_recommender(app: Flask, engine: RecommendationEngine) -> None:
+    """Rattrape sur un moteur chargé les livres créés, modifiés ou supprimés depuis sa sauvegarde.
+
+    Les mises à jour incrémentales des routes ne sont faites qu'en mémoire :
+    sans ce rattrapage, elles seraient perdues au redémarrage. Le moteur mis à
+    jour est réécrit pour que les workers suivants démarrent synchronisés.
+
+    Le rattrapage s'appuie sur table_versions et books.updated_at
+    (data/sql/book_versions.sql) : sans eux, ou sans date de sauvegarde dans
+    les artefacts, il est ignoré et les artefacts sont servis tels quels.
+    """
+    with app.app_context():
+        catalogue = catalogue_state()
+        if catalogue is None:
+            print("⚠️ Synchronisation du moteur de recommandation ignorée : table_versions absente "
+                  "(appliquer data/sql/book_versions.sql)")
+            return
+        saved = engine.catalogue or {}
+        if catalogue['version'] == saved.get('version'):
+            return
+        if not saved.get('synced_at'):
+            print("⚠️ Synchronisation du moteur de recommandation ignorée : artefacts sans version du catalogue "
+                  "(relancer flask build-recommender)")
+            return
+
+        try:
+            changed = {isbn for (isbn,) in db.session.execute(
+                text(MODIFIED_BOOKS_SQL), {'since': datetime.fromisoformat(saved['synced_at'])}
+            )}
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Synchronisation du moteur de recommandation ignorée : books.updated_at illisible: {str(e)}")
+            return
+        current = {isbn for (isbn,) in db.session.query(Book.isbn)}
+        known = set(engine.book_index)
+        changed |= current - known
+        removed = known - current
+
+        added = sorted(changed & current)
+        for start in range(0, len(added), 1000):
+            engine.add_books(Book.query.filter(Book.isbn.in_(added[start:start + 1000])).all())
+        for isbn in removed:
+            engine.remove_book(isbn)
+        engine.catalogue = catalogue
+
+    print(f"✅ Moteur de recommandation synchronisé: {len(added)} livres ajoutés ou modifiés, "
+          f"{len(removed)} supprimés")
+    if added or removed:
+        save_recommender(app, engine)
+
+
+def init_recommender(app: Flask) -> None:
+    """Charge le moteur partagé depuis ses artefacts, ou l'entraîne à défaut."""
+    @app.cli.command('build-recommender')
+    def build_recommender_command() -> None:
+        """Réentraîne le moteur de recommandation et réécrit ses artefacts."""
+        engine = build_recommender(app)
+        if engine.store is not None:
+            build_similarity_index(app, engine)
+        if app.config.get('COLLABORATIVE_ENABLED', False):
+            build_collaborative(app)
+
+    @app.cli.command('build-similarity-index')
+    def build_similarity_index_command() -> None:
+        """Reconstruit la table des livres similaires du moteur chargé."""
+        engine = app.extensions.get('recommendation_engine')
+        if engine is None or engine.store is None:
+            print("Moteur de recommandation indisponible : aucun index construit")
+            return
+        build_similarity_index(app, engine)
+
+    @app.cli.command('batch-recommendations')
+    @click.option('--workers', type=int, default=None, help="Nombre de processus de calcul")
+    @click.option('--chunk-size', type=int, default=500, help="Utilisateurs notés par produit matriciel")
+    @click.option('--limit', type=int, default=20, help="Recommandations conservées par utilisateur")
+    def batch_recommendations_command(workers: Optional[int], chunk_size: int, limit: int) -> None:
+        """Précalcule les recommandations de tous les utilisateurs (table user_recommendations)."""
+        from batch_recommendations import run_batch
+        engine = app.extensions.get('recommendation_engine')
+        if engine is None:
+            print("Moteur de recommandation désactivé (RECOMMENDER_ENABLED=0) : aucun calcul")
+            return
+        run_batch(engine, app.config.get('RECOMMENDER_ARTIFACT_DIR'),
+                  n_recommendations=limit, chunk_size=chunk_size, workers=workers)
+
+    if not app.config.get('RECOMMENDER_ENABLED', True):
+        print("ℹ️ Moteur de recommandation désactivé")
+        return
+
+    engine = None
+    artifact_dir = app.config.get('RECOMMENDER_ARTIFACT_DIR')
+    if artifact_dir and os.path.exists(os.path.join(artifact_dir, 'manifest.json')):
+        try:
+            engine = RecommendationEngine.load(artifact_dir)
+            print(f"✅ Moteur de recommandation chargé depuis {artifact_dir} ({len(engine.books)} livres)")
+        except Exception as e:
+            print(f"Artefacts du moteur illisibles, réentraînement: {str(e)}")
+        if engine is not None:
+            try:
+                sync_recommender(app, engine)
+            except Exception as e:
+                print(f"Erreur lors de la synchronisation du moteur de recommandation: {str(e)}")
+
+    if engine is None:
+        try:
+            engine = build_recommender(app)
+        except Exception as e:
+            print(f"Erreur lors de l'initialisation du moteur de recommandation: {str(e)}")
+            engine = RecommendationEngine(incremental=app.config.get('RECOMMENDER_INCREMENTAL', True))
+
+    app.extensions['recommendation_engine'] = engine
+    init_similarity_index(app, engine)
+    init_collaborative(app)
+
+
+def build_collaborative(app: Flask) -> CollaborativeEngine:
+    """Entraîne le modèle collaboratif sur toutes les notes et sauvegarde ses facteurs."""
+    collaborative = CollaborativeEngine(n_factors=app.config.get('COLLABORATIVE_FACTORS', 32))
+    with app.app_context():
+        collaborative.fit(interactions_from_db())
+
+    collaborative_dir = app.config.get('COLLABORATIVE_DIR')
+    if collaborative_dir:
+        try:
+            collaborative.save(collaborative_dir)
+            print(f"✅ Modèle collaboratif sauvegardé dans {collaborative_dir}")
+        except OSError as e:
+            print(f"Impossible de sauvegarder le modèle collaboratif: {str(e)}")
+    return collaborative
+
+
+def init_collaborative(app: Flask) -> None:
+    """Charge le modèle collaboratif entraîné par `flask build-recommender`, si activé.
+
+    L'entraînement ALS n'est jamais fait au démarrage : chaque worker ne fait
+    que projeter en mémoire les facteurs sauvegardés.
+    """
+    if not app.config.get('COLLABORATIVE_ENABLED', False):
+        return
+    collaborative_dir = app.config.get('COLLABORATIVE_DIR')
+    if not collaborative_dir or not os.path.exists(os.path.join(collaborative_dir, 'model.json')):
+        print("ℹ️ Modèle collaboratif absent : lancer `flask build-recommender` pour l'entraîner")
+        return
+    try:
+        app.extensions['collaborative_engine'] = CollaborativeEngine.load(collaborative_dir)
+        print(f"✅ Modèle collaboratif chargé depuis {collaborative_dir}")
+    except Exception as e:
+        print(f"Modèle collaboratif illisible: {str(e)}")
+
+
+def build_similarity_index(app: Flask, engine: RecommendationEngine) -> SimilarityIndex:
+    """Calcule la table des voisins à partir des vecteurs du moteur et la sauvegarde."""
+    if engine.store is None:
+        raise ValueError("Le moteur doit être entraîné avant de construire l'index de similarité")
+    index = SimilarityIndex(k=app.config.get('SIMILARITY_INDEX_K', 20))
+    index.build(engine.store.matrix, engine.store.active_mask)
+    index.stats['engine_created_at'] = engine.created_at
+
+    index_dir = app.config.get('SIMILARITY_INDEX_DIR')
+    if index_dir:
+        try:
+            index.save(index_dir)
+        except OSError as e:
+            print(f"Impossible de sauvegarder l'index de similarité: {str(e)}")
+    return index
+
+
+def init_similarity_index(app: Flask, engine: RecommendationEngine) -> None:
+    """Charge l'index des livres similaires s'il correspond au moteur.
+
+    L'index n'est jamais construit au démarrage (calcul exact par blocs sur
+    tout le catalogue, refait par chaque processus) : il est produit hors
+    ligne par `flask build-recommender` ou `flask build-similarity-index`.
+    Sans index, les livres similaires sont calculés à la demande.
+    """
+    if engine.store is None:
+        return
+
+    index_dir = app.config.get('SIMILARITY_INDEX_DIR')
+    if not index_dir or not os.path.exists(os.path.join(index_dir, 'stats.json')):
+        print("ℹ️ Index de similarité absent (flask build-similarity-index), calcul à la demande")
+        return
+    try:
+        index = SimilarityIndex.load(index_dir)
+    except Exception as e:
+        print(f"Index de similarité illisible, calcul à la demande: {str(e)}")
+        return
+    if index.stats.get('engine_created_at') != engine.created_at:
+        print("Index de similarité obsolète (flask build-similarity-index), calcul à la demande")
+        return
+
+    app.extensions['similarity_index'] = index
+
+
+def get_recommendation_engine() -> Optional[RecommendationEngine]:
+    """Retourne le moteur partagé de l'application courante, ou None."""
+    engine: Optional[RecommendationEngine] = current_app.extensions.get('recommendation_engine')
+    return engine
+
+
+def get_similarity_index() -> Optional[SimilarityIndex]:
+    """Retourne l'index des livres similaires de l'application courante, ou None."""
+    index: Optional[SimilarityIndex] = current_app.extensions.get('similarity_index')
+    return index
+
+
+def get_similar_books(isbn: str, n: int = 10) -> Optional[List[Dict[str, Any]]]:
+    """Retourne les livres les plus proches d'un ISBN, ou None s'il est inconnu.
+
+    Les livres présents dans l'index sont servis depuis la table précalculée ;
+    un livre ajouté depuis la construction de l'index est comparé à tout le
+    catalogue en attendant la prochaine reconstruction.
+    """
+    engine = get_recommendation_engine()
+    if engine is None or engine.store is None:
+        return None
+    row = engine.book_index.get(isbn)
+    if row is None:
+        return None
+
+    active = engine.store.active_mask
+    index = get_similarity_index()
+    if index is not None and row < index.n_rows:
+        # Quelques voisins de réserve pour compenser les livres supprimés depuis
+        neighbours = [(r, score) for r, score in index.lookup(row) if active[r]][:n]
+    else:
+        neighbours = engine.similar_rows(row, n)
+
+    similar = []
+    for neighbour, score in neighbours:
+        book = dict(engine.books[neighbour])
+        book['similarity_score'] = float(score)
+        similar.append(book)
+    return similar
+
+
+def hybrid_recommendations(engine: RecommendationEngine, user_preferences: Dict[str, List[str]],
+                           n_recommendations: int = 20, excluded: Optional[Collection[str]] = None,
+                           collaborative: Optional[CollaborativeEngine] = None, user_key: Optional[str] = None,
+                           popularity: Optional[PopularityRanking] = None,
+                           weights: Optional[Dict[str, float]] = None, diversity: Optional[float] = None,
+                           n_candidates: int = 500) -> List[Dict[str, Any]]:
+    """Classe les candidats du moteur de contenu en combinant contenu, collaboratif et popularité.
+
+    Les candidats sont les meilleurs livres par similarité de contenu, complétés
+    par ceux du modèle collaboratif ; le classement final et la diversification
+    se font sur des tableaux alignés sur ces candidats.
+    """
+    scored = engine.score_batch([user_preferences], n_candidates,
+                                [excluded] if excluded is not None else None)[0]
+    content_by_row = dict(scored)
+
+    collaborative_scores = None
+    if collaborative is not None and user_key is not None and collaborative.has_user(user_key):
+        excluded = excluded or ()
+        for isbn, _ in collaborative.recommend(user_key, n_candidates // 5):
+            row = engine.book_index.get(isbn)
+            if row is not None and isbn not in excluded:
+                content_by_row.setdefault(row, 0.0)
+        collaborative_scores = collaborative.score_user(user_key)
+
+    if not content_by_row:
+        return []
+
+    rows = np.fromiter(content_by_row.keys(), dtype=np.int64, count=len(content_by_row))
+    content = np.fromiter(content_by_row.values(), dtype=np.float64, count=len(content_by_row))
+    books = [engine.books[row] for row in rows]
+    isbns = [book['isbn'] for book in books]
+
+    components: Dict[str, np.ndarray] = {'content': content}
+    if collaborative is not None and collaborative_scores is not None:
+        items = np.array([collaborative.item_index.get(isbn, -1) for isbn in isbns], dtype=np.int64)
+        components['collaborative'] = np.where(items >= 0, collaborative_scores[items], np.nan)
+    if popularity is not None:
+        components['popularity'] = popularity.scores_for(isbns)
+
+    vectors = engine.book_vectors
+    selected, relevance = _ranker.rank(
+        components, n_recommendations, weights=weights, diversity=diversity,
+        vectors=vectors[rows] if vectors is not None else None, authors=[book['author'] for book in books]
+    )
+
+    recommendations = []
+    for position, score in zip(selected, relevance):
+        recommendation = dict(books[position])
+        recommendation['similarity_score'] = float(content[position])
+        recommendation['score'] = float(score)
+        recommendations.append(recommendation)
+    return recommendations
+
+
+def recommend_within_budget(user_preferences: Dict[str, List[str]], n_recommendations: int = 20,
+                            excluded: Optional[Collection[str]] = None, budget_ms: float = 250,
+                            user_id: Optional[int] = None, weights: Optional[Dict[str, float]] = None,
+                            diversity: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+    """Classe les livres pour un profil, ou retourne None si le budget de latence est dépassé."""
+    engine = get_recommendation_engine()
+    if engine is None or engine.store is None:
+        return []
+    # Le calcul se fait hors du contexte de requête : la popularité doit déjà être en mémoire
+    popularity: Optional[PopularityRanking] = current_app.extensions.get('popularity_ranking')
+    if popularity is not None:
+        try:
+            popularity.ensure_loaded()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Classement de popularité indisponible: {str(e)}")
+            popularity = None
+
+    future = _scoring_executor.submit(
+        hybrid_recommendations, engine, user_preferences, n_recommendations, excluded,
+        collaborative=current_app.extensions.get('collaborative_engine'),
+        user_key=auth_user_key(user_id) if user_id is not None else None,
+        popularity=popularity,
+        weights=weights, diversity=diversity
+    )
+    try:
+        return future.result(timeout=budget_ms / 1000.0)
+    except TimeoutError:
+        future.cancel()
+        return None
+
+
+def get_precomputed_recommendations(user_id: int, excluded: Optional[Collection[str]] = None,
+                                    not_before: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Retourne les recommandations calculées par le job batch pour un utilisateur.
+
+    Les livres de `excluded` (déjà notés) sont retirés ; si le calcul est
+    antérieur à `not_before` (dernière note de l'utilisateur), la liste est
+    considérée périmée et rien n'est retourné.
+    """
+    rows = Book.query.join(UserRecommendation, UserRecommendation.isbn == Book.isbn)\
+        .add_columns(UserRecommendation.score, UserRecommendation.generated_at)\
+        .filter(UserRecommendation.user_id == user_id)\
+        .order_by(UserRecommendation.rank).all()
+    if not_before is not None and any(generated_at is None or generated_at < not_before
+                                      for _, _, generated_at in rows):
+        return []
+
+    excluded = excluded or ()
+    recommendations = []
+    for book, score, _ in rows:
+        if book.isbn in excluded:
+            continue
+        recommendation = book.to_dict()
+        recommendation['similarity_score'] = score
+        recommendations.append(recommendation)
+    return recommendations
+
+
+def discard_precomputed_recommendations(user_id: int) -> None:
+    """Supprime la liste précalculée d'un utilisateur (préférences modifiées) avant commit.
+
+    Isolé dans un point de sauvegarde : si la table user_recommendations est
+    absente, la modification du profil est tout de même enregistrée.
+    """
+    try:
+        with db.session.begin_nested():
+            UserRecommendation.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    except Exception as e:
+        print(f"Erreur lors de la suppression des recommandations précalculées: {str(e)}")
+
+
+def notify_book_saved(book: Book) -> None:
+    """Ajoute ou remplace le vecteur d'un livre créé ou modifié."""
+    engine = get_recommendation_engine()
+    if engine is None:
+        return
+    try:
+        engine.add_books([book])
+    except Exception as e:
+        print(f"Erreur lors de la mise à jour du moteur de recommandation: {str(e)}")
+
+
+def notify_book_deleted(isbn: str) -> None:
+    """Retire un livre supprimé du moteur de recommandation."""
+    engine = get_recommendation_engine()
+    if engine is not None:
+        engine.remove_book(isbn)
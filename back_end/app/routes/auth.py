@@ -1,5 +1,7 @@
 from flask import Blueprint, jsonify, request, current_app
 from app.models import AuthUser, UserSession, db
+from app.cache import invalidate_user_recommendations
+from app.recommender import discard_precomputed_recommendations
 from datetime import datetime
 import re
 from sqlalchemy.exc import IntegrityError
@@ -247,9 +249,16 @@ def update_profile():
                 
             user.set_password(data['new_password'])
         
+        # La liste précalculée a été classée avec les anciennes préférences
+        if 'favorite_genres' in data or 'favorite_authors' in data:
+            discard_precomputed_recommendations(user.user_id)
+        
         # Enregistrement des modifications
         db.session.commit()
         
+        if 'favorite_genres' in data or 'favorite_authors' in data:
+            invalidate_user_recommendations(user.user_id)
+        
         # Prolonger la session
         session.extend_session(hours=1)
         
@@ -1,13 +1,63 @@
 from flask import Blueprint, jsonify, request, current_app
-from app.models import Book
+from typing import Any, Dict, List, Optional, Tuple
+from app.models import Book, UserBookRating
 from app import db
+from app.cache import (
+    MISSING, recommendation_cache_version, get_cached_recommendations, cache_recommendations
+)
+from app.popularity import get_popularity_ranking
+from app.counts import book_total, adjust_book_count
+from app.aggregates import get_catalogue_aggregates, invalidate_catalogue_aggregates
+from app.http_cache import cached_json_response, conditional, get_version_store
+from app.pagination import cursor_requested, get_after, total_requested, encode_cursor, decode_cursor
+from app.fieldsets import Fields, requested_fields, with_fields, trim
+from app.rating_stats import with_rating_stats
+from app.search import (
+    get_search_mode, paginate_search, seek_search, count_search, get_facets, get_search_index,
+    normalize_prefix, get_suggestions, notify_search_book_saved, notify_search_book_deleted, SUGGEST_MIN_PREFIX, SUGGEST_MAX_RESULTS
+)
+from hybrid_ranker import DEFAULT_WEIGHTS, DEFAULT_DIVERSITY
+from app.recommender import (
+    notify_book_saved, notify_book_deleted, get_similar_books, get_similarity_index,
+    get_precomputed_recommendations, recommend_within_budget
+)
+import math
 import time
 import sys
-from sqlalchemy import or_, func
+from sqlalchemy import any_, bindparam, func
+from sqlalchemy.dialects.postgresql import ARRAY
 
 books_bp = Blueprint("books", __name__)
 
+# Politiques de cache HTTP par route : revalidation (304) au-delà de max-age
+BOOK_CACHE_CONTROL = 'public, max-age=60, must-revalidate'
+LIST_CACHE_CONTROL = 'public, max-age=15, must-revalidate'
+
+# Nombre maximal d'ISBN acceptés par /batch
+BATCH_MAX_ISBNS = 500
+
+def ratings_requested() -> bool:
+    """Statistiques de notes sur chaque livre d'une liste (`?ratings=1`)."""
+    return request.args.get('ratings', '').lower() in ('1', 'true', 'yes')
+
+def serialize_page(books_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return with_rating_stats(books_list) if ratings_requested() else books_list
+
+def list_version() -> Optional[Tuple[Any, Any]]:
+    """Version de la liste des livres ; avec `?ratings=1`, aussi celle des statistiques de notes."""
+    versions = get_version_store()
+    books_version = versions.table('books')
+    if books_version is None or not ratings_requested():
+        return books_version
+    stats_version = versions.modified('book_rating_stats')
+    if stats_version is None:
+        # Statistiques sans version : pas de réponse conditionnelle
+        return None
+    last_modified = max((value for value in (books_version[1], stats_version[1]) if value is not None), default=None)
+    return f'{books_version[0]}+{stats_version[0]}', last_modified
+
 @books_bp.route("/", methods=["GET"])
+@conditional(list_version, LIST_CACHE_CONTROL, vary_on_query=True)
 def list_books():
     try:
         # Log détaillé pour le débogage
@@ -20,8 +70,31 @@ def list_books():
         # Limiter per_page à 100 maximum pour éviter les problèmes de performance
         per_page = min(per_page, 100)
         
-        # Compter le nombre total de livres
-        total_books = Book.query.count()
+        # Champs demandés (?fields=) : seules ces colonnes sont lues en SQL
+        try:
+            fields = requested_fields()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Mode curseur : recherche sur la clé primaire, sans OFFSET ni comptage
+        if cursor_requested():
+            per_page = max(per_page, 1)
+            after = get_after()
+            book_query = with_fields(Book.query, fields)
+            if after:
+                book_query = book_query.filter(Book.isbn > after)
+            books = book_query.order_by(Book.isbn).limit(per_page + 1).all()
+            response_data = {
+                'books': serialize_page([book.to_dict(fields=fields) for book in books[:per_page]]),
+                'next_cursor': books[per_page - 1].isbn if len(books) > per_page else None
+            }
+            if total_requested():
+                response_data['total'], response_data['total_is_estimate'] = book_total()
+            print("----- FIN DE LA REQUÊTE DE LIVRES -----\n", file=sys.stderr)
+            return jsonify(response_data)
+        
+        # Nombre total de livres : comptage en cache ou estimation, sans COUNT(*) par requête
+        total_books, total_is_estimate = book_total()
         print(f"Nombre total de livres en base: {total_books}", file=sys.stderr)
         
         if total_books == 0:
@@ -31,24 +104,28 @@ def list_books():
                 'total': 0,
                 'pages': 0,
                 'current_page': page,
+                'total_is_estimate': False,
                 'error': 'Base de données vide'
             })
         
-        # Récupérer les livres pour la page demandée
-        books = Book.query.paginate(page=page, per_page=per_page, error_out=False)
+        # Récupérer les livres pour la page demandée, sans second comptage
+        page = max(page, 1)
+        per_page = max(per_page, 1)
+        books = with_fields(Book.query, fields).order_by(Book.isbn).offset((page - 1) * per_page).limit(per_page).all()
         
         # Convertir les objets en dictionnaires
-        books_list = [book.to_dict() for book in books.items]
+        books_list = serialize_page([book.to_dict(fields=fields) for book in books])
         
         print(f"Retour de {len(books_list)} livres pour la page {page}", file=sys.stderr)
         if len(books_list) > 0:
-            print(f"Premier livre: {books_list[0]['title']} par {books_list[0]['author']}", file=sys.stderr)
+            print(f"Premier livre: {books_list[0].get('title')} par {books_list[0].get('author')}", file=sys.stderr)
         
         response_data = {
             'books': books_list,
-            'total': books.total,
-            'pages': books.pages,
-            'current_page': books.page
+            'total': total_books,
+            'pages': (total_books + per_page - 1) // per_page,
+            'current_page': page,
+            'total_is_estimate': total_is_estimate
         }
         
         print("----- FIN DE LA REQUÊTE DE LIVRES -----\n", file=sys.stderr)
@@ -155,23 +232,105 @@ def init_test_data():
         return jsonify({'error': str(e)}), 500
 
 @books_bp.route("/<int:book_id>", methods=["GET"])
+@conditional(lambda book_id: get_version_store().row('books', 'isbn', str(book_id)), BOOK_CACHE_CONTROL,
+             vary_on_query=True)
 def get_book(book_id):
     try:
-        book = Book.query.get_or_404(book_id)
-        return jsonify(book.to_dict())
+        fields = requested_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        book = with_fields(Book.query, fields).get_or_404(book_id)
+        return jsonify(book.to_dict(fields=fields))
     except Exception as e:
         print(f"ERREUR dans get_book: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @books_bp.route("/isbn/<string:isbn>", methods=["GET"])
+@conditional(lambda isbn: get_version_store().row('books', 'isbn', isbn), BOOK_CACHE_CONTROL,
+             vary_on_query=True)
 def get_book_by_isbn(isbn):
     try:
-        book = Book.query.filter_by(isbn=isbn).first_or_404()
-        return jsonify(book.to_dict())
+        fields = requested_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        book = with_fields(Book.query, fields).filter_by(isbn=isbn).first_or_404()
+        return jsonify(book.to_dict(fields=fields))
     except Exception as e:
         print(f"ERREUR dans get_book_by_isbn: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@books_bp.route("/batch", methods=["POST"])
+def get_books_batch():
+    """Récupère plusieurs livres par ISBN en une requête SQL, dans l'ordre demandé."""
+    try:
+        data = request.get_json(silent=True) or {}
+        isbns = data.get('isbns')
+        if not isinstance(isbns, list) or not all(isinstance(isbn, str) for isbn in isbns):
+            return jsonify({'error': "Le champ 'isbns' doit être une liste d'ISBN"}), 400
+        
+        # Dédoublonner en conservant l'ordre de la demande
+        isbns = list(dict.fromkeys(isbn.strip() for isbn in isbns if isbn.strip()))
+        if len(isbns) > BATCH_MAX_ISBNS:
+            return jsonify({'error': f"Au plus {BATCH_MAX_ISBNS} ISBN par requête"}), 400
+        try:
+            fields = requested_fields()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not isbns:
+            return jsonify({'books': [], 'missing': []})
+        
+        # Un seul paramètre tableau : même requête préparée quel que soit le nombre d'ISBN
+        found = {
+            book.isbn: book for book in
+            with_fields(Book.query, fields).filter(Book.isbn == any_(bindparam('isbns', isbns, type_=ARRAY(db.String))))
+        }
+        return jsonify({
+            'books': [found[isbn].to_dict(fields=fields) for isbn in isbns if isbn in found],
+            'missing': [isbn for isbn in isbns if isbn not in found]
+        })
+    except Exception as e:
+        print(f"ERREUR dans get_books_batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@books_bp.route("/isbn/<string:isbn>/similar", methods=["GET"])
+def get_similar_books_by_isbn(isbn):
+    """Retourne les livres les plus similaires à un livre, depuis l'index précalculé."""
+    try:
+        limit = min(request.args.get('limit', 10, type=int), 50)
+        similar = get_similar_books(isbn, limit)
+        if similar is None:
+            return jsonify({'error': 'Livre inconnu du moteur de recommandation'}), 404
+
+        index = get_similarity_index()
+        return jsonify({
+            'isbn': isbn,
+            'similar': similar,
+            'index': index.stats if index is not None else None
+        })
+    except Exception as e:
+        print(f"ERREUR dans get_similar_books_by_isbn: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def filtered_books_query(filters: Dict[str, str], fields: Fields = None) -> Any:
+    """Requête de base de la recherche, restreinte par les filtres de champ (sous-chaîne)."""
+    book_query = with_fields(Book.query, fields)
+    
+    if filters.get('title'):
+        book_query = book_query.filter(Book.title.ilike(f"%{filters['title']}%"))
+        
+    if filters.get('author'):
+        book_query = book_query.filter(Book.author.ilike(f"%{filters['author']}%"))
+        
+    if filters.get('genre'):
+        book_query = book_query.filter(Book.genre.ilike(f"%{filters['genre']}%"))
+        
+    if filters.get('description'):
+        book_query = book_query.filter(Book.description.ilike(f"%{filters['description']}%"))
+    
+    return book_query
+
 @books_bp.route("/search", methods=["GET"])
 def search_books():
     try:
@@ -188,51 +347,101 @@ def search_books():
         # Limiter per_page à 100 maximum pour éviter les problèmes de performance
         per_page = min(per_page, 100)
         
-        # Construire la requête de base
-        book_query = Book.query
-        
-        # Appliquer les filtres de recherche si fournis
-        if query:
-            book_query = book_query.filter(
-            (Book.title.ilike(f'%{query}%')) | 
-                (Book.author.ilike(f'%{query}%')) |
-                (Book.genre.ilike(f'%{query}%')) |
-                (Book.description.ilike(f'%{query}%'))
-            )
-        
-        if title:
-            book_query = book_query.filter(Book.title.ilike(f'%{title}%'))
-            
-        if author:
-            book_query = book_query.filter(Book.author.ilike(f'%{author}%'))
+        mode = get_search_mode(request.args.get('mode'))
+        filters = {'title': title, 'author': author, 'genre': genre, 'description': description}
+        facets_requested = request.args.get('facets', '').lower() in ('1', 'true', 'yes')
+        index = get_search_index() if mode == 'memory' else None
+        try:
+            fields = requested_fields()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Mode curseur : `after` vide pour la première page, puis `next_cursor`
+        if cursor_requested():
+            per_page = max(per_page, 1)
+            after = get_after()
+            try:
+                cursor = decode_cursor(after) if after else None
+                if index is not None:
+                    books_list, next_cursor, total = index.seek(query, filters, cursor, per_page)
+                    books_list = [trim(book, fields) for book in books_list]
+                else:
+                    books, next_cursor, mode = seek_search(
+                        filtered_books_query(filters, fields), query, mode, cursor, per_page
+                    )
+                    books_list = [book.to_dict(fields=fields) for book in books]
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
-        if genre:
-            book_query = book_query.filter(Book.genre.ilike(f'%{genre}%'))
-            
-        if description:
-            book_query = book_query.filter(Book.description.ilike(f'%{description}%'))
-        
-        # Compter le nombre total de résultats
-        total_books = book_query.count()
+            response_data: Dict[str, Any] = {
+                'books': serialize_page(books_list),
+                'next_cursor': encode_cursor(next_cursor) if next_cursor else None,
+                'mode': mode
+            }
+            if total_requested():
+                response_data['total'] = total if mode == 'memory' else \
+                    count_search(filtered_books_query(filters), query, mode)
+            if facets_requested:
+                response_data['facets'] = get_facets(filtered_books_query(filters), query, filters, mode)
+            return jsonify(response_data)
+        
+        if index is not None:
+            # Index inversé du processus : aucune requête SQL
+            books_list, total = index.search(query, filters, page=page, per_page=per_page)
+            response_data = {
+                'books': serialize_page([trim(book, fields) for book in books_list]),
+                'total': total,
+                'pages': (total + per_page - 1) // per_page if per_page > 0 else 0,
+                'current_page': page,
+                'mode': mode
+            }
+            if facets_requested:
+                response_data['facets'] = get_facets(None, query, filters, mode)
+            return jsonify(response_data)
         
-        # Paginer les résultats
-        books = book_query.paginate(page=page, per_page=per_page, error_out=False)
+        # Recherche générale : plein texte classé par pertinence, ou ancien mode ilike
+        books, mode = paginate_search(filtered_books_query(filters, fields), query, mode, page, per_page)
         
         # Convertir les objets en dictionnaires
-        books_list = [book.to_dict() for book in books.items]
+        books_list = serialize_page([book.to_dict(fields=fields) for book in books.items])
         
         response_data = {
             'books': books_list,
             'total': books.total,
             'pages': books.pages,
-            'current_page': books.page
+            'current_page': books.page,
+            'mode': mode
         }
+        # Facettes (genre, auteur, décennie) des résultats, sur demande
+        if facets_requested:
+            response_data['facets'] = get_facets(filtered_books_query(filters), query, filters, mode)
         
         return jsonify(response_data)
     except Exception as e:
         print(f"ERREUR dans search_books: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@books_bp.route("/suggest", methods=["GET"])
+def suggest_books():
+    """Suggestions de titres et d'auteurs à la frappe."""
+    try:
+        prefix = normalize_prefix(request.args.get('prefix', ''))
+        limit = min(request.args.get('limit', SUGGEST_MAX_RESULTS, type=int), SUGGEST_MAX_RESULTS)
+        if len(prefix) < SUGGEST_MIN_PREFIX:
+            return jsonify({'prefix': prefix, 'titles': [], 'authors': []})
+        
+        suggestions = get_suggestions(prefix)
+        response = jsonify({
+            'prefix': prefix,
+            'titles': suggestions['titles'][:limit],
+            'authors': suggestions['authors'][:limit]
+        })
+        response.headers['Cache-Control'] = 'public, max-age=60'
+        return response
+    except Exception as e:
+        print(f"ERREUR dans suggest_books: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @books_bp.route("/", methods=["POST"])
 def create_book():
     data = request.get_json()
@@ -243,6 +452,7 @@ def create_book():
     )
     db.session.add(book)
     db.session.commit()
+    after_book_saved(book, created=True)
     return jsonify(book.to_dict()), 201
 
 @books_bp.route("/<int:book_id>", methods=["PUT"])
@@ -255,29 +465,41 @@ def update_book(book_id):
     book.description = data.get("description", book.description)
     
     db.session.commit()
+    after_book_saved(book)
     return jsonify(book.to_dict())
 
 @books_bp.route("/<int:book_id>", methods=["DELETE"])
 def delete_book(book_id):
     book = Book.query.get_or_404(book_id)
+    isbn = book.isbn
     db.session.delete(book)
     db.session.commit()
+    after_book_deleted(isbn)
     return jsonify({"message": "Livre supprimé avec succès"})
 
+def after_book_saved(book: Book, created: bool = False) -> None:
+    """Répercute un livre validé sur les comptages, caches, index et versions."""
+    if created:
+        adjust_book_count(1)
+    invalidate_catalogue_aggregates()
+    get_version_store().invalidate('books')
+    notify_book_saved(book)
+    notify_search_book_saved(book)
+
+def after_book_deleted(isbn: str) -> None:
+    adjust_book_count(-1)
+    invalidate_catalogue_aggregates()
+    get_version_store().invalidate('books')
+    notify_book_deleted(isbn)
+    notify_search_book_deleted(isbn)
+
 @books_bp.route("/genres", methods=["GET"])
 def get_genres():
     """Récupère la liste des genres disponibles dans la base de données."""
     try:
-        # Récupérer tous les genres uniques
-        genres = db.session.query(Book.genre).distinct().all()
-        
-        # Extraire les valeurs de genre des tuples renvoyés par la requête
-        genre_list = [genre[0] for genre in genres if genre[0]]
-        
-        # Trier les genres par ordre alphabétique
-        genre_list.sort()
-        
-        return jsonify(genre_list)
+        # Liste matérialisée en mémoire ; 304 si le client a déjà cette version
+        body, etag = get_catalogue_aggregates().get('genres')
+        return cached_json_response(body, etag, aggregates_cache_control())
     except Exception as e:
         print(f"Erreur lors de la récupération des genres: {str(e)}")
         return jsonify({"error": "Une erreur est survenue lors de la récupération des genres"}), 500
@@ -286,28 +508,22 @@ def get_genres():
 def get_authors():
     """Récupère la liste des 100 auteurs les plus fréquents dans la base de données."""
     try:
-        # Récupérer les 100 auteurs les plus fréquents
-        authors_query = db.session.query(
-            Book.author, 
-            func.count(Book.author).label('author_count')
-        ).group_by(
-            Book.author
-        ).having(
-            Book.author.isnot(None)
-        ).order_by(
-            func.count(Book.author).desc()
-        ).limit(100).all()
-        
-        # Extraire les valeurs d'auteur des tuples renvoyés par la requête
-        author_list = [author[0] for author in authors_query if author[0]]
-        
-        print(f"Nombre d'auteurs récupérés: {len(author_list)}")
-        
-        return jsonify(author_list)
+        body, etag = get_catalogue_aggregates().get('authors')
+        return cached_json_response(body, etag, aggregates_cache_control())
     except Exception as e:
         print(f"Erreur lors de la récupération des auteurs: {str(e)}")
         return jsonify({"error": "Une erreur est survenue lors de la récupération des auteurs"}), 500
 
+def aggregates_cache_control() -> str:
+    return f"public, max-age={current_app.config.get('AGGREGATES_MAX_AGE', 60)}, must-revalidate"
+
+def unit_interval_arg(name: str, default: float) -> float:
+    """Paramètre réel de la requête ramené dans [0, 1] (valeur par défaut si absent ou non fini)."""
+    value = request.args.get(name, default, type=float)
+    if not math.isfinite(value):
+        return default
+    return min(max(value, 0.0), 1.0)
+
 @books_bp.route("/recommendations", methods=["GET"])
 def get_recommendations():
     """Récupère des recommandations personnalisées pour l'utilisateur."""
@@ -339,6 +555,40 @@ def get_recommendations():
             print("Utilisateur non trouvé, retour de livres populaires")
             return get_popular_books()
         
+        # Servir depuis le cache si les préférences et les notes n'ont pas changé
+        rating_count, last_rated_at = db.session.query(
+            func.count(UserBookRating.id), func.max(UserBookRating.updated_at)
+        ).filter(UserBookRating.user_id == user.user_id).one()
+        # Pondérations du classement hybride, ajustables par requête et bornées à [0, 1]
+        ranking_weights = {
+            name: unit_interval_arg(f'{name}_weight', default)
+            for name, default in DEFAULT_WEIGHTS.items()
+        }
+        diversity = unit_interval_arg('diversity', DEFAULT_DIVERSITY)
+        cache_version = recommendation_cache_version(user, rating_count) + \
+            (tuple(sorted(ranking_weights.items())), diversity)
+        cached = get_cached_recommendations(user.user_id, cache_version)
+        if cached is not MISSING:
+            print("Recommandations servies depuis le cache")
+            session.extend_session(hours=1)
+            return jsonify(cached)
+        
+        # Livres déjà notés, exclus des recommandations
+        rated_isbns = {isbn for (isbn,) in db.session.query(UserBookRating.isbn)
+                       .filter(UserBookRating.user_id == user.user_id)}
+        
+        # Utiliser en priorité les recommandations précalculées par le job batch, si elles
+        # sont postérieures à la dernière note et calculées avec le classement par défaut
+        if ranking_weights == DEFAULT_WEIGHTS and diversity == DEFAULT_DIVERSITY:
+            precomputed = get_precomputed_recommendations(
+                user.user_id, excluded=rated_isbns, not_before=last_rated_at
+            )
+            if precomputed:
+                print(f"Recommandations précalculées: {len(precomputed)}")
+                cache_recommendations(user.user_id, cache_version, precomputed)
+                session.extend_session(hours=1)
+                return jsonify(precomputed)
+        
         # Récupérer les genres et auteurs préférés
         favorite_genres = user.favorite_genres or []
         favorite_authors = user.favorite_authors or []
@@ -350,57 +600,32 @@ def get_recommendations():
             print("Pas de préférences utilisateur, retour de livres populaires")
             return get_popular_books()
         
-        # Construire la requête basée sur les préférences
-        query = Book.query
-        conditions = []
-        
-        # Ajouter les conditions pour les genres
-        if favorite_genres:
-            for genre in favorite_genres:
-                conditions.append(Book.genre.ilike(f'%{genre}%'))
-        
-        # Ajouter les conditions pour les auteurs
-        if favorite_authors:
-            for author in favorite_authors:
-                conditions.append(Book.author.ilike(f'%{author}%'))
-        
-        print(f"Nombre de conditions: {len(conditions)}")
+        # Classement par le moteur partagé, dans la limite du budget de latence
+        recommendations = recommend_within_budget(
+            {'genres': favorite_genres, 'authors': favorite_authors},
+            n_recommendations=20,
+            excluded=rated_isbns,
+            budget_ms=current_app.config.get('RECOMMENDATION_LATENCY_BUDGET_MS', 250),
+            user_id=user.user_id,
+            weights=ranking_weights,
+            diversity=diversity
+        )
+        if recommendations is None:
+            print("Budget de latence dépassé, retour de livres populaires")
+            return get_popular_books()
+        print(f"Livres recommandés par le moteur: {len(recommendations)}")
         
-        # Appliquer les conditions avec OR
-        if conditions:
-            query = query.filter(or_(*conditions))
+        # Si pas assez de recommandations, compléter avec des livres populaires
+        if len(recommendations) < 10:
+            seen_isbns = rated_isbns | {book['isbn'] for book in recommendations}
+            for book in load_popular_books(20 + len(seen_isbns)):
+                if book['isbn'] not in seen_isbns and len(recommendations) < 20:
+                    recommendations.append(book)
+                    seen_isbns.add(book['isbn'])
         
-        # Récupérer les recommandations (limité à 20)
-        recommended_books = query.limit(20).all()
-        print(f"Livres trouvés avec préférences: {len(recommended_books)}")
+        print(f"Total de livres recommandés: {len(recommendations)}")
         
-        # Si pas assez de recommandations, compléter avec des livres populaires
-        if len(recommended_books) < 10:
-            popular_books = Book.query.limit(20 - len(recommended_books)).all()
-            print(f"Livres populaires ajoutés: {len(popular_books)}")
-            # Éviter les doublons
-            existing_isbns = [book.isbn for book in recommended_books]
-            for book in popular_books:
-                if book.isbn not in existing_isbns and len(recommended_books) < 20:
-                    recommended_books.append(book)
-        
-        print(f"Total de livres recommandés: {len(recommended_books)}")
-        
-        # Convertir en format JSON
-        recommendations = []
-        for book in recommended_books:
-            recommendations.append({
-                'isbn': book.isbn,
-                'title': book.title,
-                'author': book.author,
-                'year': book.year,
-                'publisher': book.publisher,
-                'image_url_s': book.image_url_s,
-                'image_url_m': book.image_url_m,
-                'image_url_l': book.image_url_l,
-                'genre': book.genre,
-                'description': book.description
-            })
+        cache_recommendations(user.user_id, cache_version, recommendations)
         
         # Prolonger la session
         session.extend_session(hours=1)
@@ -414,28 +639,42 @@ def get_recommendations():
         traceback.print_exc()
         return get_popular_books()
 
+def load_popular_books(limit: int = 20) -> List[Dict[str, Any]]:
+    """Charge les livres les plus populaires, au format des recommandations."""
+    # Classement matérialisé, servi depuis la mémoire
+    try:
+        popular = get_popularity_ranking().top(limit)
+        if popular:
+            return popular
+    except Exception as e:
+        db.session.rollback()
+        print(f"Classement de popularité indisponible: {str(e)}")
+    
+    # Table de popularité vide ou absente : livres arbitraires
+    books = Book.query.limit(limit).all()
+    
+    recommendations = []
+    for book in books:
+        recommendations.append({
+            'isbn': book.isbn,
+            'title': book.title,
+            'author': book.author,
+            'year': book.year,
+            'publisher': book.publisher,
+            'image_url_s': book.image_url_s,
+            'image_url_m': book.image_url_m,
+            'image_url_l': book.image_url_l,
+            'genre': book.genre,
+            'description': book.description
+        })
+    return recommendations
+
 def get_popular_books():
     """Retourne une sélection de livres populaires comme fallback."""
     try:
         print("=== DÉBUT GET_POPULAR_BOOKS ===")
-        # Récupérer 20 livres au hasard comme "populaires"
-        books = Book.query.limit(20).all()
-        print(f"Livres populaires trouvés: {len(books)}")
-        
-        recommendations = []
-        for book in books:
-            recommendations.append({
-                'isbn': book.isbn,
-                'title': book.title,
-                'author': book.author,
-                'year': book.year,
-                'publisher': book.publisher,
-                'image_url_s': book.image_url_s,
-                'image_url_m': book.image_url_m,
-                'image_url_l': book.image_url_l,
-                'genre': book.genre,
-                'description': book.description
-            })
+        recommendations = load_popular_books(20)
+        print(f"Livres populaires trouvés: {len(recommendations)}")
         
         print("=== FIN GET_POPULAR_BOOKS ===")
         return jsonify(recommendations)
@@ -1,10 +1,24 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from typing import Any, List, Optional, Tuple
 from app.models import UserBookRating, Book, AuthUser, UserSession, db
 from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from app.cache import invalidate_user_recommendations
+from app.popularity import record_rating_change, apply_rating_change
+from app.pagination import get_after, encode_cursor, decode_cursor
+from app.rating_stats import book_rating_stats
+from app.rating_writes import RatingWrite, submit_rating
+from app.rating_events import events_since, notify_rating_events, stream_events
+from app.rating_transfer import EXPORT_FORMATS, export_ratings, import_ratings
+from app.http_cache import get_version_store
 
 ratings_bp = Blueprint("ratings", __name__)
 
+# Taille des pages de notes (paramètre per_page) et plafond
+RATINGS_PER_PAGE = 20
+RATINGS_MAX_PER_PAGE = 100
+
 def get_user_from_session():
     """Récupère l'utilisateur à partir de la session"""
     session_id = request.headers.get('X-Session-ID')
@@ -21,14 +35,41 @@ def get_user_from_session():
     
     return user, None, None
 
+def get_admin_from_session() -> Tuple[Optional[AuthUser], Optional[Response], Optional[int]]:
+    """Récupère l'utilisateur de la session s'il est administrateur"""
+    user, error_response, status_code = get_user_from_session()
+    if error_response or user is None:
+        return None, error_response, status_code
+    if user.role != 'admin':
+        return None, jsonify({'error': 'Accès réservé aux administrateurs'}), 403
+    return user, None, None
+
+def paginate_ratings(rating_query: Any, default_per_page: int = RATINGS_PER_PAGE) -> Tuple[List[UserBookRating], Optional[str]]:
+    """Page de notes par curseur sur l'identifiant (plus récentes d'abord).
+
+    `after` reprend après le `next_cursor` de la page précédente ; une seule
+    requête par page, relations comprises si la requête les charge.
+    Lève ValueError pour un curseur invalide.
+    """
+    per_page = min(max(request.args.get('per_page', default_per_page, type=int), 1), RATINGS_MAX_PER_PAGE)
+    after = get_after()
+    if after:
+        cursor = decode_cursor(after)
+        if len(cursor) != 1 or not isinstance(cursor[0], int):
+            raise ValueError(f"Curseur invalide: {after}")
+        rating_query = rating_query.filter(UserBookRating.id < cursor[0])
+    ratings = rating_query.order_by(UserBookRating.id.desc()).limit(per_page + 1).all()
+    next_cursor = encode_cursor([ratings[per_page - 1].id]) if len(ratings) > per_page else None
+    return ratings[:per_page], next_cursor
+
 @ratings_bp.route("/rate", methods=["POST"])
 def rate_book():
-    """Permet à un utilisateur de noter un livre"""
+    """Permet à un utilisateur de noter un livre (session validée et note écrite en une requête SQL)"""
     try:
-        # Vérifier l'authentification
-        user, error_response, status_code = get_user_from_session()
-        if error_response:
-            return error_response, status_code
+        # La session est vérifiée par l'instruction d'écriture elle-même
+        session_id = request.headers.get('X-Session-ID')
+        if not session_id:
+            return jsonify({'error': 'Session ID manquant'}), 401
         
         data = request.get_json()
         if not data:
@@ -45,43 +86,23 @@ def rate_book():
         if not rating or not isinstance(rating, int) or rating < 1 or rating > 5:
             return jsonify({'error': 'La note doit être un entier entre 1 et 5'}), 400
         
-        # Vérifier que le livre existe
-        book = Book.query.filter_by(isbn=isbn).first()
-        if not book:
-            return jsonify({'error': 'Livre non trouvé'}), 404
-        
-        # Vérifier si l'utilisateur a déjà noté ce livre
-        existing_rating = UserBookRating.query.filter_by(
-            user_id=user.user_id, 
-            isbn=isbn
-        ).first()
+        # INSERT ... ON CONFLICT : l'existence du livre est garantie par la clé étrangère
+        try:
+            written = submit_rating(RatingWrite(session_id, isbn, rating, review))
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 404
+        if written is None:
+            return jsonify({'error': 'Session invalide'}), 401
         
-        if existing_rating:
-            # Mettre à jour la note existante
-            existing_rating.rating = rating
-            existing_rating.review = review
-            db.session.commit()
-            
-            return jsonify({
-                'message': 'Note mise à jour avec succès',
-                'rating': existing_rating.to_dict()
-            }), 200
-        else:
-            # Créer une nouvelle note
-            new_rating = UserBookRating(
-                user_id=user.user_id,
-                isbn=isbn,
-                rating=rating,
-                review=review
-            )
-            
-            db.session.add(new_rating)
-            db.session.commit()
-            
+        if written['created']:
             return jsonify({
                 'message': 'Note ajoutée avec succès',
-                'rating': new_rating.to_dict()
+                'rating': written['rating']
             }), 201
+        return jsonify({
+            'message': 'Note mise à jour avec succès',
+            'rating': written['rating']
+        }), 200
             
     except IntegrityError as e:
         db.session.rollback()
@@ -100,54 +121,27 @@ def get_book_ratings(isbn):
         if not book:
             return jsonify({'error': 'Livre non trouvé'}), 404
         
-        # Récupérer les statistiques des notes
-        ratings_stats = db.session.query(
-            func.count(UserBookRating.id).label('total_ratings'),
-            func.avg(UserBookRating.rating).label('average_rating'),
-            func.count(UserBookRating.id).filter(UserBookRating.rating == 5).label('five_stars'),
-            func.count(UserBookRating.id).filter(UserBookRating.rating == 4).label('four_stars'),
-            func.count(UserBookRating.id).filter(UserBookRating.rating == 3).label('three_stars'),
-            func.count(UserBookRating.id).filter(UserBookRating.rating == 2).label('two_stars'),
-            func.count(UserBookRating.id).filter(UserBookRating.rating == 1).label('one_star')
-        ).filter(UserBookRating.isbn == isbn).first()
-        
-        # Récupérer les commentaires récents
-        recent_reviews = UserBookRating.query.filter_by(isbn=isbn)\
-            .filter(UserBookRating.review.isnot(None))\
-            .filter(UserBookRating.review != '')\
-            .order_by(UserBookRating.created_at.desc())\
-            .limit(10).all()
-        
-        # Formater les données
-        stats = {
-            'total_ratings': ratings_stats.total_ratings or 0,
-            'average_rating': float(ratings_stats.average_rating or 0),
-            'five_stars': ratings_stats.five_stars or 0,
-            'four_stars': ratings_stats.four_stars or 0,
-            'three_stars': ratings_stats.three_stars or 0,
-            'two_stars': ratings_stats.two_stars or 0,
-            'one_star': ratings_stats.one_star or 0
-        }
-        
-        reviews = []
-        for review in recent_reviews:
-            user = AuthUser.query.get(review.user_id)
-            reviews.append({
-                'id': review.id,
-                'rating': review.rating,
-                'review': review.review,
-                'created_at': review.created_at.isoformat(),
-                'user': {
-                    'username': user.username if user else 'Utilisateur supprimé',
-                    'full_name': user.full_name if user else ''
-                }
-            })
+        # Statistiques des notes : une lecture par clé primaire dans book_rating_stats
+        stats = book_rating_stats(isbn)
+        
+        # Commentaires récents, auteurs chargés par jointure dans la même requête
+        try:
+            recent_reviews, next_cursor = paginate_ratings(
+                UserBookRating.query.options(joinedload(UserBookRating.user))
+                .filter_by(isbn=isbn)
+                .filter(UserBookRating.review.isnot(None))
+                .filter(UserBookRating.review != ''),
+                default_per_page=10
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
             'isbn': isbn,
             'book_title': book.title,
             'stats': stats,
-            'recent_reviews': reviews
+            'recent_reviews': [review.to_dict(include_user=True) for review in recent_reviews],
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -156,35 +150,38 @@ def get_book_ratings(isbn):
 
 @ratings_bp.route("/user", methods=["GET"])
 def get_user_ratings():
-    """Récupère toutes les notes d'un utilisateur"""
+    """Récupère les notes d'un utilisateur : toutes, ou par page avec `per_page` / `after`.
+
+    `total_ratings` est le nombre de notes retournées, `total_count` le nombre
+    total de notes de l'utilisateur (différent seulement en mode paginé).
+    """
     try:
         # Vérifier l'authentification
         user, error_response, status_code = get_user_from_session()
         if error_response:
             return error_response, status_code
         
-        # Récupérer les notes de l'utilisateur
-        user_ratings = UserBookRating.query.filter_by(user_id=user.user_id)\
-            .order_by(UserBookRating.created_at.desc()).all()
-        
-        ratings_data = []
-        for rating in user_ratings:
-            book = Book.query.filter_by(isbn=rating.isbn).first()
-            ratings_data.append({
-                'id': rating.id,
-                'isbn': rating.isbn,
-                'rating': rating.rating,
-                'review': rating.review,
-                'created_at': rating.created_at.isoformat(),
-                'updated_at': rating.updated_at.isoformat(),
-                'book': book.to_dict() if book else None
-            })
+        # Livres chargés par jointure dans la même requête
+        rating_query = UserBookRating.query.options(joinedload(UserBookRating.book)).filter_by(user_id=user.user_id)
+        next_cursor = None
+        if 'per_page' in request.args or get_after():
+            try:
+                user_ratings, next_cursor = paginate_ratings(rating_query)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            total_count = db.session.query(func.count(UserBookRating.id))\
+                .filter(UserBookRating.user_id == user.user_id).scalar()
+        else:
+            user_ratings = rating_query.order_by(UserBookRating.created_at.desc()).all()
+            total_count = len(user_ratings)
         
         return jsonify({
             'user_id': user.user_id,
             'username': user.username,
-            'ratings': ratings_data,
-            'total_ratings': len(ratings_data)
+            'ratings': [rating.to_dict(include_book=True) for rating in user_ratings],
+            'total_ratings': len(user_ratings),
+            'total_count': total_count,
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -237,11 +234,96 @@ def delete_rating(rating_id):
             return jsonify({'error': 'Note non trouvée ou vous n\'êtes pas autorisé à la supprimer'}), 404
         
         db.session.delete(rating)
+        popularity_change = record_rating_change(rating.isbn, -1, -rating.rating)
         db.session.commit()
+        apply_rating_change(popularity_change)
+        invalidate_user_recommendations(user.user_id)
+        get_version_store().invalidate('book_rating_stats')
+        notify_rating_events()
         
         return jsonify({'message': 'Note supprimée avec succès'}), 200
         
     except Exception as e:
         db.session.rollback()
         print(f"Erreur lors de la suppression de la note: {str(e)}")
-        return jsonify({'error': f'Erreur serveur: {str(e)}'}), 500 
\ No newline at end of file
+        return jsonify({'error': f'Erreur serveur: {str(e)}'}), 500
+
+@ratings_bp.route("/events", methods=["GET"])
+def get_rating_events():
+    """Événements de notes après le numéro `since`, pour une mise à jour incrémentale"""
+    try:
+        admin, error_response, status_code = get_admin_from_session()
+        if error_response:
+            return error_response, status_code
+        
+        since = max(request.args.get('since', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', 500, type=int), 1),
+                    current_app.config.get('RATING_EVENTS_MAX_LIMIT', 5000))
+        events = events_since(since, limit + 1)
+        
+        return jsonify({
+            'events': events[:limit],
+            # Numéro à repasser dans `since` pour la page suivante
+            'next_since': events[:limit][-1]['seq'] if events else since,
+            'has_more': len(events) > limit
+        }), 200
+        
+    except Exception as e:
+        print(f"Erreur lors de la lecture du journal des notes: {str(e)}")
+        return jsonify({'error': f'Erreur serveur: {str(e)}'}), 500
+
+@ratings_bp.route("/events/stream", methods=["GET"])
+def stream_rating_events():
+    """Flux SSE des événements de notes, repris après Last-Event-ID ou `since`"""
+    admin, error_response, status_code = get_admin_from_session()
+    if error_response:
+        return error_response, status_code
+    
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = max(request.args.get('since', 0, type=int), 0)
+    
+    config = current_app.config
+    events = stream_events(
+        since,
+        batch_size=config.get('RATING_EVENTS_MAX_LIMIT', 5000),
+        poll_seconds=config.get('RATING_EVENTS_POLL_SECONDS', 1),
+        heartbeat_seconds=config.get('RATING_EVENTS_HEARTBEAT_SECONDS', 15)
+    )
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@ratings_bp.route("/export", methods=["GET"])
+def export_all_ratings():
+    """Exporte toutes les notes en flux (`format=ndjson` par défaut, ou `csv`)"""
+    admin, error_response, status_code = get_admin_from_session()
+    if error_response:
+        return error_response, status_code
+    
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Format inconnu: {fmt} (attendu: {', '.join(EXPORT_FORMATS)})"}), 400
+    
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(export_ratings(fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=ratings.{fmt}'})
+
+@ratings_bp.route("/import", methods=["POST"])
+def import_all_ratings():
+    """Importe un CSV de notes (champ `file` ou corps de la requête) par COPY et fusion"""
+    try:
+        admin, error_response, status_code = get_admin_from_session()
+        if error_response:
+            return error_response, status_code
+        
+        upload = request.files.get('file')
+        report = import_ratings(upload.stream if upload else request.stream)
+        print(f"✅ Import de notes: {report['rows_merged']}/{report['rows_received']} lignes, "
+              f"{report['rows_per_second']} lignes/s")
+        return jsonify(report), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Erreur lors de l'import des notes: {str(e)}")
+        return jsonify({'error': f'Erreur serveur: {str(e)}'}), 500
@@ -0,0 +1,401 @@
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Flask, current_app
+from sqlalchemy import Integer, and_, case, cast, func, literal_column, or_, tuple_
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.sql.elements import ColumnClause, ColumnElement
+
+from app import db
+from app.cache import MISSING, get_cache
+from app.http_cache import get_version_store
+from app.models import Book
+from inverted_index import InvertedIndex
+
+# Configuration de recherche plein texte, identique à celle du déclencheur
+# (data/sql/books_search.sql)
+SEARCH_TEXT_CONFIG = 'simple'
+
+# Colonne tsvector maintenue par déclencheur ; volontairement absente du modèle
+# pour que les requêtes ORM restent valides sur une base non migrée
+SEARCH_VECTOR: 'ColumnClause[Any]' = literal_column('books.search_vector')
+
+SEARCH_MODES = ('fulltext', 'ilike', 'memory')
+
+
+class MemorySearch:
+    """Index de recherche en mémoire et version du catalogue qu'il reflète.
+
+    Les écritures servies par le processus sont appliquées à l'index aussitôt ;
+    celles des autres processus et des imports SQL ne sont visibles que par la
+    version de la table books (table_versions). Quand elle change, l'index est
+    reconstruit en arrière-plan et l'ancien reste servi jusqu'au remplacement.
+    """
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.index: Optional[InvertedIndex] = None
+        self.version: Optional[str] = None
+        self._rebuilding = threading.Lock()
+
+    def build(self) -> None:
+        """Construit l'index depuis la base (contexte d'application requis)."""
+        # Version lue avant les livres : une écriture concurrente provoque une nouvelle reconstruction
+        validator = get_version_store().table('books')
+        index = InvertedIndex()
+        index.build(book.to_dict() for book in Book.query.yield_per(2000))
+        self.index, self.version = index, validator[0] if validator is not None else None
+
+    def current(self) -> Optional[InvertedIndex]:
+        """Index à servir ; lance sa reconstruction si le catalogue a changé."""
+        if self.index is None:
+            return None
+        validator = get_version_store().table('books')
+        if validator is not None and validator[0] != self.version and self._rebuilding.acquire(blocking=False):
+            threading.Thread(target=self._rebuild, name='search-index', daemon=True).start()
+        return self.index
+
+    def _rebuild(self) -> None:
+        try:
+            with self.app.app_context():
+                self.build()
+        except Exception as e:
+            print(f"Erreur lors de la reconstruction de l'index de recherche: {str(e)}")
+        finally:
+            self._rebuilding.release()
+
+
+def init_search_index(app: Flask) -> None:
+    """Construit l'index de recherche en mémoire si SEARCH_BACKEND vaut 'memory'.
+
+    Chaque processus tient son propre index ; il est reconstruit quand la
+    version de la table books change (voir MemorySearch).
+    """
+    if app.config.get('SEARCH_BACKEND', 'postgres') != 'memory':
+        return
+    memory_search = MemorySearch(app)
+    with app.app_context():
+        try:
+            memory_search.build()
+        except Exception as e:
+            print(f"Erreur lors de la construction de l'index de recherche: {str(e)}")
+            return
+    app.extensions['memory_search'] = memory_search
+
+
+def get_search_index() -> Optional[InvertedIndex]:
+    memory_search = current_app.extensions.get('memory_search')
+    return memory_search.current() if memory_search is not None else None
+
+
+def _loaded_search_index() -> Optional[InvertedIndex]:
+    # Sans contrôle de version : les écritures du processus s'appliquent à l'index servi
+    memory_search = current_app.extensions.get('memory_search')
+    return memory_search.index if memory_search is not None else None
+
+
+def get_search_mode(requested: Optional[str] = None) -> str:
+    """Mode de recherche : celui demandé s'il est disponible, sinon l'index en mémoire
+    s'il est construit, sinon celui de la configuration."""
+    has_index = get_search_index() is not None
+    if requested in SEARCH_MODES and (requested != 'memory' or has_index):
+        return requested
+    return 'memory' if has_index else current_app.config.get('SEARCH_MODE', 'fulltext')
+
+
+def ilike_search(book_query: Any, query: str) -> Any:
+    """Ancien comportement : sous-chaîne sur chaque champ, sans classement."""
+    return book_query.filter(
+        (Book.title.ilike(f'%{query}%')) |
+        (Book.author.ilike(f'%{query}%')) |
+        (Book.genre.ilike(f'%{query}%')) |
+        (Book.description.ilike(f'%{query}%'))
+    )
+
+
+def _ts_query(query: str) -> 'ColumnElement[Any]':
+    return func.websearch_to_tsquery(literal_column(f"'{SEARCH_TEXT_CONFIG}'::regconfig"), query)
+
+
+def fulltext_search(book_query: Any, query: str) -> Any:
+    """Filtre par l'index GIN et classe par ts_rank (syntaxe websearch : "…", OR, -mot)."""
+    ts_query = _ts_query(query)
+    return book_query.filter(SEARCH_VECTOR.op('@@')(ts_query)).order_by(
+        func.ts_rank(SEARCH_VECTOR, ts_query).desc(), Book.isbn
+    )
+
+
+def apply_text_search(book_query: Any, query: str, mode: str) -> Any:
+    if mode == 'ilike':
+        return ilike_search(book_query, query)
+    return fulltext_search(book_query, query)
+
+
+def paginate_search(book_query: Any, query: str, mode: str, page: int, per_page: int) -> Tuple[Any, str]:
+    """Pagine une recherche ; sans colonne plein texte (base non migrée), repli sur ilike."""
+    if not query:
+        return book_query.paginate(page=page, per_page=per_page, error_out=False), mode
+    try:
+        return apply_text_search(book_query, query, mode).paginate(
+            page=page, per_page=per_page, error_out=False
+        ), mode
+    except (OperationalError, ProgrammingError) as e:
+        if mode == 'ilike':
+            raise
+        db.session.rollback()
+        print(f"Recherche plein texte indisponible, repli sur ilike: {str(e)}")
+        return ilike_search(book_query, query).paginate(page=page, per_page=per_page, error_out=False), 'ilike'
+
+
+def _seek(book_query: Any, query: str, mode: str, cursor: Optional[List[Any]],
+          limit: int) -> Tuple[List[Book], Optional[List[Any]]]:
+    """Une page après le curseur, triée sur une clé indexée, sans OFFSET ni COUNT."""
+    if query and mode == 'fulltext':
+        ts_query = _ts_query(query)
+        rank = func.ts_rank(SEARCH_VECTOR, ts_query)
+        seek = book_query.filter(SEARCH_VECTOR.op('@@')(ts_query)).add_columns(rank)
+        if cursor is not None:
+            if len(cursor) != 2 or not isinstance(cursor[0], (int, float)) or not isinstance(cursor[1], str):
+                raise ValueError("Curseur incompatible avec la recherche plein texte")
+            last_rank, last_isbn = cursor
+            seek = seek.filter(or_(rank < last_rank, and_(rank == last_rank, Book.isbn > last_isbn)))
+        rows = seek.order_by(rank.desc(), Book.isbn).limit(limit + 1).all()
+        books = [book for book, _ in rows[:limit]]
+        next_cursor = [rows[limit - 1][1], rows[limit - 1][0].isbn] if len(rows) > limit else None
+        return books, next_cursor
+
+    if query:
+        book_query = ilike_search(book_query, query)
+    if cursor is not None:
+        if len(cursor) != 1 or not isinstance(cursor[0], str):
+            raise ValueError("Curseur incompatible avec ce mode de recherche")
+        book_query = book_query.filter(Book.isbn > cursor[0])
+    rows = book_query.order_by(Book.isbn).limit(limit + 1).all()
+    return rows[:limit], [rows[limit - 1].isbn] if len(rows) > limit else None
+
+
+def seek_search(book_query: Any, query: str, mode: str, cursor: Optional[List[Any]],
+                limit: int) -> Tuple[List[Book], Optional[List[Any]], str]:
+    """Pagination par curseur d'une recherche ; retourne (livres, curseur suivant, mode)."""
+    if query and mode == 'fulltext' and cursor is not None and len(cursor) == 1:
+        # Curseur émis par le repli ilike : poursuivre dans ce mode
+        mode = 'ilike'
+    try:
+        return (*_seek(book_query, query, mode, cursor, limit), mode)
+    except (OperationalError, ProgrammingError) as e:
+        if mode == 'ilike' or not query:
+            raise
+        db.session.rollback()
+        print(f"Recherche plein texte indisponible, repli sur ilike: {str(e)}")
+        # Un curseur plein texte ne vaut rien en mode ilike : reprise au début
+        return (*_seek(book_query, query, 'ilike', None, limit), 'ilike')
+
+
+def count_search(book_query: Any, query: str, mode: str) -> int:
+    if query:
+        book_query = apply_text_search(book_query, query, mode)
+    return int(book_query.order_by(None).count())
+
+
+# Facettes de recherche : nombre de valeurs retournées par facette
+FACET_LIMIT = 20
+
+# Bits de GROUPING(genre, author, decade) pour chaque ensemble de regroupement
+FACET_GROUPINGS = {3: 'genre', 5: 'author', 6: 'decade'}
+
+
+def _decade(year: 'ColumnElement[Any]') -> 'ColumnElement[Any]':
+    return case((year.op('~')('^[0-9]{4}$'), cast(year, Integer) // 10 * 10), else_=None)
+
+
+def query_facets(book_query: Any, query: str, mode: str, limit: int = FACET_LIMIT) -> Dict[str, List[Tuple[Any, int]]]:
+    """Comptes par genre, auteur et décennie en une seule requête (GROUPING SETS).
+
+    Seules les `limit` valeurs les plus fréquentes de chaque facette sont
+    retournées par la base, classées par une fonction de fenêtre.
+    """
+    if query:
+        book_query = apply_text_search(book_query, query, mode)
+    matched = book_query.order_by(None).with_entities(
+        Book.genre.label('genre'), Book.author.label('author'), _decade(Book.year).label('decade')
+    ).subquery()
+
+    grouping = func.grouping(matched.c.genre, matched.c.author, matched.c.decade)
+    counts = db.session.query(
+        grouping.label('grouping_id'), matched.c.genre, matched.c.author, matched.c.decade,
+        func.count().label('n')
+    ).group_by(func.grouping_sets(
+        tuple_(matched.c.genre), tuple_(matched.c.author), tuple_(matched.c.decade)
+    )).subquery()
+
+    # Les valeurs NULL forment leur propre groupe : les classer en dernier puis les écarter
+    value = func.coalesce(counts.c.genre, counts.c.author, cast(counts.c.decade, db.String))
+    ranked = db.session.query(
+        counts, func.row_number().over(
+            partition_by=counts.c.grouping_id, order_by=(value.is_(None), counts.c.n.desc(), value)
+        ).label('position')
+    ).subquery()
+    rows = db.session.query(ranked).filter(ranked.c.position <= limit + 1).order_by(
+        ranked.c.grouping_id, ranked.c.position
+    ).all()
+
+    facets: Dict[str, List[Tuple[Any, int]]] = {name: [] for name in FACET_GROUPINGS.values()}
+    for row in rows:
+        name = FACET_GROUPINGS.get(row.grouping_id)
+        if name is None:
+            continue
+        facet_value = getattr(row, name)
+        if facet_value is not None and len(facets[name]) < limit:
+            facets[name].append((facet_value, row.n))
+    return facets
+
+
+def get_facets(book_query: Any, query: str, filters: Dict[str, str], mode: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Facettes d'une recherche, en cache par requête normalisée."""
+    key = (
+        mode, normalize_prefix(query),
+        tuple(sorted((field, normalize_prefix(value)) for field, value in filters.items() if value))
+    )
+    cache = get_cache('facet_cache')
+    facets: Dict[str, List[Dict[str, Any]]] = cache.get(key)
+    if facets is not MISSING:
+        return facets
+
+    index = get_search_index() if mode == 'memory' else None
+    if index is not None:
+        counts = index.facets(query, filters, FACET_LIMIT)
+    else:
+        counts = query_facets(book_query, query, mode)
+    facets = {
+        name: [{'value': facet_value, 'count': count} for facet_value, count in values]
+        for name, values in counts.items()
+    }
+    cache.set(key, facets)
+    return facets
+
+
+# Suggestions à la frappe (/api/books/suggest)
+SUGGEST_MIN_PREFIX = 2
+SUGGEST_MAX_RESULTS = 10
+# En dessous de trois caractères, aucun trigramme complet : l'index pg_trgm ne
+# peut pas servir LIKE '%xx%', seules les correspondances en début sont cherchées
+SUGGEST_TRIGRAM_MIN = 3
+# Lignes lues par requête « contient » sur les auteurs, dédoublonnées ensuite
+SUGGEST_AUTHOR_ROWS = SUGGEST_MAX_RESULTS * 5
+
+
+def normalize_prefix(prefix: str) -> str:
+    return ' '.join(prefix.lower().split())
+
+
+def _like_escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _suggestion_key(prefix: str, text: str) -> Tuple[bool, int, str]:
+    """Ordre des suggestions : débute par le préfixe, puis la plus courte."""
+    return not text.lower().startswith(prefix), len(text), text
+
+
+def _prefix_key(column: 'ColumnElement[Any]') -> 'ColumnElement[Any]':
+    # Collation "C" : l'index B-tree (books_trigram.sql) sert LIKE 'préfixe%' et l'ordre
+    return func.lower(column).collate('C')
+
+
+def query_suggestions(prefix: str) -> Dict[str, Any]:
+    """Titres et auteurs commençant par le préfixe (index B-tree), puis le contenant (pg_trgm).
+
+    Chaque requête est bornée par LIMIT et lit les lignes dans l'ordre d'un
+    index : aucun tri de toutes les correspondances. Le classement final
+    (début, puis plus court) se fait sur les quelques lignes retournées.
+    """
+    escaped = _like_escape(prefix)
+    starts, contains = f'{escaped}%', f'%{escaped}%'
+    search_contains = len(prefix) >= SUGGEST_TRIGRAM_MIN
+
+    title_key = _prefix_key(Book.title)
+    titles = db.session.query(Book.isbn, Book.title, Book.author).filter(
+        title_key.like(starts, escape='\\')
+    ).order_by(title_key).limit(SUGGEST_MAX_RESULTS).all()
+    titles_complete = len(titles) < SUGGEST_MAX_RESULTS
+    if titles_complete and search_contains:
+        remaining = SUGGEST_MAX_RESULTS - len(titles)
+        title = func.lower(Book.title)
+        more = db.session.query(Book.isbn, Book.title, Book.author).filter(
+            title.like(contains, escape='\\'), ~title.like(starts, escape='\\')
+        ).limit(remaining).all()
+        titles += more
+        titles_complete = len(more) < remaining
+
+    author_key = _prefix_key(Book.author)
+    authors = [row.author for row in db.session.query(author_key.label('author_key'), Book.author).filter(
+        author_key.like(starts, escape='\\')
+    ).distinct().order_by(author_key).limit(SUGGEST_MAX_RESULTS)]
+    authors_complete = len(authors) < SUGGEST_MAX_RESULTS
+    if authors_complete and search_contains:
+        author = func.lower(Book.author)
+        rows = db.session.query(Book.author).filter(
+            author.like(contains, escape='\\'), ~author.like(starts, escape='\\')
+        ).limit(SUGGEST_AUTHOR_ROWS).all()
+        more = list(dict.fromkeys(row.author for row in rows if row.author not in authors))
+        authors += more[:SUGGEST_MAX_RESULTS - len(authors)]
+        authors_complete = len(rows) < SUGGEST_AUTHOR_ROWS and len(authors) < SUGGEST_MAX_RESULTS
+
+    titles = sorted(titles, key=lambda row: _suggestion_key(prefix, row.title))
+    return {
+        'titles': [{'isbn': row.isbn, 'title': row.title, 'author': row.author} for row in titles],
+        'authors': sorted(authors, key=lambda name: _suggestion_key(prefix, name)),
+        # Liste exhaustive (« contient » compris) : un préfixe plus long peut être servi en filtrant celle-ci
+        'complete': search_contains and titles_complete and authors_complete
+    }
+
+
+def _narrow_suggestions(suggestions: Dict[str, Any], prefix: str) -> Dict[str, Any]:
+    titles = [entry for entry in suggestions['titles'] if prefix in entry['title'].lower()]
+    authors = [name for name in suggestions['authors'] if prefix in name.lower()]
+    return {
+        'titles': sorted(titles, key=lambda entry: _suggestion_key(prefix, entry['title'])),
+        'authors': sorted(authors, key=lambda name: _suggestion_key(prefix, name)),
+        'complete': True
+    }
+
+
+def get_suggestions(prefix: str) -> Dict[str, Any]:
+    """Suggestions pour un préfixe normalisé, depuis le cache LRU quand c'est possible."""
+    cache = get_cache('suggest_cache')
+    suggestions: Dict[str, Any] = cache.get(prefix)
+    if suggestions is not MISSING:
+        return suggestions
+
+    # Un préfixe plus court dont la liste était exhaustive contient déjà tous les résultats
+    for length in range(len(prefix) - 1, SUGGEST_MIN_PREFIX - 1, -1):
+        shorter = cache.get(prefix[:length])
+        if shorter is not MISSING and shorter['complete']:
+            suggestions = _narrow_suggestions(shorter, prefix)
+            break
+    else:
+        suggestions = query_suggestions(prefix)
+    cache.set(prefix, suggestions)
+    return suggestions
+
+
+def invalidate_suggestions() -> None:
+    """Un livre ajouté, modifié ou supprimé peut concerner n'importe quel préfixe."""
+    get_cache('suggest_cache').clear()
+
+
+def notify_search_book_saved(book: Book) -> None:
+    """Répercute un livre créé ou modifié sur les suggestions, facettes et l'index en mémoire."""
+    invalidate_suggestions()
+    get_cache('facet_cache').clear()
+    index = _loaded_search_index()
+    if index is not None:
+        index.add(book.to_dict())
+
+
+def notify_search_book_deleted(isbn: str) -> None:
+    invalidate_suggestions()
+    get_cache('facet_cache').clear()
+    index = _loaded_search_index()
+    if index is not None:
+        index.remove(isbn)
@@ -0,0 +1,117 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from recommendation_engine import RecommendationEngine
+
+# Moteur propre à chaque processus de calcul, chargé une seule fois par worker.
+# Chargé depuis les artefacts projetés en mémoire, il partage ses pages avec
+# les autres workers au lieu d'être recopié dans chacun.
+_worker_engine: Optional[RecommendationEngine] = None
+
+# Un lot = (identifiants, préférences, ISBN déjà notés) pour un groupe d'utilisateurs
+Chunk = Tuple[List[int], List[Dict[str, List[str]]], List[List[str]]]
+
+
+def _init_worker(artifact_dir: str) -> None:
+    global _worker_engine
+    _worker_engine = RecommendationEngine.load(artifact_dir)
+
+
+def _score_chunk(chunk: Chunk, n_recommendations: int,
+                 engine: Optional[RecommendationEngine] = None) -> List[Tuple[int, List[Tuple[str, float]]]]:
+    """Note un lot d'utilisateurs et retourne (user_id, [(isbn, score), ...])."""
+    engine = engine or _worker_engine
+    if engine is None:
+        raise RuntimeError("Moteur de recommandation non chargé dans ce processus")
+    user_ids, preferences, excluded = chunk
+    scored = engine.score_batch(preferences, n_recommendations, excluded)
+    return [
+        (user_id, [(engine.books[row]['isbn'], score) for row, score in rows])
+        for user_id, rows in zip(user_ids, scored)
+    ]
+
+
+def load_chunks(chunk_size: int) -> List[Chunk]:
+    """Lit les préférences des utilisateurs actifs et leurs livres déjà notés."""
+    from app import db
+    from app.models import AuthUser, UserBookRating
+
+    rated: Dict[int, List[str]] = {}
+    for user_id, isbn in db.session.query(UserBookRating.user_id, UserBookRating.isbn):
+        rated.setdefault(user_id, []).append(isbn)
+
+    users = db.session.query(
+        AuthUser.user_id, AuthUser.favorite_genres, AuthUser.favorite_authors
+    ).filter(AuthUser.is_active.isnot(False)).order_by(AuthUser.user_id).all()
+
+    chunks: List[Chunk] = []
+    current: Chunk = ([], [], [])
+    for user_id, genres, authors in users:
+        if not genres and not authors:
+            continue
+        current[0].append(user_id)
+        current[1].append({'genres': genres or [], 'authors': authors or []})
+        current[2].append(rated.get(user_id, []))
+        if len(current[0]) >= chunk_size:
+            chunks.append(current)
+            current = ([], [], [])
+    if current[0]:
+        chunks.append(current)
+    return chunks
+
+
+def write_results(results: List[Tuple[int, List[Tuple[str, float]]]], generated_at: datetime) -> None:
+    """Remplace les recommandations précalculées des utilisateurs du lot."""
+    from app import db
+    from app.models import UserRecommendation
+
+    user_ids = [user_id for user_id, _ in results]
+    UserRecommendation.query.filter(UserRecommendation.user_id.in_(user_ids)).delete(synchronize_session=False)
+    rows = [
+        {'user_id': user_id, 'rank': rank, 'isbn': isbn, 'score': score, 'generated_at': generated_at}
+        for user_id, recommendations in results
+        for rank, (isbn, score) in enumerate(recommendations, start=1)
+    ]
+    if rows:
+        db.session.execute(UserRecommendation.__table__.insert(), rows)
+    db.session.commit()
+
+
+def run_batch(engine: RecommendationEngine, artifact_dir: Optional[str] = None,
+              n_recommendations: int = 20, chunk_size: int = 500, workers: Optional[int] = None) -> Dict[str, float]:
+    """Calcule et enregistre les recommandations de tous les utilisateurs.
+
+    Doit être appelé dans un contexte d'application. Si des artefacts du moteur
+    sont disponibles, les lots sont répartis sur un pool de processus ; sinon
+    ils sont notés dans le processus courant.
+    """
+    start = time.perf_counter()
+    generated_at = datetime.utcnow()
+    chunks = load_chunks(chunk_size)
+    n_users = sum(len(chunk[0]) for chunk in chunks)
+
+    pool_dir = artifact_dir if artifact_dir and os.path.exists(os.path.join(artifact_dir, 'manifest.json')) \
+        and len(chunks) > 1 and workers != 1 else None
+    if pool_dir is not None:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(pool_dir,)) as executor:
+            futures = [executor.submit(_score_chunk, chunk, n_recommendations) for chunk in chunks]
+            for future in futures:
+                write_results(future.result(), generated_at)
+    else:
+        for chunk in chunks:
+            write_results(_score_chunk(chunk, n_recommendations, engine), generated_at)
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        'users': n_users,
+        'chunks': len(chunks),
+        'seconds': round(elapsed, 3),
+        'users_per_second': round(n_users / elapsed, 1) if elapsed > 0 else 0.0
+    }
+    print(f"Recommandations batch: {n_users} utilisateurs en {elapsed:.2f}s "
+          f"({stats['users_per_second']} utilisateurs/s, {len(chunks)} lots)")
+    return stats
@@ -0,0 +1,222 @@
+import csv
+import json
+import os
+import shutil
+import time
+from typing import Dict, Iterable, List, Literal, Optional, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+
+# Une interaction = (clé utilisateur, isbn, poids de préférence dans [0, 1])
+Interaction = Tuple[str, str, float]
+
+# Poids donné aux notes implicites de Book-Crossing (note 0 = livre lu sans note)
+IMPLICIT_WEIGHT = 0.3
+
+
+def bookcrossing_user_key(user_id: Union[int, str]) -> str:
+    """Clé utilisateur pour la table historique `ratings` (Book-Crossing)."""
+    return f"bx:{user_id}"
+
+
+def auth_user_key(user_id: Union[int, str]) -> str:
+    """Clé utilisateur pour les comptes de l'application (`user_book_ratings`)."""
+    return f"auth:{user_id}"
+
+
+def bookcrossing_weight(rating: int) -> float:
+    """Convertit une note Book-Crossing (0-10) en poids de préférence."""
+    if not rating:
+        return IMPLICIT_WEIGHT
+    return rating / 10.0
+
+
+def app_weight(rating: int) -> float:
+    """Convertit une note de l'application (1-5) en poids de préférence."""
+    return rating / 5.0
+
+
+def interactions_from_csv(path: str) -> Iterable[Interaction]:
+    """Lit les interactions du fichier Book-Crossing (séparateur `;`)."""
+    with open(path, 'r', encoding='utf-8') as file:
+        csv_reader = csv.reader(file, delimiter=';')
+        next(csv_reader)  # Ignorer l'en-tête
+        for row in csv_reader:
+            if len(row) < 3:
+                continue
+            try:
+                rating = int(row[2])
+            except ValueError:
+                continue
+            yield bookcrossing_user_key(row[0]), row[1].strip('"'), bookcrossing_weight(rating)
+
+
+def interactions_from_db(batch_size: int = 10000) -> Iterable[Interaction]:
+    """Lit les interactions des tables `ratings` et `user_book_ratings`."""
+    from app import db
+    from app.models import Rating, UserBookRating
+
+    bx_rows = db.session.query(Rating.user_id, Rating.isbn, Rating.rating).yield_per(batch_size)
+    for user_id, isbn, rating in bx_rows:
+        yield bookcrossing_user_key(user_id), isbn, bookcrossing_weight(rating or 0)
+
+    app_rows = db.session.query(
+        UserBookRating.user_id, UserBookRating.isbn, UserBookRating.rating
+    ).yield_per(batch_size)
+    for user_id, isbn, rating in app_rows:
+        yield auth_user_key(user_id), isbn, app_weight(rating)
+
+
+class CollaborativeEngine:
+    """Factorisation matricielle (ALS implicite) sur la matrice utilisateurs × livres."""
+
+    def __init__(self, n_factors: int = 32, regularization: float = 0.1,
+                 alpha: float = 20.0, n_iterations: int = 10, random_state: int = 42):
+        self.n_factors = n_factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.n_iterations = n_iterations
+        self.random_state = random_state
+
+        self.user_index: Dict[str, int] = {}
+        self.isbns: List[str] = []
+        self.item_index: Dict[str, int] = {}
+        self.user_items: Optional[sparse.csr_matrix] = None
+        self.user_factors: Optional[np.ndarray] = None
+        self.item_factors: Optional[np.ndarray] = None
+
+    def build_matrix(self, interactions: Iterable[Interaction]) -> sparse.csr_matrix:
+        """Construit la matrice CSR utilisateurs × livres à partir des interactions."""
+        self.user_index = {}
+        self.item_index = {}
+        self.isbns = []
+        rows: List[int] = []
+        cols: List[int] = []
+        values: List[float] = []
+
+        for user_key, isbn, weight in interactions:
+            row = self.user_index.setdefault(user_key, len(self.user_index))
+            col = self.item_index.get(isbn)
+            if col is None:
+                col = self.item_index[isbn] = len(self.isbns)
+                self.isbns.append(isbn)
+            rows.append(row)
+            cols.append(col)
+            values.append(weight)
+
+        matrix = sparse.coo_matrix(
+            (np.asarray(values, dtype=np.float32), (rows, cols)),
+            shape=(len(self.user_index), len(self.isbns))
+        ).tocsr()
+        # Un même couple (utilisateur, livre) présent deux fois est sommé par tocsr
+        matrix.data = np.minimum(matrix.data, 1.0)
+        return matrix
+
+    def fit(self, interactions: Iterable[Interaction]) -> None:
+        """Entraîne le modèle ALS sur les interactions fournies."""
+        start = time.perf_counter()
+        self.user_items = self.build_matrix(interactions)
+        n_users, n_items = self.user_items.shape
+
+        rng = np.random.default_rng(self.random_state)
+        self.user_factors = (rng.standard_normal((n_users, self.n_factors)) * 0.01).astype(np.float32)
+        self.item_factors = (rng.standard_normal((n_items, self.n_factors)) * 0.01).astype(np.float32)
+
+        item_users = self.user_items.T.tocsr()
+        for _ in range(self.n_iterations):
+            self._least_squares(self.user_items, self.user_factors, self.item_factors)
+            self._least_squares(item_users, self.item_factors, self.user_factors)
+
+        print(f"Modèle collaboratif entraîné: {n_users} utilisateurs, {n_items} livres "
+              f"en {time.perf_counter() - start:.2f}s")
+
+    def _least_squares(self, matrix: sparse.csr_matrix, target: np.ndarray, fixed: np.ndarray) -> None:
+        """Résout une demi-itération ALS (Hu, Koren & Volinsky) ligne par ligne."""
+        fixed_gram = fixed.T @ fixed
+        identity = self.regularization * np.eye(self.n_factors, dtype=np.float32)
+
+        for row in range(matrix.shape[0]):
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            if start == end:
+                target[row] = 0.0
+                continue
+            indices = matrix.indices[start:end]
+            confidence = 1.0 + self.alpha * matrix.data[start:end]
+            factors = fixed[indices]
+            # A = YtY + Yt (Cu - I) Y + λI ; b = Yt Cu p(u) avec p(u) = 1
+            lhs = fixed_gram + (factors.T * (confidence - 1.0)) @ factors + identity
+            rhs = factors.T @ confidence
+            target[row] = np.linalg.solve(lhs, rhs)
+
+    def has_user(self, user_key: str) -> bool:
+        return user_key in self.user_index
+
+    def score_user(self, user_key: str) -> Optional[np.ndarray]:
+        """Retourne le score de chaque livre pour un utilisateur connu du modèle."""
+        if self.user_factors is None or self.item_factors is None or user_key not in self.user_index:
+            return None
+        scores: np.ndarray = self.item_factors @ self.user_factors[self.user_index[user_key]]
+        return scores
+
+    def recommend(self, user_key: str, n_recommendations: int = 10,
+                  exclude_seen: bool = True) -> List[Tuple[str, float]]:
+        """Retourne les `n` meilleurs (isbn, score) pour un utilisateur."""
+        scores = self.score_user(user_key)
+        if scores is None:
+            return []
+
+        if exclude_seen and self.user_items is not None:
+            row = self.user_index[user_key]
+            seen = self.user_items.indices[self.user_items.indptr[row]:self.user_items.indptr[row + 1]]
+            scores = scores.copy()
+            scores[seen] = -np.inf
+
+        n = min(n_recommendations, scores.shape[0])
+        if n <= 0:
+            return []
+        # Sélection partielle puis tri des seuls n candidats retenus
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top])]
+        return [(self.isbns[i], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def save(self, directory: str) -> None:
+        """Sauvegarde facteurs, index et matrice des interactions (remplacement atomique du répertoire)."""
+        if self.user_factors is None or self.item_factors is None or self.user_items is None:
+            raise ValueError("Modèle collaboratif non entraîné")
+        tmp_directory = f"{directory}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+        np.save(os.path.join(tmp_directory, 'user_factors.npy'), self.user_factors)
+        np.save(os.path.join(tmp_directory, 'item_factors.npy'), self.item_factors)
+        sparse.save_npz(os.path.join(tmp_directory, 'user_items.npz'), self.user_items)
+        with open(os.path.join(tmp_directory, 'model.json'), 'w', encoding='utf-8') as file:
+            json.dump({
+                'n_factors': self.n_factors, 'regularization': self.regularization,
+                'alpha': self.alpha, 'n_iterations': self.n_iterations,
+                'random_state': self.random_state,
+                'users': list(self.user_index), 'isbns': self.isbns
+            }, file)
+
+        old_directory = f"{directory}.old-{os.getpid()}"
+        if os.path.exists(directory):
+            os.rename(directory, old_directory)
+        os.rename(tmp_directory, directory)
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'CollaborativeEngine':
+        """Recharge un modèle entraîné, facteurs projetés en mémoire par défaut."""
+        mmap_mode: Optional[Literal['r']] = 'r' if mmap else None
+        with open(os.path.join(directory, 'model.json'), encoding='utf-8') as file:
+            model = json.load(file)
+        engine = cls(n_factors=model['n_factors'], regularization=model['regularization'],
+                     alpha=model['alpha'], n_iterations=model['n_iterations'],
+                     random_state=model['random_state'])
+        engine.user_index = {user_key: row for row, user_key in enumerate(model['users'])}
+        engine.isbns = model['isbns']
+        engine.item_index = {isbn: col for col, isbn in enumerate(engine.isbns)}
+        engine.user_factors = np.load(os.path.join(directory, 'user_factors.npy'), mmap_mode=mmap_mode)
+        engine.item_factors = np.load(os.path.join(directory, 'item_factors.npy'), mmap_mode=mmap_mode)
+        engine.user_items = sparse.load_npz(os.path.join(directory, 'user_items.npz')).tocsr()
+        return engine
@@ -0,0 +1,234 @@
+"""Évaluation hors ligne et banc de latence des moteurs de recommandation.
+
+Découpe les notes Book-Crossing en apprentissage / test par utilisateur, puis
+mesure pour chaque variante la qualité (precision@k, recall@k, couverture) et
+le coût (durée d'entraînement, latence p50/p99, débit, pic mémoire). Le
+résultat est écrit en JSON pour servir de référence comparable en revue :
+
+    python evaluate_recommenders.py --output benchmarks/recommenders_baseline.json
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from collaborative_engine import CollaborativeEngine, Interaction, interactions_from_csv
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def split_by_user(interactions: List[Interaction], test_fraction: float = 0.2, min_interactions: int = 5,
+                  seed: int = 42) -> Tuple[List[Interaction], Dict[str, Set[str]]]:
+    """Réserve une fraction des interactions de chaque utilisateur actif pour le test."""
+    by_user: Dict[str, List[Interaction]] = defaultdict(list)
+    for interaction in interactions:
+        by_user[interaction[0]].append(interaction)
+
+    rng = random.Random(seed)
+    train: List[Interaction] = []
+    test: Dict[str, Set[str]] = {}
+    for user_key in sorted(by_user):
+        user_interactions = by_user[user_key]
+        if len(user_interactions) < min_interactions:
+            train.extend(user_interactions)
+            continue
+        rng.shuffle(user_interactions)
+        n_test = max(1, int(len(user_interactions) * test_fraction))
+        test[user_key] = {isbn for _, isbn, _ in user_interactions[:n_test]}
+        train.extend(user_interactions[n_test:])
+    return train, test
+
+
+def load_books(path: str) -> Dict[str, SimpleNamespace]:
+    """Lit le catalogue Book-Crossing (même format que `load_books_from_csv`)."""
+    books = {}
+    with open(path, 'r', encoding='utf-8') as file:
+        csv_reader = csv.reader(file, delimiter=';')
+        next(csv_reader)  # Ignorer l'en-tête
+        for row in csv_reader:
+            if len(row) < 8:
+                continue
+            isbn = row[0].strip('"')
+            books[isbn] = SimpleNamespace(
+                isbn=isbn, title=row[1].strip('"'), author=row[2].strip('"'), year=row[3].strip('"'),
+                publisher=row[4].strip('"'), image_url_s=row[5].strip('"'), image_url_m=row[6].strip('"'),
+                image_url_l=row[7].strip('"'), genre=None, description=None
+            )
+    return books
+
+
+class PopularityVariant:
+    """Référence : les livres les plus notés de l'ensemble d'apprentissage."""
+
+    name = 'popularity'
+
+    def fit(self, train: List[Interaction]):
+        self.seen: Dict[str, Set[str]] = defaultdict(set)
+        counts: Counter = Counter()
+        for user_key, isbn, _ in train:
+            counts[isbn] += 1
+            self.seen[user_key].add(isbn)
+        self.ranking = [isbn for isbn, _ in counts.most_common()]
+
+    def recommend(self, user_key: str, k: int) -> List[str]:
+        seen = self.seen.get(user_key, set())
+        result = []
+        for isbn in self.ranking:
+            if isbn not in seen:
+                result.append(isbn)
+                if len(result) == k:
+                    break
+        return result
+
+
+class CollaborativeVariant:
+    """Factorisation ALS (`CollaborativeEngine`)."""
+
+    def __init__(self, n_factors: int = 32, n_iterations: int = 10):
+        self.name = f'als-{n_factors}'
+        self.engine = CollaborativeEngine(n_factors=n_factors, n_iterations=n_iterations)
+
+    def fit(self, train: List[Interaction]):
+        self.engine.fit(train)
+
+    def recommend(self, user_key: str, k: int) -> List[str]:
+        return [isbn for isbn, _ in self.engine.recommend(user_key, k)]
+
+
+class ContentVariant:
+    """Moteur TF-IDF (`RecommendationEngine`), profil = auteurs des livres notés."""
+
+    def __init__(self, books: Dict[str, SimpleNamespace], incremental: bool = False):
+        self.name = 'content-hashing' if incremental else 'content-tfidf'
+        self.books = books
+        self.incremental = incremental
+
+    def fit(self, train: List[Interaction]):
+        from recommendation_engine import RecommendationEngine
+
+        self.profiles: Dict[str, Dict[str, List[str]]] = defaultdict(lambda: {'genres': [], 'authors': []})
+        self.seen: Dict[str, Set[str]] = defaultdict(set)
+        rated = set()
+        for user_key, isbn, _ in train:
+            self.seen[user_key].add(isbn)
+            rated.add(isbn)
+            book = self.books.get(isbn)
+            if book is not None:
+                self.profiles[user_key]['authors'].append(book.author)
+        self.engine = RecommendationEngine(incremental=self.incremental)
+        self.engine.fit([self.books[isbn] for isbn in sorted(rated) if isbn in self.books])
+
+    def recommend(self, user_key: str, k: int) -> List[str]:
+        recommendations = self.engine.get_recommendations(
+            self.profiles[user_key], k, excluded=self.seen.get(user_key, set())
+        )
+        return [book['isbn'] for book in recommendations]
+
+
+def evaluate(variant, train: List[Interaction], test: Dict[str, Set[str]], k: int = 10,
+             max_users: Optional[int] = None) -> dict:
+    """Entraîne une variante puis mesure qualité et coût sur les utilisateurs de test."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    variant.fit(train)
+    fit_seconds = time.perf_counter() - start
+    _, fit_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    users = sorted(test)[:max_users] if max_users else sorted(test)
+    catalogue = {isbn for _, isbn, _ in train}
+    recommended: Set[str] = set()
+    latencies = np.empty(len(users), dtype=np.float64)
+    precisions = np.empty(len(users), dtype=np.float64)
+    recalls = np.empty(len(users), dtype=np.float64)
+
+    total_start = time.perf_counter()
+    for position, user_key in enumerate(users):
+        query_start = time.perf_counter()
+        isbns = variant.recommend(user_key, k)
+        latencies[position] = time.perf_counter() - query_start
+        hits = len(test[user_key].intersection(isbns))
+        precisions[position] = hits / k
+        recalls[position] = hits / len(test[user_key])
+        recommended.update(isbns)
+    total_seconds = time.perf_counter() - total_start
+
+    return {
+        f'precision@{k}': round(float(precisions.mean()), 5) if users else 0.0,
+        f'recall@{k}': round(float(recalls.mean()), 5) if users else 0.0,
+        'coverage': round(len(recommended & catalogue) / len(catalogue), 5) if catalogue else 0.0,
+        'fit_seconds': round(fit_seconds, 3),
+        'fit_peak_memory_mb': round(fit_peak / 1024 / 1024, 2),
+        'latency_p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 3) if users else 0.0,
+        'latency_p99_ms': round(float(np.percentile(latencies, 99)) * 1000, 3) if users else 0.0,
+        'throughput_qps': round(len(users) / total_seconds, 1) if total_seconds > 0 else 0.0,
+        'users_evaluated': len(users)
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Évalue les moteurs de recommandation hors ligne")
+    parser.add_argument('--ratings', default=os.path.join(DATA_DIR, 'ratings_utf8_clean.csv'))
+    parser.add_argument('--books', default=os.path.join(DATA_DIR, 'books_utf8_clean.csv'),
+                        help="Catalogue pour les variantes de contenu (ignorées s'il est absent)")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--test-fraction', type=float, default=0.2)
+    parser.add_argument('--min-interactions', type=int, default=5)
+    parser.add_argument('--max-users', type=int, default=None)
+    parser.add_argument('--factors', type=int, nargs='*', default=[16, 64])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help="Fichier JSON de résultats (sortie standard sinon)")
+    args = parser.parse_args(argv)
+
+    interactions = list(interactions_from_csv(args.ratings))
+    train, test = split_by_user(interactions, args.test_fraction, args.min_interactions, args.seed)
+    print(f"{len(interactions)} interactions, {len(train)} en apprentissage, "
+          f"{sum(len(items) for items in test.values())} en test ({len(test)} utilisateurs)", file=sys.stderr)
+
+    variants = [PopularityVariant()] + [CollaborativeVariant(n_factors) for n_factors in args.factors]
+    if os.path.exists(args.books):
+        books = load_books(args.books)
+        variants += [ContentVariant(books), ContentVariant(books, incremental=True)]
+    else:
+        print(f"Catalogue introuvable ({args.books}) : variantes de contenu ignorées", file=sys.stderr)
+
+    results = {}
+    for variant in variants:
+        print(f"Évaluation de {variant.name}...", file=sys.stderr)
+        results[variant.name] = evaluate(variant, train, test, args.k, args.max_users)
+
+    report = {
+        'dataset': os.path.basename(args.ratings),
+        'split': {
+            'test_fraction': args.test_fraction,
+            'min_interactions': args.min_interactions,
+            'seed': args.seed,
+            'train_interactions': len(train),
+            'test_users': len(test)
+        },
+        'k': args.k,
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine()},
+        'variants': results
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
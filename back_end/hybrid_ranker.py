@@ -0,0 +1,124 @@
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+# Poids par défaut des signaux combinés par le classement hybride
+DEFAULT_WEIGHTS = {'content': 0.6, 'collaborative': 0.3, 'popularity': 0.1}
+DEFAULT_DIVERSITY = 0.3
+
+
+def min_max(scores: np.ndarray) -> np.ndarray:
+    """Ramène des scores dans [0, 1] ; les valeurs absentes (NaN) valent 0."""
+    scores = np.asarray(scores, dtype=np.float64)
+    normalized = np.zeros_like(scores)
+    finite = np.isfinite(scores)
+    if not finite.any():
+        return normalized
+    low, high = scores[finite].min(), scores[finite].max()
+    if high > low:
+        normalized[finite] = (scores[finite] - low) / (high - low)
+    elif high > 0:
+        normalized[finite] = 1.0
+    return normalized
+
+
+class CandidateSimilarity:
+    """Similarité entre candidats : cosinus des vecteurs, 1 pour un même auteur.
+
+    Les lignes sont calculées à la demande : la MMR n'a besoin que de celles des
+    `n` livres retenus, pas de la matrice C × C complète.
+    """
+
+    def __init__(self, vectors: Optional[sparse.csr_matrix] = None,
+                 authors: Optional[Sequence[Optional[str]]] = None) -> None:
+        self.vectors = sparse.csr_matrix(vectors) if vectors is not None else None
+        self._buffer = np.zeros(vectors.shape[1] if vectors is not None else 0)
+        self.author_codes: Optional[np.ndarray] = None
+        if authors is not None:
+            codes: Dict[str, int] = {}
+            # Un auteur inconnu ne rend pas deux livres redondants : code unique négatif
+            self.author_codes = np.array([
+                codes.setdefault(key, len(codes)) if key else -1 - position
+                for position, key in enumerate((author or '').strip().lower() for author in authors)
+            ], dtype=np.int64)
+
+    def row(self, position: int) -> np.ndarray:
+        similarity: Optional[np.ndarray] = None
+        if self.vectors is not None:
+            start, end = self.vectors.indptr[position], self.vectors.indptr[position + 1]
+            columns = self.vectors.indices[start:end]
+            # Produit matrice creuse × vecteur dense : O(nnz) sans transposition
+            self._buffer[columns] = self.vectors.data[start:end]
+            similarity = self.vectors @ self._buffer
+            self._buffer[columns] = 0.0
+        if self.author_codes is not None:
+            same_author = (self.author_codes == self.author_codes[position]).astype(np.float64)
+            similarity = same_author if similarity is None else np.maximum(similarity, same_author)
+        if similarity is None:
+            raise ValueError("Similarité sans vecteurs ni auteurs")
+        return similarity
+
+
+class HybridRanker:
+    """Combine plusieurs signaux de pertinence puis diversifie la liste (MMR).
+
+    Tout le calcul se fait sur des tableaux NumPy alignés sur les candidats ;
+    la seule boucle Python est celle des `n` sélections MMR, chacune en O(C).
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, diversity: float = DEFAULT_DIVERSITY):
+        self.weights = dict(DEFAULT_WEIGHTS if weights is None else weights)
+        self.diversity = diversity
+
+    def blend(self, components: Dict[str, np.ndarray], weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Somme pondérée des signaux normalisés ; un signal absent ne pèse rien."""
+        weights = self.weights if weights is None else weights
+        size = len(next(iter(components.values())))
+        relevance = np.zeros(size, dtype=np.float64)
+        total_weight = 0.0
+        for name, scores in components.items():
+            weight = weights.get(name, 0.0)
+            if weight <= 0 or scores is None:
+                continue
+            relevance += weight * min_max(scores)
+            total_weight += weight
+        return relevance / total_weight if total_weight > 0 else relevance
+
+    @staticmethod
+    def diversify(relevance: np.ndarray, similarity: Optional[CandidateSimilarity], n: int,
+                  diversity: float) -> np.ndarray:
+        """Maximal Marginal Relevance : pertinence moins redondance avec la sélection."""
+        n = min(n, relevance.shape[0])
+        if n <= 0:
+            return np.array([], dtype=np.int64)
+        if similarity is None or diversity <= 0:
+            top = np.argpartition(-relevance, n - 1)[:n]
+            return top[np.argsort(-relevance[top])]
+
+        selected = np.empty(n, dtype=np.int64)
+        max_similarity = np.zeros(relevance.shape[0], dtype=np.float64)
+        available = np.ones(relevance.shape[0], dtype=bool)
+        for step in range(n):
+            marginal = (1.0 - diversity) * relevance - diversity * max_similarity
+            marginal[~available] = -np.inf
+            best = int(np.argmax(marginal))
+            selected[step] = best
+            available[best] = False
+            np.maximum(max_similarity, similarity.row(best), out=max_similarity)
+        return selected
+
+    def rank(self, components: Dict[str, np.ndarray], n: int = 10,
+             weights: Optional[Dict[str, float]] = None, diversity: Optional[float] = None,
+             vectors: Optional[sparse.csr_matrix] = None,
+             authors: Optional[Sequence[Optional[str]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Retourne les positions des candidats retenus et leur pertinence combinée."""
+        relevance = self.blend(components, weights)
+        if relevance.shape[0] == 0:
+            return np.array([], dtype=np.int64), relevance
+        diversity = self.diversity if diversity is None else diversity
+        similarity = None
+        if diversity > 0 and (vectors is not None or authors is not None):
+            similarity = CandidateSimilarity(vectors, authors)
+        selected = self.diversify(relevance, similarity, n, diversity)
+        return selected, relevance[selected]
@@ -0,0 +1,273 @@
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Pondération des champs dans la fréquence des termes (titre > auteur > genre > description)
+FIELD_WEIGHTS = {'title': 3.0, 'author': 2.0, 'genre': 1.5, 'description': 1.0}
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def publication_decade(year: Optional[str]) -> Optional[int]:
+    """Décennie d'une année sur quatre chiffres (les années inconnues valent '0' dans Book-Crossing)."""
+    if year and len(year) == 4 and year.isdigit():
+        return int(year) // 10 * 10
+    return None
+
+
+class InvertedIndex:
+    """Index inversé en mémoire avec classement BM25.
+
+    Chaque terme pointe vers deux tableaux triés et compacts : identifiants de
+    documents (int32) et fréquences pondérées (float32). Les identifiants sont
+    attribués dans l'ordre d'ajout, donc un livre ajouté ou modifié est ajouté
+    en fin de liste sans retrier ; son ancienne version est seulement désactivée.
+    Les ajouts sont regroupés par terme et fusionnés au prochain accès.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pending: Dict[str, Tuple[List[int], List[float]]] = {}
+        self.documents: List[Optional[Dict[str, Any]]] = []
+        self.doc_index: Dict[str, int] = {}
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.total_length = 0.0
+        self.n_alive = 0
+        self.created_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def term_frequencies(book: Dict[str, Any]) -> Dict[str, float]:
+        frequencies: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(book.get(field)):
+                frequencies[token] = frequencies.get(token, 0.0) + weight
+        return frequencies
+
+    def _reserve(self, n_docs: int) -> None:
+        if n_docs <= self.alive.shape[0]:
+            return
+        capacity = max(self.alive.shape[0] * 2, n_docs, 1024)
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - self.alive.shape[0], dtype=bool)])
+        self.doc_lengths = np.concatenate(
+            [self.doc_lengths, np.zeros(capacity - self.doc_lengths.shape[0], dtype=np.float32)]
+        )
+
+    def build(self, books: Iterable[Dict[str, Any]]) -> None:
+        """Construit l'index à partir d'un instantané du catalogue (dictionnaires `to_dict`)."""
+        start = time.perf_counter()
+        doc_ids: Dict[str, List[int]] = {}
+        frequencies: Dict[str, List[float]] = {}
+        documents: List[Optional[Dict[str, Any]]] = []
+        doc_index: Dict[str, int] = {}
+        lengths: List[float] = []
+        for book in books:
+            doc_id = len(documents)
+            documents.append(book)
+            doc_index[book['isbn']] = doc_id
+            tf = self.term_frequencies(book)
+            lengths.append(sum(tf.values()))
+            for token, value in tf.items():
+                doc_ids.setdefault(token, []).append(doc_id)
+                frequencies.setdefault(token, []).append(value)
+
+        postings = {
+            token: (np.array(ids, dtype=np.int32), np.array(frequencies[token], dtype=np.float32))
+            for token, ids in doc_ids.items()
+        }
+        with self._lock:
+            self.postings = postings
+            self._pending = {}
+            self.documents = documents
+            # Un ISBN en double ne garde que sa dernière version
+            self.doc_index = doc_index
+            self.alive = np.zeros(0, dtype=bool)
+            self.doc_lengths = np.zeros(0, dtype=np.float32)
+            self._reserve(len(documents))
+            self.alive[list(doc_index.values())] = True
+            self.doc_lengths[:len(lengths)] = lengths
+            self.n_alive = len(doc_index)
+            self.total_length = float(self.doc_lengths[self.alive].sum())
+            self.created_at = time.time()
+        print(f"✅ Index de recherche construit: {self.n_alive} livres, {len(postings)} termes "
+              f"en {time.perf_counter() - start:.2f}s")
+
+    def _remove(self, isbn: str) -> None:
+        doc_id = self.doc_index.pop(isbn, None)
+        if doc_id is not None and self.alive[doc_id]:
+            self.alive[doc_id] = False
+            self.documents[doc_id] = None
+            self.n_alive -= 1
+            self.total_length -= float(self.doc_lengths[doc_id])
+
+    def add(self, book: Dict[str, Any]) -> None:
+        """Ajoute ou remplace un livre."""
+        tf = self.term_frequencies(book)
+        with self._lock:
+            self._remove(book['isbn'])
+            doc_id = len(self.documents)
+            self._reserve(doc_id + 1)
+            self.documents.append(book)
+            self.doc_index[book['isbn']] = doc_id
+            self.alive[doc_id] = True
+            self.doc_lengths[doc_id] = sum(tf.values())
+            self.n_alive += 1
+            self.total_length += float(self.doc_lengths[doc_id])
+            for token, value in tf.items():
+                pending = self._pending.setdefault(token, ([], []))
+                pending[0].append(doc_id)
+                pending[1].append(value)
+
+    def remove(self, isbn: str) -> None:
+        with self._lock:
+            self._remove(isbn)
+
+    def _postings(self, token: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Liste d'un terme, après fusion des ajouts en attente (appelé sous verrou)."""
+        pending = self._pending.pop(token, None)
+        if pending is not None:
+            ids = np.array(pending[0], dtype=np.int32)
+            values = np.array(pending[1], dtype=np.float32)
+            base = self.postings.get(token)
+            if base is not None:
+                ids, values = np.concatenate([base[0], ids]), np.concatenate([base[1], values])
+            self.postings[token] = (ids, values)
+        return self.postings.get(token)
+
+    def _match(self, query: str, filters: Optional[Dict[str, str]]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Documents correspondants et leurs scores BM25 (None sans termes), appelé sous verrou.
+
+        Tous les termes de la requête doivent être présents (comme
+        `websearch_to_tsquery`) ; les filtres par champ gardent la sémantique
+        « contient » de l'ancienne recherche ilike.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        filters = {field: value.lower() for field, value in (filters or {}).items() if value}
+        n_docs = len(self.documents)
+        alive = self.alive[:n_docs]
+        if terms:
+            scores = np.zeros(n_docs, dtype=np.float64)
+            matched = np.zeros(n_docs, dtype=np.int32)
+            avg_length = self.total_length / self.n_alive if self.n_alive else 1.0
+            for term in terms:
+                postings = self._postings(term)
+                if postings is None:
+                    return np.zeros(0, dtype=np.int64), scores
+                ids, tf = postings
+                live = alive[ids]
+                ids, tf = ids[live], tf[live]
+                df = ids.shape[0]
+                idf = math.log(1.0 + (self.n_alive - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[ids] / avg_length)
+                scores[ids] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+                matched[ids] += 1
+            candidates = np.flatnonzero(matched == len(terms))
+        else:
+            scores = None
+            candidates = np.flatnonzero(alive)
+
+        if filters:
+            documents = self.documents
+            candidates = np.array([
+                doc_id for doc_id in candidates
+                if all(value in ((documents[doc_id] or {}).get(field) or '').lower() for field, value in filters.items())
+            ], dtype=np.int64)
+        return candidates, scores
+
+    @staticmethod
+    def _top(candidates: np.ndarray, candidate_scores: np.ndarray, end: int) -> np.ndarray:
+        """Les `end` premiers candidats, par score décroissant puis ordre d'insertion."""
+        total = candidates.shape[0]
+        if end < total:
+            # Ne trier que les meilleurs candidats, ex aequo du seuil compris
+            threshold = np.partition(candidate_scores, total - end)[total - end]
+            keep = candidate_scores >= threshold
+            candidates, candidate_scores = candidates[keep], candidate_scores[keep]
+        order = np.lexsort((candidates, -candidate_scores))
+        return candidates[order[:end]]
+
+    def search(self, query: str, filters: Optional[Dict[str, str]] = None, page: int = 1,
+               per_page: int = 12) -> Tuple[List[Dict[str, Any]], int]:
+        """Retourne la page demandée et le nombre total de résultats."""
+        with self._lock:
+            candidates, scores = self._match(query, filters)
+            total = int(candidates.shape[0])
+            offset = max(page - 1, 0) * per_page
+            if offset >= total or per_page <= 0:
+                return [], total
+            end = min(offset + per_page, total)
+            if scores is not None:
+                window = self._top(candidates, scores[candidates], end)[offset:]
+            else:
+                window = candidates[offset:end]
+            return [self.documents[doc_id] for doc_id in window], total
+
+    def seek(self, query: str, filters: Optional[Dict[str, str]] = None, cursor: Optional[List[Any]] = None,
+             limit: int = 12) -> Tuple[List[Dict[str, Any]], Optional[List[Any]], int]:
+        """Page suivant un curseur [score, identifiant] ; retourne aussi le nombre total de résultats.
+
+        Un livre modifié entre deux pages change d'identifiant et peut être
+        servi deux fois ou sauté, comme avec tout curseur sur données vivantes.
+        """
+        with self._lock:
+            candidates, scores = self._match(query, filters)
+            total = int(candidates.shape[0])
+            if cursor is not None:
+                if len(cursor) != 2 or not isinstance(cursor[1], int) or \
+                        (scores is not None) != isinstance(cursor[0], (int, float)):
+                    raise ValueError("Curseur incompatible avec cette recherche")
+                last_score, last_id = cursor
+                if scores is not None:
+                    candidate_scores = scores[candidates]
+                    after = (candidate_scores < last_score) | ((candidate_scores == last_score) & (candidates > last_id))
+                    candidates = candidates[after]
+                else:
+                    candidates = candidates[candidates > last_id]
+
+            if scores is not None:
+                window = self._top(candidates, scores[candidates], limit + 1)
+            else:
+                window = candidates[:limit + 1]
+            next_cursor = None
+            if window.shape[0] > limit:
+                last = int(window[limit - 1])
+                next_cursor = [float(scores[last]) if scores is not None else None, last]
+            return [self.documents[doc_id] for doc_id in window[:limit]], next_cursor, total
+
+    def facets(self, query: str, filters: Optional[Dict[str, str]] = None,
+               limit: int = 20) -> Dict[str, List[Tuple[Any, int]]]:
+        """Comptes par genre, auteur et décennie de publication des résultats d'une recherche."""
+        with self._lock:
+            candidates, _ = self._match(query, filters)
+            documents = [self.documents[doc_id] for doc_id in candidates]
+        counters: Dict[str, Counter[Any]] = {'genre': Counter(), 'author': Counter(), 'decade': Counter()}
+        for book in documents:
+            if book.get('genre'):
+                counters['genre'][book['genre']] += 1
+            if book.get('author'):
+                counters['author'][book['author']] += 1
+            decade = publication_decade(book.get('year'))
+            if decade is not None:
+                counters['decade'][decade] += 1
+        return {name: counter.most_common(limit) for name, counter in counters.items()}
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'documents': self.n_alive,
+            'terms': len(self.postings) + len(self._pending.keys() - self.postings.keys()),
+            'deleted': len(self.documents) - self.n_alive,
+            'created_at': self.created_at
+        }
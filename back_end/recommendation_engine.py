@@ -1,67 +1,338 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from scipy import sparse
 import numpy as np
-from typing import List, Dict, Any
-from models import Book
+import json
+import os
+import shutil
+import threading
+import time
+from typing import List, Dict, Any, Iterable, Literal, Optional, Sequence, Tuple
+from app.models import Book
 
-class RecommendationEngine:
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(
-            stop_words='english',
-            max_features=5000,
-            ngram_range=(1, 2)
+# Champs du livre conservés en mémoire pour formater les recommandations
+BOOK_FIELDS = ('isbn', 'title', 'author', 'year', 'publisher',
+               'image_url_s', 'image_url_m', 'image_url_l', 'genre')
+
+# Version du format des artefacts sauvegardés sur disque
+ARTIFACT_VERSION = 1
+
+
+class VectorStore:
+    """Matrice CSR en ajout seul : une ligne remplacée est désactivée, jamais recopiée."""
+
+    def __init__(self, n_features: int, capacity: int = 1024):
+        self.n_features = n_features
+        self.n_rows = 0
+        self.nnz = 0
+        self.indptr = np.zeros(capacity + 1, dtype=np.int64)
+        self.indices = np.zeros(capacity * 16, dtype=np.int32)
+        self.data = np.zeros(capacity * 16, dtype=np.float64)
+        self.active = np.zeros(capacity, dtype=bool)
+
+    @staticmethod
+    def _grow(array: np.ndarray, size: int) -> np.ndarray:
+        """Double la capacité d'un tableau jusqu'à contenir `size` éléments.
+
+        Un tableau en lecture seule (projeté en mémoire depuis le disque) est
+        recopié en mémoire privée avant toute écriture.
+        """
+        if size <= array.shape[0]:
+            return array if array.flags.writeable else np.array(array)
+        capacity = max(array.shape[0], 1)
+        while capacity < size:
+            capacity *= 2
+        grown = np.zeros(capacity, dtype=array.dtype)
+        grown[:array.shape[0]] = array
+        return grown
+
+    def append(self, rows: sparse.csr_matrix) -> np.ndarray:
+        """Ajoute des lignes et retourne leurs positions dans la matrice."""
+        rows = sparse.csr_matrix(rows)
+        n_new, new_nnz = rows.shape[0], rows.nnz
+        start_row, start_nnz = self.n_rows, self.nnz
+
+        self.indptr = self._grow(self.indptr, start_row + n_new + 1)
+        self.active = self._grow(self.active, start_row + n_new)
+        self.indices = self._grow(self.indices, start_nnz + new_nnz)
+        self.data = self._grow(self.data, start_nnz + new_nnz)
+
+        self.indices[start_nnz:start_nnz + new_nnz] = rows.indices
+        self.data[start_nnz:start_nnz + new_nnz] = rows.data
+        self.indptr[start_row + 1:start_row + n_new + 1] = rows.indptr[1:] + start_nnz
+        self.active[start_row:start_row + n_new] = True
+
+        self.nnz += new_nnz
+        self.n_rows += n_new
+        return np.arange(start_row, start_row + n_new)
+
+    def deactivate(self, row_ids: Iterable[int]) -> None:
+        """Marque des lignes comme inactives (livre supprimé ou remplacé)."""
+        if not self.active.flags.writeable:
+            self.active = np.array(self.active)
+        self.active[list(row_ids)] = False
+
+    @property
+    def matrix(self) -> sparse.csr_matrix:
+        """Vue CSR sur les lignes stockées, sans copie des tableaux."""
+        return sparse.csr_matrix(
+            (self.data[:self.nnz], self.indices[:self.nnz], self.indptr[:self.n_rows + 1]),
+            shape=(self.n_rows, self.n_features),
+            copy=False
         )
-        self.book_vectors = None
-        self.books = None
+
+    @property
+    def active_mask(self) -> np.ndarray:
+        return self.active[:self.n_rows]
+
+    def save(self, directory: str) -> None:
+        """Écrit les tableaux CSR en fichiers .npy distincts (projetables en mémoire)."""
+        np.save(os.path.join(directory, 'vectors_data.npy'), self.data[:self.nnz])
+        np.save(os.path.join(directory, 'vectors_indices.npy'), self.indices[:self.nnz])
+        np.save(os.path.join(directory, 'vectors_indptr.npy'), self.indptr[:self.n_rows + 1])
+        np.save(os.path.join(directory, 'vectors_active.npy'), self.active_mask)
+
+    @classmethod
+    def load(cls, directory: str, n_features: int, mmap_mode: Optional[Literal['r']] = 'r') -> 'VectorStore':
+        """Recharge un stock sauvegardé ; les pages sont partagées entre processus."""
+        store = cls.__new__(cls)
+        store.n_features = n_features
+        store.data = np.load(os.path.join(directory, 'vectors_data.npy'), mmap_mode=mmap_mode)
+        store.indices = np.load(os.path.join(directory, 'vectors_indices.npy'), mmap_mode=mmap_mode)
+        store.indptr = np.load(os.path.join(directory, 'vectors_indptr.npy'), mmap_mode=mmap_mode)
+        store.active = np.load(os.path.join(directory, 'vectors_active.npy'), mmap_mode=mmap_mode)
+        store.n_rows = store.indptr.shape[0] - 1
+        store.nnz = store.data.shape[0]
+        return store
+
+
+class RecommendationEngine:
+    def __init__(self, incremental: bool = False):
+        # En mode incrémental, le vocabulaire est haché : aucun réentraînement
+        # n'est nécessaire pour vectoriser un nouveau livre
+        self.incremental = incremental
+        if incremental:
+            self.vectorizer = HashingVectorizer(
+                stop_words='english',
+                n_features=2 ** 18,
+                ngram_range=(1, 2),
+                alternate_sign=False,
+                norm='l2'
+            )
+        else:
+            self.vectorizer = TfidfVectorizer(
+                stop_words='english',
+                max_features=5000,
+                ngram_range=(1, 2)
+            )
+        self.store: Optional[VectorStore] = None
+        self.books: List[Dict[str, Any]] = []
+        self.book_index: Dict[str, int] = {}
+        # Date d'entraînement, qui identifie les artefacts dérivés de ce modèle
+        self.created_at: Optional[float] = None
+        # État du catalogue reflété par le moteur (version de table, date de synchronisation)
+        self.catalogue: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def book_vectors(self) -> Optional[sparse.csr_matrix]:
+        return self.store.matrix if self.store is not None else None
+
+    @staticmethod
+    def book_text(book: Book) -> str:
+        """Combine les informations pertinentes du livre en un seul texte."""
+        text = f"{book.title} {book.author} {book.genre} {book.publisher}"
+        if book.description:
+            text += f" {book.description}"
+        return text
 
     def prepare_book_data(self, books: List[Book]) -> List[str]:
         """Prépare les données des livres pour la vectorisation."""
-        self.books = books
-        book_texts = []
-        for book in books:
-            # Combiner les informations pertinentes du livre
-            text = f"{book.title} {book.author} {book.genre} {book.publisher}"
-            if book.description:
-                text += f" {book.description}"
-            book_texts.append(text)
-        return book_texts
-
-    def fit(self, books: List[Book]):
+        return [self.book_text(book) for book in books]
+
+    def fit(self, books: List[Book]) -> None:
         """Entraîne le modèle sur les livres disponibles."""
         book_texts = self.prepare_book_data(books)
-        self.book_vectors = self.vectorizer.fit_transform(book_texts)
+        if self.incremental:
+            vectors = self.vectorizer.transform(book_texts)
+        else:
+            vectors = self.vectorizer.fit_transform(book_texts)
 
-    def get_recommendations(self, user_preferences: Dict[str, List[str]], n_recommendations: int = 10) -> List[Dict[str, Any]]:
-        """Génère des recommandations basées sur les préférences de l'utilisateur."""
-        if not self.book_vectors or not self.books:
+        store = VectorStore(vectors.shape[1], capacity=max(len(books), 1))
+        store.append(vectors)
+        with self._lock:
+            self.store = store
+            self.books = [{field: getattr(book, field) for field in BOOK_FIELDS} for book in books]
+            self.book_index = {book.isbn: row for row, book in enumerate(books)}
+            self.created_at = time.time()
+
+    def add_books(self, books: List[Book]) -> None:
+        """Vectorise des livres nouveaux ou modifiés et les ajoute sans réentraînement.
+
+        En mode TF-IDF, les termes absents du vocabulaire sont ignorés jusqu'au
+        prochain `fit` complet.
+        """
+        if self.store is None:
+            self.fit(books)
+            return
+
+        vectors = self.vectorizer.transform(self.prepare_book_data(books))
+        with self._lock:
+            row_ids = self.store.append(vectors)
+            replaced = [self.book_index[book.isbn] for book in books if book.isbn in self.book_index]
+            self.store.deactivate(replaced)
+            for row, book in zip(row_ids, books):
+                self.books.append({field: getattr(book, field) for field in BOOK_FIELDS})
+                self.book_index[book.isbn] = int(row)
+
+    def remove_book(self, isbn: str) -> None:
+        """Retire un livre des recommandations."""
+        with self._lock:
+            row = self.book_index.pop(isbn, None)
+            if row is not None and self.store is not None:
+                self.store.deactivate([row])
+
+    def save(self, directory: str) -> None:
+        """Sauvegarde vocabulaire, poids IDF, vecteurs et index des livres sur disque.
+
+        L'écriture se fait dans un répertoire temporaire renommé à la fin, pour
+        qu'un autre processus ne lise jamais un artefact incomplet.
+        """
+        if self.store is None:
+            raise ValueError("Le moteur doit être entraîné avant d'être sauvegardé")
+
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_directory = f"{directory}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+
+        with self._lock:
+            self.store.save(tmp_directory)
+            books = list(self.books)
+            if not self.incremental:
+                terms = [''] * len(self.vectorizer.vocabulary_)
+                for term, index in self.vectorizer.vocabulary_.items():
+                    terms[index] = term
+                np.save(os.path.join(tmp_directory, 'idf.npy'), self.vectorizer.idf_)
+                with open(os.path.join(tmp_directory, 'vocabulary.json'), 'w', encoding='utf-8') as file:
+                    json.dump(terms, file, ensure_ascii=False)
+
+        with open(os.path.join(tmp_directory, 'books.json'), 'w', encoding='utf-8') as file:
+            json.dump(books, file, ensure_ascii=False)
+        with open(os.path.join(tmp_directory, 'manifest.json'), 'w', encoding='utf-8') as file:
+            json.dump({
+                'version': ARTIFACT_VERSION,
+                'incremental': self.incremental,
+                'n_features': self.store.n_features,
+                'n_books': len(books),
+                'created_at': self.created_at,
+                'catalogue': self.catalogue
+            }, file)
+
+        old_directory = f"{directory}.old-{os.getpid()}"
+        if os.path.exists(directory):
+            os.rename(directory, old_directory)
+        os.rename(tmp_directory, directory)
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'RecommendationEngine':
+        """Recharge un moteur sauvegardé par `save`, sans réentraînement."""
+        with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as file:
+            manifest = json.load(file)
+        if manifest.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"Version d'artefact non supportée: {manifest.get('version')}")
+
+        engine = cls(incremental=manifest['incremental'])
+        engine.created_at = manifest.get('created_at')
+        engine.catalogue = manifest.get('catalogue')
+        if not engine.incremental:
+            with open(os.path.join(directory, 'vocabulary.json'), encoding='utf-8') as file:
+                terms = json.load(file)
+            engine.vectorizer.vocabulary_ = {term: index for index, term in enumerate(terms)}
+            engine.vectorizer.idf_ = np.load(os.path.join(directory, 'idf.npy'))
+
+        with open(os.path.join(directory, 'books.json'), encoding='utf-8') as file:
+            engine.books = json.load(file)
+        engine.store = VectorStore.load(directory, manifest['n_features'], mmap_mode='r' if mmap else None)
+        active = engine.store.active_mask
+        engine.book_index = {book['isbn']: row for row, book in enumerate(engine.books) if active[row]}
+        return engine
+
+    def similar_rows(self, row: int, n: int = 10) -> List[Tuple[int, float]]:
+        """Compare un livre à tout le catalogue (livres absents de l'index précalculé)."""
+        if self.store is None:
             return []
+        with self._lock:
+            book_vectors = self.store.matrix
+            active = self.store.active_mask.copy()
+        similarities = (book_vectors @ book_vectors[row].T).toarray().ravel()
+        similarities[~active] = -np.inf
+        similarities[row] = -np.inf
+        top_indices = similarities.argsort()[-n:][::-1]
+        return [(int(idx), float(similarities[idx])) for idx in top_indices if np.isfinite(similarities[idx])]
+
+    @staticmethod
+    def preferences_text(user_preferences: Dict[str, List[str]]) -> str:
+        """Texte représentant les genres et auteurs préférés d'un utilisateur."""
+        return " ".join((user_preferences.get('genres') or []) + (user_preferences.get('authors') or []))
+
+    def score_batch(self, user_preferences: List[Dict[str, List[str]]], n_recommendations: int = 10,
+                    excluded: Optional[Sequence[Iterable[str]]] = None) -> List[List[Tuple[int, float]]]:
+        """Note plusieurs profils en un seul produit matriciel creux.
+
+        Les vecteurs étant normalisés (L2), le produit scalaire est la similarité
+        cosinus. Le résultat reste creux : seuls les livres partageant au moins
+        un terme avec le profil sont candidats, et les `n` meilleurs sont
+        extraits par sélection partielle plutôt que par un tri complet.
+        Retourne, pour chaque profil, une liste de (ligne, score).
+        """
+        if self.store is None or not user_preferences:
+            return [[] for _ in user_preferences]
+
+        with self._lock:
+            book_vectors = self.store.matrix
+            active = self.store.active_mask.copy()
+            book_index = self.book_index
+
+        user_vectors = self.vectorizer.transform([self.preferences_text(p) for p in user_preferences])
+        similarities = (user_vectors @ book_vectors.T).tocsr()
 
-        # Créer un vecteur pour les préférences de l'utilisateur
-        user_text = " ".join(user_preferences.get('genres', []) + user_preferences.get('authors', []))
-        user_vector = self.vectorizer.transform([user_text])
+        results: List[List[Tuple[int, float]]] = []
+        for position in range(similarities.shape[0]):
+            start, end = similarities.indptr[position], similarities.indptr[position + 1]
+            rows = similarities.indices[start:end]
+            scores = similarities.data[start:end]
 
-        # Calculer la similarité cosinus
-        similarities = cosine_similarity(user_vector, self.book_vectors).flatten()
+            keep = active[rows] & (scores > 0)
+            if excluded is not None and excluded[position]:
+                excluded_rows = [book_index[isbn] for isbn in excluded[position] if isbn in book_index]
+                keep &= ~np.isin(rows, excluded_rows)
+            rows, scores = rows[keep], scores[keep]
 
-        # Obtenir les indices des livres les plus similaires
-        top_indices = similarities.argsort()[-n_recommendations:][::-1]
+            n = min(n_recommendations, rows.shape[0])
+            if n == 0:
+                results.append([])
+                continue
+            top = np.argpartition(-scores, n - 1)[:n]
+            top = top[np.argsort(-scores[top])]
+            results.append([(int(rows[i]), float(scores[i])) for i in top])
+        return results
+
+    def get_recommendations(self, user_preferences: Dict[str, List[str]], n_recommendations: int = 10,
+                            excluded: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Génère des recommandations basées sur les préférences de l'utilisateur."""
+        if self.store is None or not self.books:
+            return []
+
+        scored = self.score_batch([user_preferences], n_recommendations,
+                                  [excluded] if excluded is not None else None)[0]
 
         # Formater les recommandations
         recommendations = []
-        for idx in top_indices:
-            book = self.books[idx]
-            recommendations.append({
-                'id': book.id,
-                'isbn': book.isbn,
-                'title': book.title,
-                'author': book.author,
-                'year': book.year,
-                'publisher': book.publisher,
-                'image_url_s': book.image_url_s,
-                'image_url_m': book.image_url_m,
-                'image_url_l': book.image_url_l,
-                'genre': book.genre,
-                'similarity_score': float(similarities[idx])
-            })
-
-        return recommendations 
\ No newline at end of file
+        for row, score in scored:
+            recommendation = dict(self.books[row])
+            recommendation['similarity_score'] = score
+            recommendations.append(recommendation)
+
+        return recommendations
@@ -0,0 +1,215 @@
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+# Au-delà de ce nombre de livres, l'index exact (quadratique) cède la place au LSH
+EXACT_MAX_ROWS = 50000
+
+
+class SimilarityIndex:
+    """Table précalculée des k plus proches voisins de chaque livre.
+
+    Les vecteurs des livres étant normalisés (L2), le produit scalaire est la
+    similarité cosinus. Pour un petit catalogue on calcule le produit exact par
+    blocs de lignes ; pour un grand catalogue on ne compare que les livres qui
+    partagent un seau LSH (projections aléatoires) dans au moins une table.
+    """
+
+    def __init__(self, k: int = 20, block_size: int = 1024, n_tables: int = 16,
+                 bucket_size: int = 256, max_bucket_size: int = 2000, random_state: int = 42):
+        self.k = k
+        self.block_size = block_size
+        self.n_tables = n_tables
+        self.bucket_size = bucket_size
+        self.max_bucket_size = max_bucket_size
+        self.random_state = random_state
+
+        self.neighbours: Optional[np.ndarray] = None
+        self.scores: Optional[np.ndarray] = None
+        self.stats: Dict[str, Any] = {}
+
+    @property
+    def n_rows(self) -> int:
+        return 0 if self.neighbours is None else self.neighbours.shape[0]
+
+    def build(self, vectors: sparse.csr_matrix, active: Optional[np.ndarray] = None,
+              method: str = 'auto', recall_sample: int = 200) -> None:
+        """Construit la table de voisins et mesure durée de construction et rappel."""
+        vectors = sparse.csr_matrix(vectors, dtype=np.float32)
+        n_rows = vectors.shape[0]
+        if active is None:
+            active = np.ones(n_rows, dtype=bool)
+        if method == 'auto':
+            method = 'exact' if n_rows <= EXACT_MAX_ROWS else 'lsh'
+
+        start = time.perf_counter()
+        if method == 'exact':
+            self.neighbours, self.scores = self._build_exact(vectors, active)
+        elif method == 'lsh':
+            self.neighbours, self.scores = self._build_lsh(vectors, active)
+        else:
+            raise ValueError(f"Méthode d'index inconnue: {method}")
+        build_seconds = time.perf_counter() - start
+
+        self.stats = {
+            'method': method,
+            'k': self.k,
+            'n_rows': n_rows,
+            'n_features': vectors.shape[1],
+            'build_seconds': round(build_seconds, 3),
+            'recall': 1.0 if method == 'exact' else self.measure_recall(vectors, active, recall_sample)
+        }
+        print(f"Index de similarité ({method}) construit sur {n_rows} livres en {build_seconds:.2f}s, "
+              f"rappel@{self.k}={self.stats['recall']:.3f}")
+
+    def _block_top_k(self, similarities: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Sélection partielle des k meilleures colonnes de chaque ligne, triées."""
+        k = min(k, similarities.shape[1])
+        if k == 0:
+            empty = np.zeros((similarities.shape[0], 0))
+            return empty.astype(np.int32), empty.astype(np.float32)
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def _empty_table(self, n_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+        neighbours = np.full((n_rows, self.k), -1, dtype=np.int32)
+        scores = np.full((n_rows, self.k), -np.inf, dtype=np.float32)
+        return neighbours, scores
+
+    def _build_exact(self, vectors: sparse.csr_matrix, active: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Produit matriciel creux exact, par blocs pour borner la mémoire."""
+        n_rows = vectors.shape[0]
+        neighbours, scores = self._empty_table(n_rows)
+        vectors_t = vectors.T.tocsc()
+        inactive = ~active
+
+        for start in range(0, n_rows, self.block_size):
+            end = min(start + self.block_size, n_rows)
+            similarities = (vectors[start:end] @ vectors_t).toarray()
+            similarities[:, inactive] = -np.inf
+            similarities[np.arange(end - start), np.arange(start, end)] = -np.inf
+            top, top_scores = self._block_top_k(similarities, self.k)
+            neighbours[start:end, :top.shape[1]] = top
+            scores[start:end, :top.shape[1]] = top_scores
+
+        neighbours[~np.isfinite(scores)] = -1
+        return neighbours, scores
+
+    def _merge(self, neighbours: np.ndarray, scores: np.ndarray, rows: np.ndarray,
+               candidates: np.ndarray, candidate_scores: np.ndarray) -> None:
+        """Fusionne des candidats dans la table en éliminant les doublons."""
+        ids = np.concatenate([neighbours[rows], candidates], axis=1)
+        values = np.concatenate([scores[rows], candidate_scores], axis=1)
+
+        # Un même voisin trouvé dans plusieurs tables ne doit compter qu'une fois
+        order = np.argsort(ids, axis=1, kind='stable')
+        sorted_ids = np.take_along_axis(ids, order, axis=1)
+        duplicate = np.zeros_like(sorted_ids, dtype=bool)
+        duplicate[:, 1:] = (sorted_ids[:, 1:] == sorted_ids[:, :-1]) & (sorted_ids[:, 1:] >= 0)
+        sorted_values = np.take_along_axis(values, order, axis=1)
+        sorted_values[duplicate] = -np.inf
+
+        top, top_scores = self._block_top_k(sorted_values, self.k)
+        neighbours[rows] = np.take_along_axis(sorted_ids, top, axis=1)
+        scores[rows] = top_scores
+
+    def _build_lsh(self, vectors: sparse.csr_matrix, active: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Index approché : hyperplans aléatoires, comparaison exacte dans chaque seau."""
+        n_rows, n_features = vectors.shape
+        neighbours, scores = self._empty_table(n_rows)
+        rng = np.random.default_rng(self.random_state)
+        active_rows = np.flatnonzero(active)
+        active_vectors = vectors[active_rows]
+        # Nombre d'hyperplans choisi pour viser des seaux d'environ `bucket_size` livres
+        n_bits = max(1, int(np.round(np.log2(max(active_rows.shape[0], 2) / self.bucket_size))))
+        powers = (1 << np.arange(n_bits)).astype(np.int64)
+
+        for _ in range(self.n_tables):
+            planes = rng.standard_normal((n_features, n_bits)).astype(np.float32)
+            signatures = ((active_vectors @ planes) > 0).astype(np.int64) @ powers
+
+            order = np.argsort(signatures, kind='stable')
+            boundaries = np.flatnonzero(np.diff(signatures[order])) + 1
+            for bucket in np.split(order, boundaries):
+                if bucket.shape[0] < 2:
+                    continue
+                for chunk_start in range(0, bucket.shape[0], self.max_bucket_size):
+                    members = bucket[chunk_start:chunk_start + self.max_bucket_size]
+                    rows = active_rows[members]
+                    block = active_vectors[members]
+                    similarities = (block @ block.T).toarray()
+                    np.fill_diagonal(similarities, -np.inf)
+                    top, top_scores = self._block_top_k(similarities, self.k)
+                    self._merge(neighbours, scores, rows, rows[top].astype(np.int32), top_scores)
+
+        neighbours[~np.isfinite(scores)] = -1
+        return neighbours, scores
+
+    def measure_recall(self, vectors: sparse.csr_matrix, active: np.ndarray, sample_size: int = 200) -> float:
+        """Proportion des vrais k plus proches voisins retrouvés, sur un échantillon."""
+        if self.neighbours is None:
+            raise ValueError("Index de similarité non construit")
+        candidates = np.flatnonzero(active)
+        if candidates.shape[0] == 0:
+            return 1.0
+        rng = np.random.default_rng(self.random_state)
+        sample = rng.choice(candidates, size=min(sample_size, candidates.shape[0]), replace=False)
+
+        similarities = (vectors[sample] @ vectors.T).toarray()
+        similarities[:, ~active] = -np.inf
+        similarities[np.arange(sample.shape[0]), sample] = -np.inf
+        exact, exact_scores = self._block_top_k(similarities, self.k)
+
+        found = total = 0
+        for row, truth, truth_scores in zip(sample, exact, exact_scores):
+            truth = truth[np.isfinite(truth_scores)]
+            total += truth.shape[0]
+            found += np.intersect1d(truth, self.neighbours[row]).shape[0]
+        return round(found / total, 4) if total else 1.0
+
+    def lookup(self, row: int, n: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Retourne les voisins (ligne, score) d'un livre en O(k)."""
+        if self.neighbours is None or self.scores is None or row >= self.n_rows:
+            return []
+        neighbours = self.neighbours[row]
+        scores = self.scores[row]
+        valid = neighbours >= 0
+        result = list(zip(neighbours[valid].tolist(), scores[valid].tolist()))
+        return result[:n] if n is not None else result
+
+    def save(self, directory: str) -> None:
+        """Sauvegarde la table de voisins (remplacement atomique du répertoire)."""
+        if self.neighbours is None or self.scores is None:
+            raise ValueError("Index de similarité non construit")
+        tmp_directory = f"{directory}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+        np.save(os.path.join(tmp_directory, 'neighbours.npy'), self.neighbours)
+        np.save(os.path.join(tmp_directory, 'scores.npy'), self.scores)
+        with open(os.path.join(tmp_directory, 'stats.json'), 'w', encoding='utf-8') as file:
+            json.dump(self.stats, file)
+
+        old_directory = f"{directory}.old-{os.getpid()}"
+        if os.path.exists(directory):
+            os.rename(directory, old_directory)
+        os.rename(tmp_directory, directory)
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'SimilarityIndex':
+        """Recharge une table de voisins, projetée en mémoire par défaut."""
+        mmap_mode: Optional[Literal['r']] = 'r' if mmap else None
+        with open(os.path.join(directory, 'stats.json'), encoding='utf-8') as file:
+            stats = json.load(file)
+        index = cls(k=stats['k'])
+        index.neighbours = np.load(os.path.join(directory, 'neighbours.npy'), mmap_mode=mmap_mode)
+        index.scores = np.load(os.path.join(directory, 'scores.npy'), mmap_mode=mmap_mode)
+        index.stats = stats
+        return index
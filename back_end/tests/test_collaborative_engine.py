@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from collaborative_engine import (
+    IMPLICIT_WEIGHT, CollaborativeEngine, app_weight, auth_user_key, bookcrossing_user_key, bookcrossing_weight,
+    interactions_from_csv
+)
+
+# Deux groupes de lecteurs aux goûts disjoints
+INTERACTIONS = [
+    ('u1', 'a', 1.0), ('u1', 'b', 1.0), ('u1', 'c', 1.0),
+    ('u2', 'a', 1.0), ('u2', 'b', 1.0),
+    ('u3', 'x', 1.0), ('u3', 'y', 1.0), ('u3', 'z', 1.0),
+    ('u4', 'x', 1.0), ('u4', 'y', 1.0),
+]
+
+
+@pytest.fixture
+def engine():
+    engine = CollaborativeEngine(n_factors=4, n_iterations=15)
+    engine.fit(INTERACTIONS)
+    return engine
+
+
+def test_weights_and_keys():
+    assert bookcrossing_weight(0) == IMPLICIT_WEIGHT
+    assert bookcrossing_weight(8) == pytest.approx(0.8)
+    assert app_weight(4) == pytest.approx(0.8)
+    assert bookcrossing_user_key(7) == 'bx:7'
+    assert auth_user_key(7) == 'auth:7'
+
+
+def test_build_matrix_caps_duplicates():
+    engine = CollaborativeEngine()
+    matrix = engine.build_matrix([('u', 'a', 0.7), ('u', 'a', 0.7), ('v', 'b', 0.3)])
+    assert matrix.shape == (2, 2)
+    assert engine.isbns == ['a', 'b']
+    assert matrix[0, 0] == pytest.approx(1.0)
+    assert matrix[1, 1] == pytest.approx(0.3)
+
+
+def test_recommend_follows_similar_users(engine):
+    recommendations = engine.recommend('u2', n_recommendations=1)
+    assert [isbn for isbn, _ in recommendations] == ['c']
+    assert [isbn for isbn, _ in engine.recommend('u4', n_recommendations=1)] == ['z']
+
+
+def test_recommend_excludes_seen_and_unknown_users(engine):
+    isbns = [isbn for isbn, _ in engine.recommend('u1', n_recommendations=10)]
+    assert not {'a', 'b', 'c'} & set(isbns)
+    assert engine.recommend('inconnu') == []
+    assert engine.score_user('inconnu') is None
+    assert not engine.has_user('inconnu')
+
+
+def test_save_and_load(engine, tmp_path):
+    directory = str(tmp_path / 'collaborative')
+    engine.save(directory)
+    engine.save(directory)
+    loaded = CollaborativeEngine.load(directory)
+    assert loaded.isbns == engine.isbns
+    np.testing.assert_allclose(loaded.score_user('u2'), engine.score_user('u2'))
+    assert loaded.recommend('u2', 1) == engine.recommend('u2', 1)
+
+
+def test_interactions_from_csv(tmp_path):
+    path = tmp_path / 'ratings.csv'
+    path.write_text('"User-ID";"ISBN";"Book-Rating"\n"1";"0001";"0"\n"2";"0002";"9"\nbad\n"3";"0003";"x"\n',
+                    encoding='utf-8')
+    assert list(interactions_from_csv(str(path))) == [('bx:1', '0001', IMPLICIT_WEIGHT), ('bx:2', '0002', 0.9)]
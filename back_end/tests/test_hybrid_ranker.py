@@ -0,0 +1,46 @@
+import numpy as np
+from scipy import sparse
+
+from hybrid_ranker import CandidateSimilarity, HybridRanker, min_max
+
+
+def test_min_max():
+    np.testing.assert_allclose(min_max(np.array([2.0, 4.0, np.nan, 3.0])), [0.0, 1.0, 0.0, 0.5])
+    np.testing.assert_allclose(min_max(np.array([3.0, 3.0])), [1.0, 1.0])
+    np.testing.assert_allclose(min_max(np.array([0.0, 0.0])), [0.0, 0.0])
+    np.testing.assert_allclose(min_max(np.array([np.nan])), [0.0])
+
+
+def test_blend_ignores_missing_signals():
+    ranker = HybridRanker(weights={'content': 0.5, 'collaborative': 0.5})
+    relevance = ranker.blend({'content': np.array([0.0, 1.0, 2.0]), 'collaborative': None})
+    np.testing.assert_allclose(relevance, [0.0, 0.5, 1.0])
+
+
+def test_rank_without_diversity_orders_by_relevance():
+    ranker = HybridRanker(diversity=0.0)
+    selected, relevance = ranker.rank({'content': np.array([0.1, 0.9, 0.5, 0.7])}, n=3)
+    assert selected.tolist() == [1, 3, 2]
+    np.testing.assert_allclose(relevance, [1.0, 0.75, 0.5])
+
+
+def test_rank_diversifies_same_author():
+    ranker = HybridRanker(diversity=0.5)
+    components = {'content': np.array([1.0, 0.95, 0.6, 0.0])}
+    selected, _ = ranker.rank(components, n=2, authors=['Hugo', 'hugo ', 'Zola', None])
+    assert selected.tolist() == [0, 2]
+
+
+def test_candidate_similarity_rows():
+    vectors = sparse.csr_matrix(np.array([[1.0, 0.0], [0.0, 1.0], [0.6, 0.8]]))
+    similarity = CandidateSimilarity(vectors, authors=['A', None, None])
+    np.testing.assert_allclose(similarity.row(2), [0.6, 0.8, 1.0])
+    # Auteurs inconnus : jamais considérés comme identiques
+    np.testing.assert_allclose(similarity.row(1), [0.0, 1.0, 0.8])
+
+
+def test_rank_empty_and_small():
+    ranker = HybridRanker()
+    selected, relevance = ranker.rank({'content': np.array([])}, n=5)
+    assert selected.size == 0 and relevance.size == 0
+    assert ranker.rank({'content': np.array([1.0, 2.0])}, n=5)[0].tolist() == [1, 0]
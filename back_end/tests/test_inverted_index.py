@@ -0,0 +1,87 @@
+import pytest
+
+from inverted_index import InvertedIndex, publication_decade, tokenize
+
+BOOKS = [
+    {'isbn': '1', 'title': 'Le Petit Prince', 'author': 'Antoine de Saint-Exupéry', 'genre': 'Conte', 'year': '1943',
+     'description': 'Un aviateur rencontre un petit prince.'},
+    {'isbn': '2', 'title': 'Vol de nuit', 'author': 'Antoine de Saint-Exupéry', 'genre': 'Roman', 'year': '1931',
+     'description': 'Les pilotes de la ligne postale.'},
+    {'isbn': '3', 'title': 'Le Prince', 'author': 'Machiavel', 'genre': 'Essai', 'year': '0',
+     'description': 'Traité politique.'},
+    {'isbn': '4', 'title': 'Les Misérables', 'author': 'Victor Hugo', 'genre': 'Roman', 'year': '1862',
+     'description': None},
+]
+
+
+@pytest.fixture
+def index():
+    index = InvertedIndex()
+    index.build(dict(book) for book in BOOKS)
+    return index
+
+
+def isbns(books):
+    return [book['isbn'] for book in books]
+
+
+def test_tokenize_and_decade():
+    assert tokenize('Vol de NUIT, 1931') == ['vol', 'de', 'nuit', '1931']
+    assert tokenize(None) == []
+    assert publication_decade('1943') == 1940
+    assert publication_decade('0') is None
+    assert publication_decade(None) is None
+
+
+def test_search_requires_every_term_and_ranks_title_first(index):
+    books, total = index.search('prince')
+    assert total == 2
+    # Titre court le plus proche en tête : même pondération de champ, document plus court
+    assert isbns(books) == ['3', '1']
+    assert isbns(index.search('petit prince')[0]) == ['1']
+    assert index.search('prince inconnu') == ([], 0)
+
+
+def test_search_filters_and_pagination(index):
+    books, total = index.search('', {'author': 'saint-ex'}, page=1, per_page=1)
+    assert total == 2
+    assert isbns(books) == ['1']
+    assert isbns(index.search('', {'author': 'saint-ex'}, page=2, per_page=1)[0]) == ['2']
+    assert index.search('', {'author': 'saint-ex'}, page=3, per_page=1) == ([], 2)
+
+
+def test_add_replaces_and_remove_deletes(index):
+    index.add(dict(BOOKS[3], title='Notre-Dame de Paris'))
+    assert index.search('misérables') == ([], 0)
+    assert isbns(index.search('notre dame')[0]) == ['4']
+    index.remove('1')
+    assert isbns(index.search('prince')[0]) == ['3']
+    assert index.stats['documents'] == 3
+    assert index.stats['deleted'] == 2
+
+
+def test_seek_walks_all_results_once(index):
+    for query in ('de', ''):
+        expected, total = index.search(query, per_page=10)
+        seen, cursor = [], None
+        while True:
+            books, cursor, seek_total = index.seek(query, cursor=cursor, limit=1)
+            assert seek_total == total
+            seen += books
+            if cursor is None:
+                break
+        assert isbns(seen) == isbns(expected)
+
+
+def test_seek_rejects_foreign_cursor(index):
+    with pytest.raises(ValueError):
+        index.seek('prince', cursor=[None, 0])
+    with pytest.raises(ValueError):
+        index.seek('', cursor=[0.5, 0])
+
+
+def test_facets(index):
+    facets = index.facets('', limit=1)
+    assert facets['genre'] == [('Roman', 2)]
+    assert facets['author'] == [('Antoine de Saint-Exupéry', 2)]
+    assert index.facets('prince')['decade'] == [(1940, 1)]
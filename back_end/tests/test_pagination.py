@@ -0,0 +1,34 @@
+import pytest
+from flask import Flask
+
+from app.pagination import cursor_requested, decode_cursor, encode_cursor, get_after, total_requested
+
+
+def test_cursor_round_trip():
+    values = [0.125, '0451524934', None, 'Café']
+    cursor = encode_cursor(values)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == values
+
+
+@pytest.mark.parametrize('cursor', ['!!!', encode_cursor({'a': 1}), 'e30'])
+def test_decode_cursor_rejects_invalid(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize('query, requested, after', [
+    ('', False, None),
+    ('after=', True, None),
+    ('after=abc', True, 'abc'),
+])
+def test_after_parameter(query, requested, after):
+    with Flask(__name__).test_request_context(f'/?{query}'):
+        assert cursor_requested() is requested
+        assert get_after() == after
+
+
+@pytest.mark.parametrize('query, expected', [('', False), ('count=1', True), ('count=TRUE', True), ('count=0', False)])
+def test_total_requested(query, expected):
+    with Flask(__name__).test_request_context(f'/?{query}'):
+        assert total_requested() is expected
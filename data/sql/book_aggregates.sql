@@ -0,0 +1,59 @@
+-- Agrégats du catalogue servis par /api/books/genres et /api/books/authors :
+-- nombre de livres par genre et par auteur, maintenus par déclencheur à chaque
+-- écriture sur books (y compris les imports hors application).
+--
+-- Tout le script s'exécute dans une transaction qui bloque les écritures de
+-- livres : aucun livre ne peut être écrit entre la création du déclencheur et
+-- le remplissage initial (il serait sinon compté deux fois ou pas du tout).
+BEGIN;
+
+LOCK TABLE books IN SHARE MODE;
+
+CREATE TABLE IF NOT EXISTS book_aggregates (
+    kind VARCHAR(10) NOT NULL,          -- 'genre' ou 'author'
+    value VARCHAR(255) NOT NULL,
+    book_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, value)
+);
+
+-- Lecture directe des auteurs les plus fréquents
+CREATE INDEX IF NOT EXISTS idx_book_aggregates_count ON book_aggregates(kind, book_count DESC);
+
+CREATE OR REPLACE FUNCTION book_aggregates_add(p_kind VARCHAR, p_value VARCHAR, p_delta INTEGER) RETURNS void AS $$
+BEGIN
+    IF p_value IS NULL OR p_value = '' THEN
+        RETURN;
+    END IF;
+    INSERT INTO book_aggregates (kind, value, book_count) VALUES (p_kind, p_value, p_delta)
+    ON CONFLICT (kind, value) DO UPDATE SET book_count = book_aggregates.book_count + EXCLUDED.book_count;
+    DELETE FROM book_aggregates WHERE kind = p_kind AND value = p_value AND book_count <= 0;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION book_aggregates_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM book_aggregates_add('genre', OLD.genre, -1);
+        PERFORM book_aggregates_add('author', OLD.book_author, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM book_aggregates_add('genre', NEW.genre, 1);
+        PERFORM book_aggregates_add('author', NEW.book_author, 1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS book_aggregates_trigger ON books;
+CREATE TRIGGER book_aggregates_trigger
+    AFTER INSERT OR UPDATE OF genre, book_author OR DELETE ON books
+    FOR EACH ROW EXECUTE FUNCTION book_aggregates_update();
+
+-- Remplissage initial
+TRUNCATE book_aggregates;
+INSERT INTO book_aggregates (kind, value, book_count)
+SELECT 'genre', genre, COUNT(*) FROM books WHERE genre IS NOT NULL AND genre <> '' GROUP BY genre;
+INSERT INTO book_aggregates (kind, value, book_count)
+SELECT 'author', book_author, COUNT(*) FROM books WHERE book_author IS NOT NULL AND book_author <> '' GROUP BY book_author;
+
+COMMIT;
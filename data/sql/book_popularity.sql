@@ -0,0 +1,18 @@
+-- Popularité matérialisée des livres : nombre et somme des notes (échelle 1-5)
+-- issues de Book-Crossing (notes explicites 1-10 ramenées sur 5) et de l'application.
+-- Le score est une moyenne bayésienne, recalculée par `flask refresh-popularity`
+-- et mise à jour incrémentalement à chaque notation.
+CREATE TABLE IF NOT EXISTS book_popularity (
+    isbn VARCHAR(20) PRIMARY KEY REFERENCES books(isbn) ON DELETE CASCADE,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    score DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Index pour lire directement les livres les mieux classés
+CREATE INDEX IF NOT EXISTS idx_book_popularity_score ON book_popularity(score DESC);
+
+-- Recomptage par livre (imports, écritures concurrentes) sans parcourir toutes les notes
+CREATE INDEX IF NOT EXISTS idx_ratings_isbn ON ratings(isbn);
+CREATE INDEX IF NOT EXISTS idx_user_book_ratings_isbn ON user_book_ratings(isbn);
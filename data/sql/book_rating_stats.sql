@@ -0,0 +1,90 @@
+-- Statistiques des notes de l'application par livre (nombre, somme, répartition
+-- par étoile), maintenues par déclencheur dans la transaction de chaque écriture
+-- sur user_book_ratings : la fiche d'un livre les lit par clé primaire.
+-- updated_at (UTC, heure d'écriture) sert de version aux listes ?ratings=1 :
+-- aucune ligne partagée n'est mise à jour par toutes les écritures de notes.
+--
+-- Tout le script s'exécute dans une transaction qui bloque les écritures de
+-- notes : aucune note ne peut être écrite entre la création du déclencheur et
+-- le remplissage initial (elle serait sinon comptée deux fois ou pas du tout).
+BEGIN;
+
+LOCK TABLE user_book_ratings IN SHARE MODE;
+
+CREATE TABLE IF NOT EXISTS book_rating_stats (
+    isbn VARCHAR(20) PRIMARY KEY REFERENCES books(isbn) ON DELETE CASCADE,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    one_star INTEGER NOT NULL DEFAULT 0,
+    two_stars INTEGER NOT NULL DEFAULT 0,
+    three_stars INTEGER NOT NULL DEFAULT 0,
+    four_stars INTEGER NOT NULL DEFAULT 0,
+    five_stars INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+);
+ALTER TABLE book_rating_stats ALTER COLUMN updated_at SET DEFAULT (now() AT TIME ZONE 'utc');
+CREATE INDEX IF NOT EXISTS idx_book_rating_stats_updated_at ON book_rating_stats (updated_at);
+
+CREATE OR REPLACE FUNCTION book_rating_stats_add(p_isbn VARCHAR, p_rating INTEGER, p_delta INTEGER) RETURNS void AS $$
+BEGIN
+    INSERT INTO book_rating_stats (isbn, rating_count, rating_sum, one_star, two_stars, three_stars, four_stars, five_stars, updated_at)
+    VALUES (
+        p_isbn, p_delta, p_delta * p_rating,
+        CASE WHEN p_rating = 1 THEN p_delta ELSE 0 END,
+        CASE WHEN p_rating = 2 THEN p_delta ELSE 0 END,
+        CASE WHEN p_rating = 3 THEN p_delta ELSE 0 END,
+        CASE WHEN p_rating = 4 THEN p_delta ELSE 0 END,
+        CASE WHEN p_rating = 5 THEN p_delta ELSE 0 END,
+        -- Heure d'écriture plutôt que de début de transaction : plus proche du commit
+        clock_timestamp() AT TIME ZONE 'utc'
+    )
+    ON CONFLICT (isbn) DO UPDATE SET
+        rating_count = book_rating_stats.rating_count + EXCLUDED.rating_count,
+        rating_sum = book_rating_stats.rating_sum + EXCLUDED.rating_sum,
+        one_star = book_rating_stats.one_star + EXCLUDED.one_star,
+        two_stars = book_rating_stats.two_stars + EXCLUDED.two_stars,
+        three_stars = book_rating_stats.three_stars + EXCLUDED.three_stars,
+        four_stars = book_rating_stats.four_stars + EXCLUDED.four_stars,
+        five_stars = book_rating_stats.five_stars + EXCLUDED.five_stars,
+        updated_at = EXCLUDED.updated_at;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION book_rating_stats_update() RETURNS trigger AS $$
+BEGIN
+    -- Une modification qui ne change ni le livre ni la note (avis seul) ne touche pas aux statistiques
+    IF TG_OP = 'UPDATE' AND OLD.isbn = NEW.isbn AND OLD.rating = NEW.rating THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM book_rating_stats_add(OLD.isbn, OLD.rating, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM book_rating_stats_add(NEW.isbn, NEW.rating, 1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS book_rating_stats_update ON user_book_ratings;
+CREATE TRIGGER book_rating_stats_update
+    AFTER INSERT OR UPDATE OF isbn, rating OR DELETE ON user_book_ratings
+    FOR EACH ROW EXECUTE FUNCTION book_rating_stats_update();
+
+-- Remplissage initial à partir des notes existantes
+INSERT INTO book_rating_stats (isbn, rating_count, rating_sum, one_star, two_stars, three_stars, four_stars, five_stars)
+SELECT isbn, COUNT(*), SUM(rating),
+       COUNT(*) FILTER (WHERE rating = 1),
+       COUNT(*) FILTER (WHERE rating = 2),
+       COUNT(*) FILTER (WHERE rating = 3),
+       COUNT(*) FILTER (WHERE rating = 4),
+       COUNT(*) FILTER (WHERE rating = 5)
+FROM user_book_ratings
+GROUP BY isbn
+ON CONFLICT (isbn) DO NOTHING;
+
+-- Ancienne version de table par déclencheur d'instruction (ligne unique verrouillée
+-- par chaque écriture de note jusqu'au commit) : remplacée par max(updated_at)
+DROP TRIGGER IF EXISTS book_rating_stats_table_version_trigger ON book_rating_stats;
+
+COMMIT;
@@ -0,0 +1,71 @@
+-- Versions utilisées pour les ETag / Last-Modified des lectures de livres.
+-- Par ligne : row_version et updated_at, incrémentés à chaque modification.
+-- Par table : une ligne dans table_versions, incrémentée à chaque instruction d'écriture.
+-- Les dates sont en UTC (TIMESTAMP sans fuseau), quel que soit le fuseau du serveur :
+-- l'application les publie telles quelles en Last-Modified.
+ALTER TABLE books ADD COLUMN IF NOT EXISTS row_version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE books ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc');
+ALTER TABLE books ALTER COLUMN updated_at SET DEFAULT (now() AT TIME ZONE 'utc');
+
+-- Les colonnes dérivées (search_vector, data/sql/books_search.sql) ne changent pas la version
+CREATE OR REPLACE FUNCTION books_row_version_update() RETURNS trigger AS $$
+BEGIN
+    IF to_jsonb(NEW) - 'search_vector' - 'row_version' - 'updated_at'
+       = to_jsonb(OLD) - 'search_vector' - 'row_version' - 'updated_at' THEN
+        RETURN NEW;
+    END IF;
+    NEW.row_version := OLD.row_version + 1;
+    NEW.updated_at := now() AT TIME ZONE 'utc';
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS books_row_version_trigger ON books;
+CREATE TRIGGER books_row_version_trigger
+    BEFORE UPDATE ON books
+    FOR EACH ROW EXECUTE FUNCTION books_row_version_update();
+
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+);
+ALTER TABLE table_versions ALTER COLUMN updated_at SET DEFAULT (now() AT TIME ZONE 'utc');
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO table_versions (table_name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, now() AT TIME ZONE 'utc')
+    ON CONFLICT (table_name) DO UPDATE SET
+        version = table_versions.version + 1,
+        updated_at = EXCLUDED.updated_at;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS books_table_version_trigger ON books;
+CREATE TRIGGER books_table_version_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON books
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+INSERT INTO table_versions (table_name) VALUES ('books') ON CONFLICT DO NOTHING;
+
+-- Mise à niveau d'une version antérieure, qui écrivait l'heure locale du serveur :
+-- conversion unique en UTC (marquée par le commentaire de colonne), sans passer
+-- par le déclencheur de ligne pour ne pas incrémenter row_version.
+DO $$
+BEGIN
+    IF col_description('books'::regclass,
+                       (SELECT attnum FROM pg_attribute WHERE attrelid = 'books'::regclass AND attname = 'updated_at'))
+       IS DISTINCT FROM 'UTC' THEN
+        IF (now() AT TIME ZONE 'utc') <> now()::timestamp THEN
+            -- table_versions d'abord : la mise à jour de books l'incrémente déjà en UTC
+            UPDATE table_versions SET updated_at = (updated_at::timestamptz) AT TIME ZONE 'utc';
+            ALTER TABLE books DISABLE TRIGGER books_row_version_trigger;
+            UPDATE books SET updated_at = (updated_at::timestamptz) AT TIME ZONE 'utc';
+            ALTER TABLE books ENABLE TRIGGER books_row_version_trigger;
+        END IF;
+        COMMENT ON COLUMN books.updated_at IS 'UTC';
+    END IF;
+END
+$$;
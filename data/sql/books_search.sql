@@ -0,0 +1,50 @@
+-- Recherche plein texte sur les livres (/api/books/search)
+-- Vecteur pondéré : titre (A) > auteur (B) > genre (C) > description (D).
+-- La configuration 'simple' (sans racinisation) convient à un catalogue multilingue ;
+-- elle doit rester identique à SEARCH_TEXT_CONFIG dans app/search.py.
+-- Le remplissage valide une transaction par lot : exécuter ce script hors
+-- transaction explicite (psql en autocommit).
+ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION books_search_vector(p_title TEXT, p_author TEXT, p_genre TEXT, p_description TEXT)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(p_title, '')), 'A') ||
+           setweight(to_tsvector('simple', coalesce(p_author, '')), 'B') ||
+           setweight(to_tsvector('simple', coalesce(p_genre, '')), 'C') ||
+           setweight(to_tsvector('simple', coalesce(p_description, '')), 'D')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION books_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := books_search_vector(NEW.book_title, NEW.book_author, NEW.genre, NEW.description);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS books_search_vector_trigger ON books;
+CREATE TRIGGER books_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF book_title, book_author, genre, description ON books
+    FOR EACH ROW EXECUTE FUNCTION books_search_vector_update();
+
+-- Remplissage des lignes existantes par lots de clés, une transaction par lot :
+-- seule la colonne search_vector est écrite (row_version et updated_at,
+-- data/sql/book_versions.sql, ne changent pas pour elle).
+DO $$
+DECLARE
+    last_isbn VARCHAR := '';
+    batch VARCHAR[];
+BEGIN
+    LOOP
+        SELECT array_agg(isbn ORDER BY isbn) INTO batch
+        FROM (SELECT isbn FROM books WHERE isbn > last_isbn ORDER BY isbn LIMIT 5000) keys;
+        EXIT WHEN batch IS NULL;
+        UPDATE books
+        SET search_vector = books_search_vector(book_title, book_author, genre, description)
+        WHERE isbn = ANY(batch) AND search_vector IS NULL;
+        last_isbn := batch[array_length(batch, 1)];
+        COMMIT;
+    END LOOP;
+END
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_books_search_vector ON books USING GIN (search_vector);
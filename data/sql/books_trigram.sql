@@ -0,0 +1,10 @@
+-- Index des suggestions à la frappe (/api/books/suggest)
+-- B-tree en collation "C" : LIKE 'préfixe%' et lecture dans l'ordre, dès deux caractères.
+-- Trigrammes : LIKE '%préfixe%' sur les titres et auteurs en minuscules, à partir de trois caractères.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_books_title_prefix ON books (lower(book_title) COLLATE "C");
+CREATE INDEX IF NOT EXISTS idx_books_author_prefix ON books (lower(book_author) COLLATE "C");
+
+CREATE INDEX IF NOT EXISTS idx_books_title_trgm ON books USING GIN (lower(book_title) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_books_author_trgm ON books USING GIN (lower(book_author) gin_trgm_ops);
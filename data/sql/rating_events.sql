@@ -0,0 +1,72 @@
+-- Journal des notes en ajout seul : chaque écriture sur user_book_ratings
+-- (rate_book, delete_rating, imports) y ajoute un événement, dans la même
+-- transaction. Les consommateurs (/api/ratings/events) reprennent à partir du
+-- dernier numéro lu au lieu de relire toute la table des notes.
+--
+-- Aucun verrou global sur le chemin d'écriture : l'événement garde l'identifiant
+-- de sa transaction (`xid`). Le numéro publié (`seq`) est attribué à la lecture
+-- (app/rating_events.py), seulement aux événements dont la transaction est
+-- terminée (xid < pg_snapshot_xmin), dans l'ordre (xid, id) : un événement
+-- validé plus tard ne peut pas recevoir un numéro plus petit qu'un numéro déjà lu.
+-- Nécessite PostgreSQL 13 ou plus (xid8).
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS rating_events (
+    id BIGSERIAL PRIMARY KEY,
+    xid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    seq BIGINT UNIQUE,                    -- NULL tant que l'événement n'est pas publié
+    event_type VARCHAR(10) NOT NULL,      -- 'rate' ou 'delete'
+    user_id INTEGER NOT NULL,
+    isbn VARCHAR(20) NOT NULL,
+    rating INTEGER,                       -- NULL pour une suppression
+    previous_rating INTEGER,              -- NULL pour une première note
+    created_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+);
+
+-- Mise à niveau de la première version (numéro attribué à l'insertion sous verrou
+-- consultatif) : les événements existants gardent leur numéro, déjà publié.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'rating_events' AND column_name = 'xid') THEN
+        ALTER TABLE rating_events RENAME COLUMN seq TO id;
+        ALTER TABLE rating_events ADD COLUMN xid xid8 NOT NULL DEFAULT '0';
+        ALTER TABLE rating_events ALTER COLUMN xid SET DEFAULT pg_current_xact_id();
+        ALTER TABLE rating_events ADD COLUMN seq BIGINT UNIQUE;
+        UPDATE rating_events SET seq = id;
+    END IF;
+END
+$$;
+
+-- Événements en attente de publication, dans leur ordre de publication
+CREATE INDEX IF NOT EXISTS idx_rating_events_unpublished ON rating_events (xid, id) WHERE seq IS NULL;
+
+CREATE OR REPLACE FUNCTION rating_events_append() RETURNS trigger AS $$
+BEGIN
+    -- Avis modifié sans changer la note : rien à publier
+    IF TG_OP = 'UPDATE' AND OLD.isbn = NEW.isbn AND OLD.user_id = NEW.user_id AND OLD.rating = NEW.rating THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'UPDATE' AND OLD.isbn = NEW.isbn AND OLD.user_id = NEW.user_id THEN
+        INSERT INTO rating_events (event_type, user_id, isbn, rating, previous_rating)
+        VALUES ('rate', NEW.user_id, NEW.isbn, NEW.rating, OLD.rating);
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO rating_events (event_type, user_id, isbn, rating, previous_rating)
+        VALUES ('delete', OLD.user_id, OLD.isbn, NULL, OLD.rating);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO rating_events (event_type, user_id, isbn, rating, previous_rating)
+        VALUES ('rate', NEW.user_id, NEW.isbn, NEW.rating, NULL);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS rating_events_append ON user_book_ratings;
+CREATE TRIGGER rating_events_append
+    AFTER INSERT OR UPDATE OF user_id, isbn, rating OR DELETE ON user_book_ratings
+    FOR EACH ROW EXECUTE FUNCTION rating_events_append();
+
+COMMIT;
@@ -0,0 +1,13 @@
+-- Recommandations précalculées par le job batch (flask batch-recommendations)
+CREATE TABLE IF NOT EXISTS user_recommendations (
+    user_id INTEGER NOT NULL REFERENCES auth_users(user_id) ON DELETE CASCADE,
+    rank SMALLINT NOT NULL,
+    isbn VARCHAR(20) NOT NULL REFERENCES books(isbn) ON DELETE CASCADE,
+    score DOUBLE PRECISION NOT NULL,
+    generated_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),  -- UTC, comparé aux dates des notes
+    PRIMARY KEY (user_id, rank)
+);
+ALTER TABLE user_recommendations ALTER COLUMN generated_at SET DEFAULT (now() AT TIME ZONE 'utc');
+
+-- Index pour la suppression en cascade depuis books
+CREATE INDEX IF NOT EXISTS idx_user_recommendations_isbn ON user_recommendations(isbn);